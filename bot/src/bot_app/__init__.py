@@ -1,5 +1,3 @@
 import logging
-from bot_app.app import dp
-from bot_app.handlers import message_handlers, callback_handlers
 
 logging.basicConfig(level=logging.INFO)
@@ -1,45 +1,72 @@
-import asyncio
-import tritonclient.http as httpclient
-
-from gevent import monkey
-from environs import Env
 from aiogram import Bot, Dispatcher
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 
+from bot_app import metrics
 from bot_app.db.database import Database
+from bot_app.db.rating_buffer import RatingBuffer
+from bot_app.db.postgres_storage import PostgresStorage
+from bot_app.utils.fsm.compact_storage import CompactStorage
+from bot_app.utils.models.mediator import AsyncMediator
+from bot_app.config import (
+    BOT_TOKEN,
+    MODEL_NAMES,
+    CONNECTIONS_NUM,
+    URL,
+    SHARED_MEMORY,
+    DB_URL,
+    DB_MIN_CONNECTIONS,
+    DB_MAX_CONNECTIONS,
+    DB_MAX_QUERIES,
+    DB_MAX_INACTIVE_LIFETIME,
+    RATINGS_PARTITIONED,
+    RATINGS_RETENTION_MONTHS,
+    RATING_BUFFER_SIZE,
+    RATING_BATCH_SIZE,
+    RATING_FLUSH_INTERVAL,
+    FSM_STORAGE,
+    FSM_TTL,
+    FSM_SNAPSHOT_PATH,
+    FSM_CACHE_SIZE,
+    FSM_CACHE_TTL,
+    FSM_FLUSH_INTERVAL,
+    WORKERS,
+)
 
-monkey.patch_all()
-
-env = Env()
-env.read_env()
-
-BOT_TOKEN = env.str("BOT_TOKEN")
-
-MODEL_NAMES = env.list("MODEL_NAMES")
-MODELS_NUM = len(MODEL_NAMES)
-DIMS = env.list("DIMS", subcast=int)
-CONNECTIONS_NUM = env.int("CONNECTIONS_NUM")
-URL = env.str("URL")
-
-MAX_ELEMENTS = env.int("MAX_ELEMENTS")
-INDEX_PATHS = env.list("INDEX_PATHS")
-
-MEDIA_PATH = env.str("MEDIA_PATH")
+bot = Bot(token=BOT_TOKEN)
 
-TESTING = env.bool("TESTING")
+db = Database(
+    DB_URL,
+    MODEL_NAMES,
+    min_size=DB_MIN_CONNECTIONS,
+    max_size=DB_MAX_CONNECTIONS,
+    max_queries=DB_MAX_QUERIES,
+    max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+    partitioned=RATINGS_PARTITIONED,
+    retention_months=RATINGS_RETENTION_MONTHS,
+)
 
-if TESTING:
-    DB_URL = env.str("TEST_DB_URL")
+if FSM_STORAGE == "postgres":
+    storage = PostgresStorage(
+        db,
+        cache_size=FSM_CACHE_SIZE,
+        cache_ttl=FSM_CACHE_TTL,
+        flush_interval=FSM_FLUSH_INTERVAL,
+    )
 else:
-    DB_URL = env.str("DATABASE_URL")
-
-
-bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
-dp = Dispatcher(bot, storage=MemoryStorage())
-
+    # the states of the pre-fork workers are their own, so they are not
+    # saved to a single snapshot
+    storage = CompactStorage(
+        FSM_TTL, path=None if WORKERS else FSM_SNAPSHOT_PATH
+    )
+dp = Dispatcher(bot, storage=storage)
 
-loop = asyncio.get_event_loop()
-db = Database(loop, DB_URL, MODEL_NAMES)
+rating_buffer = RatingBuffer(
+    db,
+    max_size=RATING_BUFFER_SIZE,
+    batch_size=RATING_BATCH_SIZE,
+    flush_interval=RATING_FLUSH_INTERVAL,
+    observe_flush=metrics.rating_flush_latency.observe,
+)
 
-client = httpclient.InferenceServerClient(url=URL, concurrency=CONNECTIONS_NUM)
+mediator = AsyncMediator(
+    URL, conn_limit=CONNECTIONS_NUM, shared_memory=SHARED_MEMORY
+)
@@ -0,0 +1,113 @@
+from environs import Env
+
+env = Env()
+env.read_env()
+
+BOT_TOKEN = env.str("BOT_TOKEN")
+
+MODEL_NAMES = env.list("MODEL_NAMES")
+MODELS_NUM = len(MODEL_NAMES)
+DIMS = env.list("DIMS", subcast=int)
+CONNECTIONS_NUM = env.int("CONNECTIONS_NUM")
+URL = env.str("URL")
+MAX_BATCH_SIZE = env.int("MAX_BATCH_SIZE", 8)
+BATCH_WINDOW_MS = env.float("BATCH_WINDOW_MS", 3.0)
+SHARED_MEMORY = env.bool("SHARED_MEMORY", False)
+
+PREPROCESSING_EXECUTOR = env.str("PREPROCESSING_EXECUTOR", "thread")
+PREPROCESSING_WORKERS = env.int("PREPROCESSING_WORKERS", None)
+PREPROCESSING_QUEUE_SIZE = env.int("PREPROCESSING_QUEUE_SIZE", 64)
+PREPROCESSING_TIMEOUT = env.float("PREPROCESSING_TIMEOUT", 10.0)
+
+# photos processed at a time, the others wait in a queue taking
+# turns by user and get the busy reply if it is full or after
+# ADMISSION_MAX_WAIT seconds
+ADMISSION_CONCURRENCY = env.int("ADMISSION_CONCURRENCY", 16)
+ADMISSION_QUEUE_SIZE = env.int("ADMISSION_QUEUE_SIZE", 64)
+ADMISSION_QUEUE_PER_USER = env.int("ADMISSION_QUEUE_PER_USER", 1)
+ADMISSION_MAX_WAIT = env.float("ADMISSION_MAX_WAIT", 5.0)
+ADMISSION_STATS_INTERVAL = env.float("ADMISSION_STATS_INTERVAL", 60.0)
+
+RESULTS_CACHE_SIZE = env.int("RESULTS_CACHE_SIZE", 10000)
+RESULTS_CACHE_TTL = env.float("RESULTS_CACHE_TTL", 3600.0)
+STATS_CACHE_TTL = env.float("STATS_CACHE_TTL", 5.0)
+
+# "memory" states are kept by every process, "postgres" states
+# are shared by all the processes and instances of the bot
+FSM_STORAGE = env.str("FSM_STORAGE", "memory")
+# idle users' states are dropped after FSM_TTL seconds
+FSM_TTL = env.float("FSM_TTL", 24 * 3600.0)
+FSM_SNAPSHOT_PATH = env.str("FSM_SNAPSHOT_PATH", None)
+FSM_SNAPSHOT_INTERVAL = env.float("FSM_SNAPSHOT_INTERVAL", 60.0)
+FSM_CACHE_SIZE = env.int("FSM_CACHE_SIZE", 100000)
+FSM_CACHE_TTL = env.float("FSM_CACHE_TTL", 60.0)
+FSM_FLUSH_INTERVAL = env.float("FSM_FLUSH_INTERVAL", 0.01)
+
+RATING_BUFFER_SIZE = env.int("RATING_BUFFER_SIZE", 10000)
+RATING_BATCH_SIZE = env.int("RATING_BATCH_SIZE", 1000)
+RATING_FLUSH_INTERVAL = env.float("RATING_FLUSH_INTERVAL", 1.0)
+
+MAX_ELEMENTS = env.int("MAX_ELEMENTS")
+# paths of the shards of a model's index are separated by ";"
+INDEX_PATHS = env.list("INDEX_PATHS")
+# "hnsw" for Matcher or "quantized" for QuantizedMatcher indexes
+INDEX_KIND = env.str("INDEX_KIND", "hnsw")
+RERANK_PATHS = env.list("RERANK_PATHS", [])
+RERANK_CANDIDATES = env.int("RERANK_CANDIDATES", 0)
+MATCHER_BATCH_SIZE = env.int("MATCHER_BATCH_SIZE", 64)
+MATCHER_WINDOW_MS = env.float("MATCHER_WINDOW_MS", 2.0)
+MATCHER_THREADS = env.int("MATCHER_THREADS", -1)
+MATCHER_WORKERS = env.int("MATCHER_WORKERS", 2)
+MATCHER_EF = env.int("MATCHER_EF", None)
+# max squared l2 distance of a match for every model, no limit if empty
+MAX_DISTANCES = env.list("MAX_DISTANCES", [], subcast=float)
+# modified indexes are saved every INDEX_SNAPSHOT_INTERVAL seconds,
+# never if it is 0
+INDEX_SNAPSHOT_INTERVAL = env.float("INDEX_SNAPSHOT_INTERVAL", 300.0)
+
+# metrics of the bot in the Prometheus text format, not served if
+# METRICS_PORT is 0, pre-fork workers serve theirs on the ports
+# from METRICS_PORT to METRICS_PORT + 2 * WORKERS - 1, the default
+# is away from the ports of Prometheus itself (9090) and Triton (8000)
+METRICS_HOST = env.str("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = env.int("METRICS_PORT", 9494)
+METRICS_PATH = env.str("METRICS_PATH", "/metrics")
+
+ADMIN_IDS = env.list("ADMIN_IDS", [], subcast=int)
+
+MEDIA_PATH = env.str("MEDIA_PATH")
+
+TESTING = env.bool("TESTING")
+
+if TESTING:
+    DB_URL = env.str("TEST_DB_URL")
+else:
+    DB_URL = env.str("DATABASE_URL")
+DB_MIN_CONNECTIONS = env.int("DB_MIN_CONNECTIONS", 4)
+DB_MAX_CONNECTIONS = env.int("DB_MAX_CONNECTIONS", 32)
+# connections are replaced after that many queries or idle seconds
+DB_MAX_QUERIES = env.int("DB_MAX_QUERIES", 50000)
+DB_MAX_INACTIVE_LIFETIME = env.float("DB_MAX_INACTIVE_LIFETIME", 300.0)
+# monthly partitions of ratings, the older ones than the retention
+# are dropped, see Database.maintain_partitions
+RATINGS_PARTITIONED = env.bool("RATINGS_PARTITIONED", False)
+RATINGS_RETENTION_MONTHS = env.int("RATINGS_RETENTION_MONTHS", None)
+PARTITIONS_MAINTENANCE_INTERVAL = env.float(
+    "PARTITIONS_MAINTENANCE_INTERVAL", 24 * 3600.0
+)
+
+WORKERS = env.int("WORKERS", 0)
+WEBHOOK_URL = env.str("WEBHOOK_URL", None)
+WEBHOOK_PATH = env.str("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = env.str("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = env.int("WEBHOOK_PORT", 8080)
+# the updates without the X-Telegram-Bot-Api-Secret-Token header
+# are rejected if it is set
+WEBHOOK_SECRET = env.str("WEBHOOK_SECRET", None)
+# updates processed at a time and received but not processed yet,
+# Telegram retries the updates rejected with more pending
+WEBHOOK_CONCURRENCY = env.int("WEBHOOK_CONCURRENCY", 64)
+WEBHOOK_MAX_PENDING = env.int("WEBHOOK_MAX_PENDING", 1024)
+# connections Telegram delivers the updates by
+WEBHOOK_MAX_CONNECTIONS = env.int("WEBHOOK_MAX_CONNECTIONS", 100)
+WEBHOOK_SHUTDOWN_TIMEOUT = env.float("WEBHOOK_SHUTDOWN_TIMEOUT", 30.0)
@@ -1,62 +1,523 @@
-import asyncio
+import re
 import asyncpg
 
-from typing import List
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+
+# the statements are prepared once per connection and kept
+# in its statement cache, which re-prepares them on schema changes
+STATEMENTS = {
+    "insert_rating": (
+        "insert into ratings values (default, $1, $2, $3, default)"
+    ),
+    "view_ratings": (
+        "select model_id, model_name, amount "
+        "from rating_counts where model_id = $1"
+    ),
+    "get_stats": (
+        "select model_id, model_name, amount "
+        "from rating_counts order by model_id"
+    ),
+}
+
+# partitions are created ahead, so the inserts never miss a partition
+# while the bot is down for less than that many months
+PARTITIONS_AHEAD = 2
+
+_BOUNDS = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+def month_start(time: datetime, months: int = 0) -> datetime:
+    """
+    The start of the month of time shifted by months
+    """
+    month = time.year * 12 + time.month - 1 + months
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+RATINGS_COLUMNS = (
+    "id",
+    "tg_user_id",
+    "model_id",
+    "model_name",
+    "creation_time",
+)
+
+
+def _ratings_query(
+    model_ids: Optional[Sequence[int]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Tuple[str, List[Any]]:
+    # ratings of the models created in [since, until)
+    conditions, args = [], []
+    if model_ids is not None:
+        args.append(list(model_ids))
+        conditions.append(f"model_id = any(${len(args)}::int[])")
+    if since is not None:
+        args.append(since)
+        conditions.append(f"creation_time >= ${len(args)}")
+    if until is not None:
+        args.append(until)
+        conditions.append(f"creation_time < ${len(args)}")
+    query = f"select {', '.join(RATINGS_COLUMNS)} from ratings"
+    if conditions:
+        query += " where " + " and ".join(conditions)
+    return query, args
+
+
+def _parse_bound(bound: str) -> Optional[datetime]:
+    # MINVALUE and MAXVALUE are None
+    if not bound.startswith("'"):
+        return None
+    return datetime.fromisoformat(bound.strip("'"))
 
 
 class Database:
+    """
+    Ratings and gallery file ids stored in Postgres.
+
+    The connection pool is created by connect, no queries can be made
+    before it is awaited.
+
+    Parameters
+    ----------
+    db_url : Postgres connection string
+
+    model_names : names of the models by their ids
+
+    min_size : amount of connections opened by connect
+
+    max_size : max amount of connections of the pool
+
+    max_queries : amount of queries after which a connection is replaced
+
+    max_inactive_connection_lifetime : seconds after which an idle
+        connection is closed, 0 to keep it open
+
+    partitioned : ratings are partitioned by months of creation_time
+        and indexed by (model_id, creation_time), an existing
+        unpartitioned ratings table is attached as the partition
+        of the months before the next one, see maintain_partitions
+
+    retention_months : partitions older than that many months before
+        the current one are dropped, ratings are kept forever if None
+
+    """
+
     def __init__(
         self,
-        loop: asyncio.AbstractEventLoop,
         db_url: str,
         model_names: List[str],
+        min_size: int = 4,
+        max_size: int = 32,
+        max_queries: int = 50000,
+        max_inactive_connection_lifetime: float = 300.0,
+        partitioned: bool = False,
+        retention_months: Optional[int] = None,
     ):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(
+                "Expected 0 <= min_size <= max_size and max_size > 0"
+            )
+        if retention_months is not None and (
+            not partitioned or retention_months < 1
+        ):
+            raise ValueError(
+                "Expected retention_months to be a positive int "
+                "of partitioned ratings"
+            )
+
+        self.db_url = db_url
         self.model_names = model_names
-        self.pool = loop.run_until_complete(
-            asyncpg.create_pool(max_size=32, dsn=db_url)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_queries = max_queries
+        self.max_inactive_connection_lifetime = (
+            max_inactive_connection_lifetime
+        )
+        self.partitioned = partitioned
+        self.retention_months = retention_months
+        self.pool: Optional[asyncpg.Pool] = None
+
+    async def connect(self):
+        if self.pool is not None:
+            return
+        self.pool = await asyncpg.create_pool(
+            dsn=self.db_url,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            max_queries=self.max_queries,
+            max_inactive_connection_lifetime=(
+                self.max_inactive_connection_lifetime
+            ),
         )
 
     async def create_table(self):
         async with self.pool.acquire() as con:
+            async with con.transaction():
+                # workers of the pre-fork mode create the tables
+                # concurrently on startup
+                await con.execute(
+                    "select pg_advisory_xact_lock(hashtext('create_table'))"
+                )
+                if self.partitioned:
+                    await self.__create_partitioned_ratings(con)
+                else:
+                    await con.execute(
+                        """
+                        create table if not exists ratings(
+                            id serial primary key,
+                            tg_user_id varchar(64) not null,
+                            model_id int not null,
+                            model_name varchar(128),
+                            creation_time timestamp not null
+                                default now()::timestamp)
+                        """
+                    )
+                await con.execute(
+                    """
+                    create table if not exists gallery_file_ids(
+                        gallery_id int primary key,
+                        file_id varchar(256) not null)
+                    """
+                )
+                await self.__create_rating_counts(con)
+                if self.partitioned:
+                    await self.__maintain_partitions(con)
+
+    async def __create_partitioned_ratings(self, con: asyncpg.Connection):
+        kind = await con.fetchval(
+            "select relkind::text from pg_class "
+            "where oid = to_regclass('ratings')"
+        )
+        if kind == "p":
+            return
+
+        if kind == "r":
+            # the legacy table is attached instead of copying it, its
+            # trigger and primary key are replaced by the ones
+            # of the partitioned table
             await con.execute(
-                """
-                create table if not exists ratings(
-                    id serial primary key,
-                    tg_user_id varchar(64) not null,
-                    model_id int not null,
-                    model_name varchar(128),
-                    creation_time timestamp not null default now()::timestamp)
+                "drop trigger if exists ratings_count on ratings"
+            )
+            await con.execute("alter table ratings rename to ratings_legacy")
+            await con.execute(
+                "alter table ratings_legacy drop constraint ratings_pkey"
+            )
+
+        await con.execute(
+            """
+            create table ratings(
+                id serial,
+                tg_user_id varchar(64) not null,
+                model_id int not null,
+                model_name varchar(128),
+                creation_time timestamp not null default now()::timestamp,
+                primary key (id, creation_time))
+            partition by range (creation_time)
+            """
+        )
+        await con.execute(
+            "create index ratings_model_id_creation_time_idx "
+            "on ratings (model_id, creation_time)"
+        )
+        if kind != "r":
+            return
+
+        latest = await con.fetchval(
+            "select coalesce(max(creation_time), now()::timestamp) "
+            "from ratings_legacy"
+        )
+        await con.execute(
+            f"""
+            alter table ratings attach partition ratings_legacy
+            for values from (minvalue) to ('{month_start(latest, 1)}')
+            """
+        )
+        await con.execute(
+            """
+            select setval(
+                pg_get_serial_sequence('ratings', 'id'),
+                coalesce(max(id), 0) + 1,
+                false)
+            from ratings_legacy
+            """
+        )
+
+    async def maintain_partitions(
+        self, now: Optional[datetime] = None
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Creates the partitions of ratings of the current month
+        and PARTITIONS_AHEAD next ones and drops the partitions older
+        than retention_months, their ratings are subtracted from
+        the counts of get_stats.
+
+        Parameters
+        ----------
+        now : the current time, the time of Postgres if None
+
+        Returns
+        -------
+        created : names of the created partitions
+
+        dropped : names of the dropped partitions
+        """
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                await con.execute(
+                    "select pg_advisory_xact_lock(hashtext('create_table'))"
+                )
+                return await self.__maintain_partitions(con, now)
+
+    async def __maintain_partitions(
+        self, con: asyncpg.Connection, now: Optional[datetime] = None
+    ) -> Tuple[List[str], List[str]]:
+        if now is None:
+            now = await con.fetchval("select now()::timestamp")
+        partitions = await self.__partitions(con)
+
+        created = []
+        for months in range(PARTITIONS_AHEAD + 1):
+            start, end = month_start(now, months), month_start(now, months + 1)
+            if any(
+                (lower is None or lower < end)
+                and (upper is None or start < upper)
+                for _, lower, upper in partitions
+            ):
+                continue
+            name = f"ratings_{start:%Y_%m}"
+            await con.execute(
+                f"""
+                create table {name} partition of ratings
+                for values from ('{start}') to ('{end}')
                 """
             )
+            created.append(name)
+
+        dropped = []
+        if self.retention_months is not None:
+            cutoff = month_start(now, -self.retention_months)
+            for name, _, upper in partitions:
+                if upper is None or upper > cutoff:
+                    continue
+                await con.execute(
+                    f"""
+                    update rating_counts
+                    set amount = rating_counts.amount - dropped.amount
+                    from (
+                        select model_id, coalesce(model_name, '') as name,
+                            count(1) as amount
+                        from "{name}" group by (model_id, model_name)
+                    ) as dropped
+                    where rating_counts.model_id = dropped.model_id
+                    and rating_counts.model_name = dropped.name
+                    """
+                )
+                await con.execute(f'drop table "{name}"')
+                dropped.append(name)
+            await con.execute("delete from rating_counts where amount = 0")
+        return created, dropped
+
+    async def __partitions(
+        self, con: asyncpg.Connection
+    ) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+        # (name, lower bound, upper bound) of every partition of ratings
+        records = await con.fetch(
+            """
+            select child.relname as name,
+                pg_get_expr(child.relpartbound, child.oid) as bounds
+            from pg_inherits
+            join pg_class as child on child.oid = pg_inherits.inhrelid
+            where pg_inherits.inhparent = 'ratings'::regclass
+            """
+        )
+        partitions = []
+        for record in records:
+            match = _BOUNDS.search(record["bounds"])
+            if match is not None:
+                partitions.append(
+                    (
+                        record["name"],
+                        _parse_bound(match.group(1)),
+                        _parse_bound(match.group(2)),
+                    )
+                )
+        return partitions
+
+    async def __create_rating_counts(self, con: asyncpg.Connection):
+        # amounts of ratings by model, ratings are never updated
+        # and the ratings of dropped partitions are subtracted
+        await con.execute(
+            """
+            create or replace function count_ratings() returns trigger as $$
+            begin
+                insert into rating_counts
+                select model_id, coalesce(model_name, ''), count(1)
+                from inserted group by (model_id, model_name)
+                on conflict (model_id, model_name) do update
+                set amount = rating_counts.amount + excluded.amount;
+                return null;
+            end
+            $$ language plpgsql
+            """
+        )
+        counted = await con.fetchval(
+            """
+            select exists(
+                select 1 from pg_trigger
+                where tgname = 'ratings_count'
+                and tgrelid = 'ratings'::regclass)
+            """
+        )
+        if counted:
+            return
+
+        # the ratings inserted before the trigger are counted once
+        await con.execute("lock table ratings in share row exclusive mode")
+        await con.execute(
+            """
+            create table if not exists rating_counts(
+                model_id int not null,
+                model_name varchar(128) not null,
+                amount bigint not null,
+                primary key (model_id, model_name))
+            """
+        )
+        await con.execute("truncate rating_counts")
+        await con.execute(
+            """
+            insert into rating_counts
+            select model_id, coalesce(model_name, ''), count(1)
+            from ratings group by (model_id, model_name)
+            """
+        )
+        await con.execute(
+            """
+            create trigger ratings_count after insert on ratings
+            referencing new table as inserted
+            for each statement execute function count_ratings()
+            """
+        )
 
     async def insert_rating(self, user_id: str, model_id: int):
         async with self.pool.acquire() as con:
             await con.execute(
-                "insert into ratings values (default, $1, $2, $3, default)",
+                STATEMENTS["insert_rating"],
                 user_id,
                 model_id,
                 self.model_names[model_id],
             )
 
+    async def insert_ratings(
+        self, ratings: Sequence[Tuple[str, int, datetime]]
+    ):
+        """
+        Inserts (user_id, model_id, creation_time) ratings with a single COPY
+        """
+        async with self.pool.acquire() as con:
+            await con.copy_records_to_table(
+                "ratings",
+                records=[
+                    (user_id, model_id, self.model_names[model_id], created)
+                    for user_id, model_id, created in ratings
+                ],
+                columns=[
+                    "tg_user_id",
+                    "model_id",
+                    "model_name",
+                    "creation_time",
+                ],
+            )
+
     async def view_ratings(self, model_id: int) -> List[asyncpg.Record]:
+        async with self.pool.acquire() as con:
+            return await con.fetch(STATEMENTS["view_ratings"], model_id)
+
+    async def get_stats(self) -> List[asyncpg.Record]:
         async with self.pool.acquire() as con:
             return await con.fetch(
+                STATEMENTS["get_stats"],
+            )
+
+    async def export_ratings(
+        self,
+        output: Any,
+        model_ids: Optional[Sequence[int]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> int:
+        """
+        Writes the ratings of model_ids created in [since, until)
+        to output as CSV with a header by COPY, the rows are streamed
+        by the server and are not kept in memory.
+
+        Parameters
+        ----------
+        output : binary file-like object or async function
+            called with every chunk of bytes
+
+        Returns
+        -------
+        amount of the exported ratings
+        """
+        query, args = _ratings_query(model_ids, since, until)
+        async with self.pool.acquire() as con:
+            status = await con.copy_from_query(
+                query, *args, output=output, format="csv", header=True
+            )
+        return int(status.split()[-1])
+
+    async def iter_ratings(
+        self,
+        model_ids: Optional[Sequence[int]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        chunk_size: int = 10000,
+    ) -> AsyncIterator[List[asyncpg.Record]]:
+        """
+        Yields the ratings of model_ids created in [since, until)
+        by chunks of chunk_size records read from a server-side cursor.
+        """
+        query, args = _ratings_query(model_ids, since, until)
+        async with self.pool.acquire() as con:
+            async with con.transaction(readonly=True):
+                cursor = await con.cursor(query, *args)
+                while True:
+                    records = await cursor.fetch(chunk_size)
+                    if not records:
+                        return
+                    yield records
+
+    async def insert_file_id(self, gallery_id: int, file_id: str):
+        async with self.pool.acquire() as con:
+            await con.execute(
                 """
-                select model_id, model_name, count(1) as amount
-                from ratings where model_id = $1
-                group by (model_id, model_name)
+                insert into gallery_file_ids values ($1, $2)
+                on conflict (gallery_id) do update set file_id = $2
                 """,
-                model_id,
+                gallery_id,
+                file_id,
             )
 
-    async def get_stats(self) -> List[asyncpg.Record]:
+    async def get_file_ids(self) -> Dict[int, str]:
         async with self.pool.acquire() as con:
-            return await con.fetch(
-                """
-                select model_id, model_name, count(1) as amount
-                from ratings group by (model_id, model_name)
-                """
+            records = await con.fetch(
+                "select gallery_id, file_id from gallery_file_ids"
             )
+        return {record["gallery_id"]: record["file_id"] for record in records}
 
     async def close_connection(self):
-        await self.pool.close()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
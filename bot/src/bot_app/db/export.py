@@ -0,0 +1,204 @@
+"""
+Exports ratings for offline evaluation in constant memory.
+
+CSV is streamed by COPY and gzip compressed if the output ends with
+".gz", Parquet is written by chunks read from a server-side cursor and
+requires pyarrow. The export uses a connection of its own, not the pool
+of the bot, and reports the amount of exported rows per second.
+
+Usage (from the db directory):
+
+    python -m export ratings.csv.gz --db-url postgresql://...
+    python -m export ratings.parquet --models 0 2 \\
+        --since 2026-01-01 --until 2026-07-01
+"""
+import os
+import sys
+import gzip
+import time
+import asyncio
+import argparse
+
+from datetime import datetime
+from typing import Any, BinaryIO, List, Optional, Sequence
+from database import Database, RATINGS_COLUMNS
+
+
+class Progress:
+    """
+    Prints the amount of exported rows and rows per second
+    to file at most every interval seconds.
+    """
+
+    def __init__(self, interval: float = 5.0, file: Any = sys.stderr):
+        self.interval = interval
+        self.file = file
+        self.rows = 0
+        self.started = time.monotonic()
+        self.reported = self.started
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.rows / max(self.elapsed, 1e-9)
+
+    def update(self, rows: int):
+        self.rows += rows
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            print(
+                f"{self.rows} rows, {self.rate:.0f} rows/s",
+                file=self.file,
+                flush=True,
+            )
+
+
+async def export_csv(
+    db: Database,
+    output: BinaryIO,
+    progress: Progress,
+    model_ids: Optional[Sequence[int]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> int:
+    """
+    Writes the ratings to output as CSV with a header by COPY.
+    """
+
+    async def write(chunk: bytes):
+        output.write(chunk)
+        # the exported columns never contain line breaks
+        progress.update(chunk.count(b"\n"))
+
+    rows = await db.export_ratings(write, model_ids, since, until)
+    # the header is not a row
+    progress.rows = rows
+    return rows
+
+
+async def export_parquet(
+    db: Database,
+    path: str,
+    progress: Progress,
+    model_ids: Optional[Sequence[int]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    chunk_size: int = 100000,
+) -> int:
+    """
+    Writes the ratings to path in Parquet format, a row group
+    for every chunk_size ratings.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Expected pyarrow to be installed for Parquet")
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("tg_user_id", pa.string()),
+            ("model_id", pa.int32()),
+            ("model_name", pa.string()),
+            ("creation_time", pa.timestamp("us")),
+        ]
+    )
+    with pq.ParquetWriter(path, schema) as writer:
+        async for records in db.iter_ratings(
+            model_ids, since, until, chunk_size
+        ):
+            writer.write_table(
+                pa.table(
+                    {
+                        column: [record[column] for record in records]
+                        for column in RATINGS_COLUMNS
+                    },
+                    schema=schema,
+                )
+            )
+            progress.update(len(records))
+    return progress.rows
+
+
+async def export(
+    db_url: str,
+    path: str,
+    file_format: str,
+    model_ids: Optional[List[int]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    chunk_size: int = 100000,
+    progress: Optional[Progress] = None,
+) -> int:
+    """
+    Exports the ratings to path in file_format, "csv" or "parquet",
+    CSV is gzip compressed if path ends with ".gz".
+    """
+    if file_format not in ("csv", "parquet"):
+        raise ValueError(f"Expected csv or parquet, got: {file_format}")
+    if progress is None:
+        progress = Progress()
+
+    db = Database(db_url, [], min_size=1, max_size=1)
+    await db.connect()
+    try:
+        if file_format == "parquet":
+            return await export_parquet(
+                db, path, progress, model_ids, since, until, chunk_size
+            )
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wb") as output:
+            return await export_csv(
+                db, output, progress, model_ids, since, until
+            )
+    finally:
+        await db.close_connection()
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Export ratings")
+    parser.add_argument(
+        "output", help=".csv, .csv.gz or .parquet file to export to"
+    )
+    parser.add_argument(
+        "--db-url", default=os.environ.get("DATABASE_URL"), help="Postgres"
+    )
+    parser.add_argument("--format", choices=["csv", "parquet"])
+    parser.add_argument("--models", type=int, nargs="+")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    if not args.db_url:
+        parser.error("Expected --db-url or DATABASE_URL")
+    file_format = args.format or (
+        "parquet" if args.output.endswith(".parquet") else "csv"
+    )
+
+    progress = Progress()
+    rows = asyncio.run(
+        export(
+            args.db_url,
+            args.output,
+            file_format,
+            args.models,
+            args.since,
+            args.until,
+            args.chunk_size,
+            progress,
+        )
+    )
+    print(
+        f"Exported {rows} ratings to {args.output} in "
+        f"{progress.elapsed:.2f}s ({progress.rate:.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
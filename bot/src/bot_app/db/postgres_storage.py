@@ -0,0 +1,451 @@
+import json
+import time
+import uuid
+import asyncio
+import asyncpg
+import logging
+
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+from aiogram.dispatcher.storage import BaseStorage
+
+Address = Union[str, int, None]
+Key = Tuple[str, str]
+
+CHANNEL = "fsm_states"
+RECONNECT_DELAY = 1.0
+
+
+class _Record(NamedTuple):
+    state: Optional[str] = None
+    data: Optional[dict] = None
+    bucket: Optional[dict] = None
+
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data and not self.bucket
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM storage of aiogram shared by the bot instances through
+    the fsm_states table.
+
+    Writes are applied to an in-process cache at once and written to
+    the table by batches every flush_interval seconds, a batch keeps
+    the last write of every (chat, user). Every batch notifies the other
+    instances, which drop the written records from their caches, so
+    a record read from the cache is not older than the last batch
+    notified. Reads missing the cache are read from the table.
+    While the connection listening to the notifications is lost,
+    the cache is dropped and bypassed until it is listening again.
+
+    Parameters
+    ----------
+    database : Database with a connected pool, a connection of the pool
+        is held to listen to the notifications
+
+    cache_size : max amount of cached records, the least recently used
+        records are evicted first
+
+    cache_ttl : seconds a record read from the table stays cached for
+
+    flush_interval : seconds between the batches of writes
+
+    """
+
+    def __init__(
+        self,
+        database: Any,
+        cache_size: int = 100000,
+        cache_ttl: float = 60.0,
+        flush_interval: float = 0.01,
+    ):
+        if not isinstance(cache_size, int) or cache_size < 1:
+            raise ValueError("Expected cache_size to be a positive int")
+        if cache_ttl <= 0 or flush_interval <= 0:
+            raise ValueError("Expected positive cache_ttl and flush_interval")
+
+        self.database = database
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        # notifications of the instance itself are skipped
+        self.instance = uuid.uuid4().hex
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.reconnects = 0
+
+        self._cache: "OrderedDict[Key, Tuple[float, _Record]]" = OrderedDict()
+        self._pending: Dict[Key, _Record] = {}
+        self._flushing: Dict[Key, _Record] = {}
+        # [reads in progress, invalidations during them] of the keys
+        # being read from the table
+        self._reads: Dict[Key, List[int]] = {}
+        self._listener: Optional[asyncpg.Connection] = None
+        self._reconnecting: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self):
+        """
+        Creates the table, starts listening to the notifications
+        and writing the batches.
+        """
+        async with self.database.pool.acquire() as con:
+            async with con.transaction():
+                await con.execute(
+                    "select pg_advisory_xact_lock(hashtext('fsm_states'))"
+                )
+                await con.execute(
+                    """
+                    create table if not exists fsm_states(
+                        chat_id varchar(64) not null,
+                        user_id varchar(64) not null,
+                        state varchar(256),
+                        data jsonb,
+                        bucket jsonb,
+                        update_time timestamp not null
+                            default now()::timestamp,
+                        primary key (chat_id, user_id))
+                    """
+                )
+
+        await self.__listen()
+        self._task = asyncio.ensure_future(self.__run())
+
+    async def __listen(self):
+        listener = await self.database.pool.acquire()
+        try:
+            await listener.add_listener(CHANNEL, self.__invalidate)
+        except BaseException:
+            await self.database.pool.release(listener)
+            raise
+        listener.add_termination_listener(self.__on_termination)
+        self._listener = listener
+
+    async def __unlisten(self, listener: asyncpg.Connection):
+        listener.remove_termination_listener(self.__on_termination)
+        await listener.remove_listener(CHANNEL, self.__invalidate)
+        await self.database.pool.release(listener)
+
+    def __on_termination(self, connection: asyncpg.Connection):
+        # the notifications sent until listening again are lost,
+        # so neither the cached records nor the rows being read
+        # can be trusted
+        listener, self._listener = self._listener, None
+        self._cache.clear()
+        if self._closed:
+            return
+        logging.warning("Lost the FSM states notifications, reconnecting")
+        for reads in self._reads.values():
+            reads[1] += 1
+        self._reconnecting = asyncio.ensure_future(self.__reconnect(listener))
+
+    async def __reconnect(self, listener: asyncpg.Connection):
+        # the pool may have taken the closed connection back already
+        await self.database.pool.release(listener)
+        while True:
+            try:
+                await self.__listen()
+            except Exception:
+                logging.exception("Failed to listen to the FSM states")
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            self.reconnects += 1
+            self._reconnecting = None
+            return
+
+    def __key(self, chat: Address, user: Address) -> Key:
+        chat, user = self.check_address(chat=chat, user=user)
+        return str(chat), str(user)
+
+    def __invalidate(self, connection, pid, channel, payload: str):
+        instance, _, key = payload.partition(":")
+        if instance == self.instance:
+            return
+        chat, user = json.loads(key)
+        reads = self._reads.get((chat, user))
+        if reads is not None:
+            reads[1] += 1
+        if self._cache.pop((chat, user), None) is not None:
+            self.invalidations += 1
+
+    def __cache(self, key: Key, record: _Record):
+        if self._listener is None:
+            return
+        self._cache[key] = (time.monotonic() + self.cache_ttl, record)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def __get(self, key: Key) -> _Record:
+        for writes in (self._pending, self._flushing):
+            if key in writes:
+                return writes[key]
+
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        reads = self._reads.setdefault(key, [0, 0])
+        reads[0] += 1
+        invalidations = reads[1]
+        try:
+            async with self.database.pool.acquire() as con:
+                row = await con.fetchrow(
+                    "select state, data, bucket from fsm_states "
+                    "where chat_id = $1 and user_id = $2",
+                    *key,
+                )
+        finally:
+            reads[0] -= 1
+            if not reads[0]:
+                del self._reads[key]
+        # a write made while reading is newer than the row
+        for writes in (self._pending, self._flushing):
+            if key in writes:
+                return writes[key]
+        if key in self._cache:
+            return self._cache[key][1]
+
+        record = _Record()
+        if row is not None:
+            record = _Record(
+                row["state"],
+                json.loads(row["data"]) if row["data"] else None,
+                json.loads(row["bucket"]) if row["bucket"] else None,
+            )
+        # the row may have been read before a write of another instance
+        # it was notified about while reading
+        if reads[1] == invalidations:
+            self.__cache(key, record)
+        return record
+
+    def __put(self, key: Key, record: _Record):
+        self._pending[key] = record
+        self.__cache(key, record)
+
+    async def __run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self._pending:
+                continue
+            try:
+                await self.flush()
+            except Exception:
+                self.failed_flushes += 1
+                logging.exception("Failed to write FSM states")
+
+    async def flush(self):
+        """
+        Writes the pending records to the table in a single transaction
+        and notifies the other instances about them.
+        """
+        if not self._pending or self._flushing:
+            return
+        self._flushing, self._pending = self._pending, {}
+        try:
+            await self.__write(self._flushing)
+            self.flushes += 1
+            self.flushed += len(self._flushing)
+        except BaseException:
+            # the writes made during the flush are newer
+            self._flushing.update(self._pending)
+            self._pending = self._flushing
+            raise
+        finally:
+            self._flushing = {}
+
+    async def __write(self, records: Dict[Key, _Record]):
+        written = list(records.items())
+        upserted = [item for item in written if not item[1].is_empty()]
+        deleted = [key for key, record in written if record.is_empty()]
+
+        async with self.database.pool.acquire() as con:
+            async with con.transaction():
+                if upserted:
+                    await con.execute(
+                        """
+                        insert into fsm_states
+                            (chat_id, user_id, state, data, bucket)
+                        select * from unnest(
+                            $1::varchar[], $2::varchar[], $3::varchar[],
+                            $4::jsonb[], $5::jsonb[])
+                        on conflict (chat_id, user_id) do update
+                        set state = excluded.state,
+                            data = excluded.data,
+                            bucket = excluded.bucket,
+                            update_time = now()::timestamp
+                        """,
+                        [key[0] for key, _ in upserted],
+                        [key[1] for key, _ in upserted],
+                        [record.state for _, record in upserted],
+                        [_dumps(record.data) for _, record in upserted],
+                        [_dumps(record.bucket) for _, record in upserted],
+                    )
+                if deleted:
+                    await con.execute(
+                        """
+                        delete from fsm_states
+                        where (chat_id, user_id) in (
+                            select * from unnest($1::varchar[], $2::varchar[]))
+                        """,
+                        [key[0] for key in deleted],
+                        [key[1] for key in deleted],
+                    )
+                # delivered to the listeners on commit
+                await con.execute(
+                    "select pg_notify($1, payload) from unnest($2::text[]) "
+                    "as payload",
+                    CHANNEL,
+                    [
+                        f"{self.instance}:{json.dumps(list(key))}"
+                        for key, _ in written
+                    ],
+                )
+
+    async def get_state(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        default: Optional[str] = None,
+    ) -> Optional[str]:
+        record = await self.__get(self.__key(chat, user))
+        if record.state is None:
+            return self.resolve_state(default)
+        return record.state
+
+    async def set_state(
+        self, *, chat: Address = None, user: Address = None, state: Any = None
+    ):
+        key = self.__key(chat, user)
+        record = await self.__get(key)
+        self.__put(key, record._replace(state=self.resolve_state(state)))
+
+    async def get_data(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        default: Optional[dict] = None,
+    ) -> Dict:
+        record = await self.__get(self.__key(chat, user))
+        return _copy(record.data or default)
+
+    async def set_data(
+        self, *, chat: Address = None, user: Address = None, data: Dict = None
+    ):
+        key = self.__key(chat, user)
+        record = await self.__get(key)
+        self.__put(key, record._replace(data=_copy(data) or None))
+
+    async def update_data(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        data: Dict = None,
+        **kwargs,
+    ):
+        key = self.__key(chat, user)
+        record = await self.__get(key)
+        updated = _copy(record.data)
+        updated.update(data or {}, **kwargs)
+        self.__put(key, record._replace(data=updated or None))
+
+    def has_bucket(self) -> bool:
+        return True
+
+    async def get_bucket(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        default: Optional[dict] = None,
+    ) -> Dict:
+        record = await self.__get(self.__key(chat, user))
+        return _copy(record.bucket or default)
+
+    async def set_bucket(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        bucket: Dict = None,
+    ):
+        key = self.__key(chat, user)
+        record = await self.__get(key)
+        self.__put(key, record._replace(bucket=_copy(bucket) or None))
+
+    async def update_bucket(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        bucket: Dict = None,
+        **kwargs,
+    ):
+        key = self.__key(chat, user)
+        record = await self.__get(key)
+        updated = _copy(record.bucket)
+        updated.update(bucket or {}, **kwargs)
+        self.__put(key, record._replace(bucket=updated or None))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached": len(self._cache),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "reconnects": self.reconnects,
+        }
+
+    async def close(self):
+        """
+        Writes the pending records and stops listening, the pool
+        of the database must be open.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for task in (self._task, self._reconnecting):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        except Exception:
+            logging.exception(f"Dropped {len(self._pending)} FSM states")
+        if self._listener is not None:
+            await self.__unlisten(self._listener)
+            self._listener = None
+        self._cache.clear()
+
+    async def wait_closed(self):
+        pass
+
+
+def _dumps(value: Optional[dict]) -> Optional[str]:
+    return json.dumps(value) if value else None
+
+
+def _copy(value: Optional[dict]) -> dict:
+    # records are shared by the cache, the batches and the callers
+    return json.loads(json.dumps(value)) if value else {}
@@ -0,0 +1,188 @@
+import time
+import asyncio
+import logging
+
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+Rating = Tuple[str, int, datetime]
+
+
+class RatingBuffer:
+    """
+    Write-behind buffer of ratings: add returns as soon as the rating is
+    queued, the queued ratings are written by Database.insert_ratings
+    in batches of up to batch_size or every flush_interval seconds.
+
+    add waits while max_size ratings are queued and not written yet,
+    the ratings of a failed batch are kept and written again.
+    The creation time of a rating is the time it is added, so it does
+    not depend on how long the rating waits to be written.
+
+    Parameters
+    ----------
+    database : Database to write the ratings to
+
+    max_size : max amount of queued ratings
+
+    batch_size : max amount of ratings written at once
+
+    flush_interval : max seconds a rating stays in the queue
+        while the database is available
+
+    stats_window : amount of the last batches the stats are taken over
+
+    observe_flush : function called with the seconds every written batch
+        took to write, e.g. observe of a latency histogram
+
+    """
+
+    def __init__(
+        self,
+        database,
+        max_size: int = 10000,
+        batch_size: int = 1000,
+        flush_interval: float = 1.0,
+        stats_window: int = 1000,
+        observe_flush: Optional[Callable[[float], Any]] = None,
+    ):
+        if not isinstance(max_size, int) or max_size < 1:
+            raise ValueError("Expected max_size to be a positive int")
+        if not isinstance(batch_size, int) or not 0 < batch_size <= max_size:
+            raise ValueError(
+                "Expected batch_size to be a positive int not more "
+                "than max_size"
+            )
+        if flush_interval <= 0:
+            raise ValueError("Expected flush_interval to be positive")
+
+        self.database = database
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.observe_flush = observe_flush
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.batch_sizes: Deque[int] = deque(maxlen=stats_window)
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch: List[Rating] = []
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Future] = None
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # created lazily to be bound to the running loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_size)
+        return self._queue
+
+    @property
+    def pending(self) -> int:
+        """
+        Amount of ratings added and not written yet.
+        """
+        return self.queue.qsize() + len(self._batch)
+
+    def start(self):
+        """
+        Starts writing the queued ratings in the background.
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.__run())
+
+    async def add(self, user_id: str, model_id: int):
+        """
+        Queues the rating created now, waits while the queue is full.
+        """
+        if self._task is None:
+            raise RuntimeError("Expected RatingBuffer to be started")
+        await self.queue.put((user_id, model_id, datetime.now()))
+
+    async def __run(self):
+        while True:
+            if not self._batch:
+                self._batch.append(await self.queue.get())
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(
+                        await asyncio.wait_for(self.queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            # a write is not interrupted by close, it waits for it instead
+            self._flushing = asyncio.ensure_future(self.__flush())
+            flushed = await asyncio.shield(self._flushing)
+            self._flushing = None
+            if not flushed:
+                await asyncio.sleep(self.flush_interval)
+
+    def __take_queued(self):
+        while len(self._batch) < self.batch_size:
+            try:
+                self._batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    async def __flush(self) -> bool:
+        started = time.perf_counter()
+        try:
+            await self.database.insert_ratings(self._batch)
+        except Exception:
+            self.failed_flushes += 1
+            logging.exception(f"Failed to write {len(self._batch)} ratings")
+            return False
+
+        if self.observe_flush is not None:
+            self.observe_flush(time.perf_counter() - started)
+        self.batch_sizes.append(len(self._batch))
+        self.flushed += len(self._batch)
+        self._batch = []
+        return True
+
+    async def close(self):
+        """
+        Stops the background writing and writes the queued ratings,
+        the ones that could not be written are logged and dropped.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+
+        self.__take_queued()
+        while self._batch:
+            if not await self.__flush():
+                logging.error(f"Dropped {self.pending} ratings")
+                self._batch = []
+                self._queue = None
+                return
+            self.__take_queued()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Counters of the written ratings and sizes of the last batches.
+        """
+        stats = {
+            "pending": self.pending,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "batches": len(self.batch_sizes),
+        }
+        if self.batch_sizes:
+            stats.update(
+                mean_batch_size=sum(self.batch_sizes) / len(self.batch_sizes),
+                max_batch_size=max(self.batch_sizes),
+            )
+        return stats
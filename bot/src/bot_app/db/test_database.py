@@ -4,7 +4,8 @@ import psycopg2
 import asyncio
 
 from environs import Env
-from database import Database
+from datetime import datetime
+from database import Database, STATEMENTS, month_start
 
 env = Env()
 env.read_env()
@@ -17,25 +18,97 @@ loop = asyncio.new_event_loop()
 asyncio.set_event_loop(loop)
 
 
+def drop_tables():
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.execute("drop table ratings")
+            curs.execute("drop table gallery_file_ids")
+            curs.execute("drop table rating_counts")
+            curs.execute("drop function count_ratings")
+
+
+def created_now(values):
+    return [
+        (user_id, model_id, datetime.now()) for user_id, model_id in values
+    ]
+
+
 @pytest.fixture
 def db():
-    db = Database(loop, TEST_DB_URL, model_names)
+    db = Database(TEST_DB_URL, model_names)
+    loop.run_until_complete(db.connect())
     loop.run_until_complete(db.create_table())
 
     yield db
 
     loop.run_until_complete(db.close_connection())
-
-    conn = psycopg2.connect(TEST_DB_URL)
-    with conn:
-        with conn.cursor() as curs:
-            curs.execute("drop table ratings")
+    drop_tables()
 
 
 def test_create_table(db):
     pass
 
 
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"min_size": 5, "max_size": 4},
+        {"min_size": -1},
+        {"min_size": 0, "max_size": 0},
+    ],
+)
+def test_incorrect_pool_size(kwargs):
+    with pytest.raises(ValueError):
+        _ = Database(TEST_DB_URL, model_names, **kwargs)
+
+
+def test_no_connection_before_connect():
+    # the url is not used until connect is awaited
+    db = Database("postgresql://nobody@127.0.0.1:1/none", model_names)
+    assert db.pool is None
+    loop.run_until_complete(db.close_connection())
+
+
+def test_statements_prepared_once(db):
+    async def get_prepared():
+        await db.close_connection()
+        db.min_size = db.max_size = 1
+        await db.connect()
+        for _ in range(3):
+            await db.insert_rating("TG_ID", 1)
+            await db.get_stats()
+        async with db.pool.acquire() as con:
+            return await con.fetch(
+                "select statement from pg_prepared_statements"
+            )
+
+    prepared = [
+        record["statement"]
+        for record in loop.run_until_complete(get_prepared())
+    ]
+    for name in ("insert_rating", "get_stats"):
+        assert prepared.count(STATEMENTS[name]) == 1
+
+
+def test_connections_recycled(db):
+    async def get_stats():
+        await db.close_connection()
+        db.min_size = db.max_size = 1
+        db.max_queries = 2
+        await db.connect()
+        pids = set()
+        for _ in range(5):
+            await db.insert_rating("TG_ID", 3)
+            async with db.pool.acquire() as con:
+                pids.add(con.get_server_pid())
+        return pids, await db.view_ratings(3)
+
+    pids, results = loop.run_until_complete(get_stats())
+    assert len(pids) > 1
+    assert results[0]["amount"] == 5
+
+
 @pytest.mark.parametrize(
     "values",
     [
@@ -61,6 +134,36 @@ def test_insert_ratings(db, values):
                 assert value == content_el[1:3]
 
 
+@pytest.mark.parametrize(
+    "values",
+    [
+        [("318591385", 1), ("1385719835", 5)],
+        [("TG_ID", j) for i in range(8) for j in range(8)],
+        [(f"TG_ID{i}", i % 10) for i in range(5000)],
+    ],
+)
+def test_insert_ratings_copy(db, values):
+    created = datetime(2022, 3, 1, 12, 30, 15, 250)
+    loop.run_until_complete(
+        db.insert_ratings(
+            [(user_id, model_id, created) for user_id, model_id in values]
+        )
+    )
+
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.execute(
+                "select tg_user_id, model_id, model_name, creation_time "
+                "from ratings order by id"
+            )
+            content = curs.fetchall()
+    assert content == [
+        (user_id, model_id, model_names[model_id], created)
+        for user_id, model_id in values
+    ]
+
+
 @pytest.mark.parametrize(
     "values,to_view,expected",
     [
@@ -112,3 +215,272 @@ def test_get_stats(db, values, expected):
 
     for result in results:
         assert expected[result["model_id"]] == result["amount"]
+
+
+@pytest.mark.parametrize(
+    "values,expected",
+    [
+        ([("318591385", 1), ("1385719835", 5)], {1: 1, 5: 1}),
+        (
+            [(f"TG_ID{i}", i % 10) for i in range(5000)],
+            {i: 500 for i in range(10)},
+        ),
+    ],
+)
+def test_get_stats_after_copy(db, values, expected):
+    values = created_now(values)
+
+    async def get_stats():
+        await db.insert_ratings(values[: len(values) // 2])
+        await db.insert_ratings(values[len(values) // 2 :])
+        return await db.get_stats()
+
+    results = loop.run_until_complete(get_stats())
+
+    assert {
+        result["model_id"]: result["amount"] for result in results
+    } == expected
+
+
+def test_rating_counts_backfill():
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.execute(
+                """
+                create table ratings(
+                    id serial primary key,
+                    tg_user_id varchar(64) not null,
+                    model_id int not null,
+                    model_name varchar(128),
+                    creation_time timestamp not null
+                        default now()::timestamp)
+                """
+            )
+            curs.execute(
+                "insert into ratings (tg_user_id, model_id, model_name) "
+                "values ('TG_ID', 1, 'model1'), ('TG_ID', 1, 'model1'), "
+                "('TG_ID', 2, 'model2')"
+            )
+
+    db = Database(TEST_DB_URL, model_names)
+
+    async def get_stats():
+        await db.connect()
+        await db.create_table()
+        # the existing ratings are not counted twice
+        await db.create_table()
+        await db.insert_rating("TG_ID", 2)
+        return await db.get_stats()
+
+    results = loop.run_until_complete(get_stats())
+    loop.run_until_complete(db.close_connection())
+    drop_tables()
+
+    assert [tuple(result) for result in results] == [
+        (1, "model1", 2),
+        (2, "model2", 2),
+    ]
+
+
+@pytest.mark.parametrize(
+    "values,expected",
+    [
+        ([], {}),
+        ([(0, "file_0"), (5, "file_5")], {0: "file_0", 5: "file_5"}),
+        ([(1, "old"), (2, "file_2"), (1, "new")], {1: "new", 2: "file_2"}),
+    ],
+)
+def test_file_ids(db, values, expected):
+    results = None
+
+    async def get_file_ids():
+        for value in values:
+            await db.insert_file_id(*value)
+        nonlocal results
+        results = await db.get_file_ids()
+
+    loop.run_until_complete(get_file_ids())
+
+    assert results == expected
+
+
+@pytest.fixture
+def partitioned_db():
+    db = Database(
+        TEST_DB_URL, model_names, partitioned=True, retention_months=2
+    )
+    loop.run_until_complete(db.connect())
+    loop.run_until_complete(db.create_table())
+
+    yield db
+
+    loop.run_until_complete(db.close_connection())
+    drop_tables()
+
+
+def insert_dated_ratings(values):
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.executemany(
+                "insert into ratings (tg_user_id, model_id, model_name, "
+                "creation_time) values (%s, %s, %s, %s)",
+                [
+                    (user_id, model_id, model_names[model_id], time)
+                    for user_id, model_id, time in values
+                ],
+            )
+
+
+def fetch(query):
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.execute(query)
+            return curs.fetchall()
+
+
+@pytest.mark.parametrize(
+    "time,months,expected",
+    [
+        (datetime(2030, 1, 15, 12), 0, datetime(2030, 1, 1)),
+        (datetime(2030, 1, 1), 1, datetime(2030, 2, 1)),
+        (datetime(2030, 12, 31), 1, datetime(2031, 1, 1)),
+        (datetime(2030, 1, 31), -2, datetime(2029, 11, 1)),
+        (datetime(2030, 3, 1), -14, datetime(2029, 1, 1)),
+    ],
+)
+def test_month_start(time, months, expected):
+    assert month_start(time, months) == expected
+
+
+def test_incorrect_retention():
+    with pytest.raises(ValueError):
+        _ = Database(TEST_DB_URL, model_names, retention_months=2)
+    with pytest.raises(ValueError):
+        _ = Database(
+            TEST_DB_URL, model_names, partitioned=True, retention_months=0
+        )
+
+
+def test_partitioned_ratings(partitioned_db):
+    async def get_stats():
+        await partitioned_db.insert_rating("TG_ID", 1)
+        await partitioned_db.insert_ratings(
+            created_now([("TG_ID", 1), ("TG_ID", 2)])
+        )
+        return await partitioned_db.get_stats()
+
+    results = loop.run_until_complete(get_stats())
+
+    assert [tuple(result) for result in results] == [
+        (1, "model1", 2),
+        (2, "model2", 1),
+    ]
+    assert fetch("select relkind from pg_class where relname = 'ratings'") == [
+        ("p",)
+    ]
+    assert fetch(
+        "select count(1) from pg_indexes "
+        "where indexname = 'ratings_model_id_creation_time_idx'"
+    ) == [(1,)]
+
+
+def test_partitions_created(partitioned_db):
+    created, dropped = loop.run_until_complete(
+        partitioned_db.maintain_partitions(datetime(2040, 11, 20))
+    )
+    assert created == ["ratings_2040_11", "ratings_2040_12", "ratings_2041_01"]
+
+    # the partitions are created once
+    created, _ = loop.run_until_complete(
+        partitioned_db.maintain_partitions(datetime(2040, 12, 1))
+    )
+    assert created == ["ratings_2041_02"]
+
+
+def test_copied_ratings_partitioned(partitioned_db):
+    async def insert():
+        await partitioned_db.maintain_partitions(datetime(2040, 1, 1))
+        # the ratings go to the partitions of their creation time,
+        # not of the time they are written
+        await partitioned_db.insert_ratings(
+            [
+                ("TG_ID", 1, datetime(2040, 1, 31, 23, 59)),
+                ("TG_ID", 2, datetime(2040, 2, 1)),
+            ]
+        )
+
+    loop.run_until_complete(insert())
+
+    assert fetch(
+        "select tableoid::regclass::text, model_id from ratings order by id"
+    ) == [("ratings_2040_01", 1), ("ratings_2040_02", 2)]
+
+
+def test_partitions_retention(partitioned_db):
+    loop.run_until_complete(
+        partitioned_db.maintain_partitions(datetime(2040, 1, 1))
+    )
+    insert_dated_ratings(
+        [("TG_ID", 1, datetime(2040, 1, 10)) for _ in range(3)]
+        + [("TG_ID", 2, datetime(2040, 1, 20))]
+        + [("TG_ID", 2, datetime(2040, 3, 5))]
+    )
+
+    async def maintain():
+        # ratings of 2040-02 and later are kept until 2040-05
+        created, dropped = await partitioned_db.maintain_partitions(
+            datetime(2040, 4, 10)
+        )
+        return dropped, await partitioned_db.get_stats()
+
+    dropped, results = loop.run_until_complete(maintain())
+
+    assert "ratings_2040_01" in dropped
+    assert "ratings_2040_03" not in dropped
+    assert [tuple(result) for result in results] == [(2, "model2", 1)]
+    assert fetch("select model_id from ratings") == [(2,)]
+
+
+def test_legacy_ratings_migration():
+    legacy = Database(TEST_DB_URL, model_names)
+
+    async def fill_legacy():
+        await legacy.connect()
+        await legacy.create_table()
+        await legacy.insert_ratings(
+            created_now([("TG_ID", 1), ("TG_ID", 1), ("TG_ID", 3)])
+        )
+        await legacy.close_connection()
+
+    loop.run_until_complete(fill_legacy())
+    insert_dated_ratings([("TG_ID", 3, datetime(2020, 5, 1))])
+
+    db = Database(TEST_DB_URL, model_names, partitioned=True)
+
+    async def migrate():
+        await db.connect()
+        await db.create_table()
+        # the migrated table is not migrated again
+        await db.create_table()
+        await db.insert_rating("TG_ID", 3)
+        return await db.get_stats()
+
+    results = loop.run_until_complete(migrate())
+    loop.run_until_complete(db.close_connection())
+    partitions = fetch(
+        "select child.relname from pg_inherits join pg_class as child "
+        "on child.oid = pg_inherits.inhrelid "
+        "where pg_inherits.inhparent = 'ratings'::regclass"
+    )
+    ids = fetch("select id from ratings order by id")
+    drop_tables()
+
+    assert [tuple(result) for result in results] == [
+        (1, "model1", 2),
+        (3, "model3", 3),
+    ]
+    assert ("ratings_legacy",) in partitions
+    assert [row[0] for row in ids] == [1, 2, 3, 4, 5]
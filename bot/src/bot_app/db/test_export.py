@@ -0,0 +1,168 @@
+import io
+import csv
+import gzip
+import pytest
+import psycopg2
+import asyncio
+
+from datetime import datetime
+from environs import Env
+from database import Database
+from export import Progress, export, main
+
+env = Env()
+env.read_env()
+
+TEST_DB_URL = env.str("TEST_DB_URL")
+
+model_names = [f"model{i}" for i in range(10)]
+
+loop = asyncio.new_event_loop()
+asyncio.set_event_loop(loop)
+
+RATINGS = [
+    (f"TG_ID{i}", i % 3, datetime(2026, 1 + i % 6, 1 + i % 28))
+    for i in range(1000)
+]
+
+
+@pytest.fixture
+def db():
+    db = Database(TEST_DB_URL, model_names)
+    loop.run_until_complete(db.connect())
+    loop.run_until_complete(db.create_table())
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.executemany(
+                "insert into ratings (tg_user_id, model_id, model_name, "
+                "creation_time) values (%s, %s, %s, %s)",
+                [
+                    (user_id, model_id, model_names[model_id], time)
+                    for user_id, model_id, time in RATINGS
+                ],
+            )
+
+    yield db
+
+    loop.run_until_complete(db.close_connection())
+    with conn:
+        with conn.cursor() as curs:
+            curs.execute("drop table ratings")
+            curs.execute("drop table gallery_file_ids")
+            curs.execute("drop table rating_counts")
+            curs.execute("drop function count_ratings")
+
+
+def expected_ratings(model_ids=None, since=None, until=None):
+    return sorted(
+        (user_id, model_id)
+        for user_id, model_id, time in RATINGS
+        if (model_ids is None or model_id in model_ids)
+        and (since is None or time >= since)
+        and (until is None or time < until)
+    )
+
+
+FILTERS = [
+    {},
+    {"model_ids": [1]},
+    {"model_ids": [0, 2], "since": datetime(2026, 3, 1)},
+    {"since": datetime(2026, 2, 1), "until": datetime(2026, 4, 1)},
+    {"model_ids": [9]},
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_export_ratings(db, filters):
+    output = io.BytesIO()
+    rows = loop.run_until_complete(db.export_ratings(output, **filters))
+
+    reader = csv.DictReader(io.StringIO(output.getvalue().decode()))
+    exported = sorted(
+        (row["tg_user_id"], int(row["model_id"])) for row in reader
+    )
+    assert exported == expected_ratings(**filters)
+    assert rows == len(exported)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("chunk_size", [1, 7, 10000])
+def test_iter_ratings(db, filters, chunk_size):
+    async def read():
+        chunks = []
+        async for records in db.iter_ratings(chunk_size=chunk_size, **filters):
+            chunks.append(records)
+        return chunks
+
+    chunks = loop.run_until_complete(read())
+
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    assert sorted(
+        (record["tg_user_id"], record["model_id"])
+        for chunk in chunks
+        for record in chunk
+    ) == expected_ratings(**filters)
+
+
+def test_export_csv_gz(db, tmp_path):
+    path = str(tmp_path / "ratings.csv.gz")
+    progress = Progress(interval=0)
+    rows = loop.run_until_complete(
+        export(TEST_DB_URL, path, "csv", [1], progress=progress)
+    )
+
+    with gzip.open(path, "rt") as file:
+        exported = list(csv.DictReader(file))
+    assert rows == progress.rows == len(exported)
+    assert sorted(
+        (row["tg_user_id"], int(row["model_id"])) for row in exported
+    ) == expected_ratings([1])
+
+
+def test_export_parquet(db, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "ratings.parquet")
+    rows = loop.run_until_complete(
+        export(
+            TEST_DB_URL,
+            path,
+            "parquet",
+            since=datetime(2026, 5, 1),
+            chunk_size=100,
+        )
+    )
+
+    table = pq.read_table(path).to_pydict()
+    assert rows == len(table["id"])
+    assert sorted(zip(table["tg_user_id"], table["model_id"])) == (
+        expected_ratings(since=datetime(2026, 5, 1))
+    )
+
+
+def test_incorrect_format(db, tmp_path):
+    with pytest.raises(ValueError):
+        loop.run_until_complete(
+            export(TEST_DB_URL, str(tmp_path / "ratings.json"), "json")
+        )
+
+
+def test_main(db, tmp_path, capsys):
+    path = str(tmp_path / "ratings.csv")
+    main(
+        [
+            path,
+            "--db-url",
+            TEST_DB_URL,
+            "--models",
+            "0",
+            "--until",
+            "2026-02-01",
+        ]
+    )
+
+    assert "rows/s" in capsys.readouterr().out
+    with open(path) as file:
+        assert len(list(csv.DictReader(file))) == len(
+            expected_ratings([0], until=datetime(2026, 2, 1))
+        )
@@ -0,0 +1,264 @@
+import pytest
+import psycopg2
+import asyncio
+
+from contextlib import asynccontextmanager
+from environs import Env
+from aiogram.dispatcher import FSMContext
+from database import Database
+from postgres_storage import PostgresStorage
+
+env = Env()
+env.read_env()
+
+TEST_DB_URL = env.str("TEST_DB_URL")
+
+loop = asyncio.new_event_loop()
+asyncio.set_event_loop(loop)
+
+
+def create_storage(**kwargs) -> PostgresStorage:
+    database = Database(TEST_DB_URL, [], min_size=1, max_size=4)
+    storage = PostgresStorage(database, **kwargs)
+
+    async def start():
+        await database.connect()
+        await storage.start()
+
+    loop.run_until_complete(start())
+    return storage
+
+
+def close_storage(storage: PostgresStorage):
+    async def close():
+        await storage.close()
+        await storage.database.close_connection()
+
+    loop.run_until_complete(close())
+
+
+def fetch(query):
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.execute(query)
+            return curs.fetchall()
+
+
+@pytest.fixture
+def storages():
+    # two instances of the bot sharing the states
+    storages = [create_storage(flush_interval=0.01) for _ in range(2)]
+
+    yield storages
+
+    for storage in storages:
+        close_storage(storage)
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.execute("drop table fsm_states")
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"cache_size": 0}, {"cache_ttl": 0}, {"flush_interval": -1}],
+)
+def test_incorrect_input(kwargs):
+    with pytest.raises(ValueError):
+        _ = PostgresStorage(None, **kwargs)
+
+
+def test_read_own_writes(storages):
+    first, _ = storages
+
+    async def run():
+        context = FSMContext(first, chat=1, user=2)
+        await context.set_state("Form:first")
+        await context.update_data(photo="id")
+        # nothing is written yet
+        assert first.stats()["pending"] == 1
+        assert await context.get_state() == "Form:first"
+        assert await context.get_data() == {"photo": "id"}
+
+    loop.run_until_complete(run())
+
+
+def test_states_shared(storages):
+    first, second = storages
+
+    async def run():
+        await first.set_state(chat=1, user=1, state="Form:first")
+        await first.update_data(chat=1, user=1, data={"photo": "id"})
+        await asyncio.sleep(0.1)
+        assert await second.get_state(chat=1, user=1) == "Form:first"
+        assert await second.get_data(chat=1, user=1) == {"photo": "id"}
+
+        # the cached record of the second instance is invalidated
+        await first.set_state(chat=1, user=1, state="Form:second")
+        await asyncio.sleep(0.1)
+        assert await second.get_state(chat=1, user=1) == "Form:second"
+
+        await second.finish(chat=1, user=1)
+        await asyncio.sleep(0.1)
+        assert await first.get_state(chat=1, user=1) is None
+
+    loop.run_until_complete(run())
+    assert first.stats()["invalidations"] >= 1
+    assert second.stats()["invalidations"] >= 1
+    # the empty record is deleted
+    assert fetch("select count(1) from fsm_states") == [(0,)]
+
+
+def test_writes_batched(storages):
+    first, second = storages
+
+    async def run():
+        first.flush_interval = 10
+        await asyncio.sleep(0.05)
+        for user in range(100):
+            await first.set_state(chat=user, user=user, state="Form:first")
+            await first.update_bucket(chat=user, user=user, calls=user)
+        await first.flush()
+        return [
+            await second.get_bucket(chat=user, user=user)
+            for user in range(100)
+        ]
+
+    buckets = loop.run_until_complete(run())
+
+    assert buckets == [{"calls": user} for user in range(100)]
+    assert first.stats()["flushes"] == 1
+    assert first.stats()["flushed"] == 100
+    assert fetch("select count(1) from fsm_states") == [(100,)]
+
+
+def test_cache_hits(storages):
+    first, second = storages
+
+    async def run():
+        await first.set_state(chat=1, user=1, state="Form:first")
+        await first.flush()
+        for _ in range(10):
+            assert await second.get_state(chat=1, user=1) == "Form:first"
+
+    loop.run_until_complete(run())
+    assert second.stats()["misses"] == 1
+    assert second.stats()["hits"] == 9
+
+
+class HeldReads:
+    """
+    Pool holding the rows read until resume is set, as if the reply
+    of the database was slow.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.read = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self.pool.acquire() as con:
+            self.con = con
+            yield self
+
+    async def fetchrow(self, *args):
+        row = await self.con.fetchrow(*args)
+        self.read.set()
+        await self.resume.wait()
+        return row
+
+
+def test_invalidated_read_not_cached(storages):
+    first, second = storages
+
+    async def run():
+        pool = second.database.pool
+        second.database.pool = reads = HeldReads(pool)
+        reading = asyncio.ensure_future(second.get_state(chat=1, user=1))
+        await reads.read.wait()
+
+        await first.set_state(chat=1, user=1, state="Form:first")
+        await first.flush()
+        await asyncio.sleep(0.1)
+        reads.resume.set()
+        # the row is older than the notified write
+        assert await reading is None
+        second.database.pool = pool
+        assert await second.get_state(chat=1, user=1) == "Form:first"
+
+    loop.run_until_complete(run())
+    assert second.stats()["misses"] == 2
+
+
+def test_listening_again_after_termination(storages):
+    first, second = storages
+
+    async def run():
+        await first.set_state(chat=1, user=1, state="Form:first")
+        await first.flush()
+        assert await second.get_state(chat=1, user=1) == "Form:first"
+
+        pid = second._listener.get_server_pid()
+        fetch(f"select pg_terminate_backend({pid})")
+        for _ in range(100):
+            if second.stats()["reconnects"]:
+                break
+            await asyncio.sleep(0.01)
+        assert second.stats()["reconnects"] == 1
+        # the records cached before are dropped
+        assert second.stats()["cached"] == 0
+
+        await first.set_state(chat=1, user=1, state="Form:second")
+        await first.flush()
+        assert await second.get_state(chat=1, user=1) == "Form:second"
+        await first.set_state(chat=1, user=1, state="Form:third")
+        await first.flush()
+        await asyncio.sleep(0.1)
+        assert await second.get_state(chat=1, user=1) == "Form:third"
+
+    loop.run_until_complete(run())
+    assert second.stats()["invalidations"] == 1
+
+
+def test_close_writes_pending(storages):
+    first, _ = storages
+
+    async def run():
+        await first.set_state(chat=1, user=1, state="Form:first")
+        first.flush_interval = 10
+        await first.set_data(chat=2, user=2, data={"a": 1})
+        await first.close()
+
+    loop.run_until_complete(run())
+    assert sorted(fetch("select chat_id, state, data from fsm_states")) == [
+        ("1", "Form:first", None),
+        ("2", None, {"a": 1}),
+    ]
+
+
+def test_failed_flush_kept():
+    storage = create_storage(flush_interval=10)
+
+    async def run():
+        await storage.set_state(chat=1, user=1, state="Form:first")
+        pool = storage.database.pool
+        storage.database.pool = None
+        with pytest.raises(AttributeError):
+            await storage.flush()
+        storage.database.pool = pool
+        await storage.set_state(chat=2, user=2, state="Form:second")
+        assert storage.stats()["pending"] == 2
+        await storage.flush()
+
+    loop.run_until_complete(run())
+    close_storage(storage)
+    rows = fetch("select chat_id, state from fsm_states order by chat_id")
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn:
+        with conn.cursor() as curs:
+            curs.execute("drop table fsm_states")
+
+    assert rows == [("1", "Form:first"), ("2", "Form:second")]
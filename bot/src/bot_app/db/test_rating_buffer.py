@@ -0,0 +1,181 @@
+import pytest
+import asyncio
+
+from datetime import datetime
+from rating_buffer import RatingBuffer
+
+
+class FakeDatabase:
+    def __init__(self, delay: float = 0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.batches = []
+
+    async def insert_ratings(self, ratings):
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError
+        self.batches.append(list(ratings))
+
+    @property
+    def ratings(self):
+        # the written batches without the creation times
+        return [
+            [(user_id, model_id) for user_id, model_id, _ in batch]
+            for batch in self.batches
+        ]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"max_size": 0},
+        {"max_size": 10, "batch_size": 11},
+        {"batch_size": 0},
+        {"flush_interval": 0},
+    ],
+)
+def test_incorrect_input(kwargs):
+    with pytest.raises(ValueError):
+        _ = RatingBuffer(FakeDatabase(), **kwargs)
+
+
+def test_add_before_start():
+    async def run():
+        with pytest.raises(RuntimeError):
+            await RatingBuffer(FakeDatabase()).add("user", 1)
+
+    asyncio.run(run())
+
+
+def test_flush_by_size():
+    database = FakeDatabase()
+    buffer = RatingBuffer(database, batch_size=4, flush_interval=10)
+
+    async def run():
+        buffer.start()
+        for i in range(8):
+            await buffer.add(f"user{i}", i)
+        await asyncio.sleep(0.01)
+        assert [len(batch) for batch in database.batches] == [4, 4]
+        await buffer.close()
+
+    asyncio.run(run())
+    assert database.ratings[0] == [(f"user{i}", i) for i in range(4)]
+    assert buffer.stats()["max_batch_size"] == 4
+
+
+def test_flush_by_time():
+    database = FakeDatabase()
+    buffer = RatingBuffer(database, batch_size=100, flush_interval=0.05)
+
+    async def run():
+        buffer.start()
+        await buffer.add("user", 1)
+        await buffer.add("user", 2)
+        await asyncio.sleep(0.01)
+        assert database.batches == []
+        await asyncio.sleep(0.1)
+        assert database.ratings == [[("user", 1), ("user", 2)]]
+        await buffer.close()
+
+    asyncio.run(run())
+
+
+def test_backpressure():
+    database = FakeDatabase(delay=0.05)
+    buffer = RatingBuffer(
+        database, max_size=4, batch_size=2, flush_interval=0.01
+    )
+
+    async def run():
+        buffer.start()
+        adding = asyncio.ensure_future(
+            asyncio.gather(*(buffer.add("user", i) for i in range(12)))
+        )
+        await asyncio.sleep(0.02)
+        assert not adding.done()
+        assert buffer.pending <= 6
+        await adding
+        await buffer.close()
+
+    asyncio.run(run())
+    assert sorted(
+        model_id for batch in database.ratings for _, model_id in batch
+    ) == list(range(12))
+
+
+def test_failed_flush_is_retried():
+    database = FakeDatabase(failures=2, delay=0.01)
+    latencies = []
+    buffer = RatingBuffer(
+        database,
+        batch_size=10,
+        flush_interval=0.01,
+        observe_flush=latencies.append,
+    )
+
+    async def run():
+        buffer.start()
+        await buffer.add("user", 1)
+        await asyncio.sleep(0.1)
+        await buffer.close()
+
+    asyncio.run(run())
+    assert database.ratings == [[("user", 1)]]
+    assert buffer.stats()["failed_flushes"] == 2
+    assert buffer.stats()["flushed"] == 1
+    # only the written batches are observed
+    assert len(latencies) == 1
+    assert latencies[0] >= 0.01
+
+
+def test_close_flushes_pending():
+    database = FakeDatabase(delay=0.02)
+    buffer = RatingBuffer(database, batch_size=3, flush_interval=10)
+
+    async def run():
+        buffer.start()
+        for i in range(7):
+            await buffer.add("user", i)
+        await asyncio.sleep(0.01)
+        # the first batch is being written while closing
+        await buffer.close()
+
+    asyncio.run(run())
+    assert [len(batch) for batch in database.batches] == [3, 3, 1]
+    assert buffer.stats()["pending"] == 0
+
+
+def test_close_drops_unwritable():
+    database = FakeDatabase(failures=100)
+    buffer = RatingBuffer(database, flush_interval=10)
+
+    async def run():
+        buffer.start()
+        await buffer.add("user", 1)
+        await buffer.close()
+
+    asyncio.run(run())
+    assert database.batches == []
+    assert buffer.stats()["pending"] == 0
+
+
+def test_creation_time_is_add_time():
+    database = FakeDatabase(failures=1)
+    buffer = RatingBuffer(database, flush_interval=0.05)
+
+    async def run():
+        buffer.start()
+        before = datetime.now()
+        await buffer.add("user", 1)
+        after = datetime.now()
+        # the rating is written after a failed write and a retry
+        await asyncio.sleep(0.2)
+        await buffer.close()
+        return before, after
+
+    before, after = asyncio.run(run())
+    [[(_, _, created)]] = database.batches
+    assert before <= created <= after
@@ -0,0 +1,81 @@
+import io
+import os
+import asyncio
+
+from aiogram import types
+
+from typing import Dict, List, Union
+from bot_app.app import db
+from bot_app.metrics import stage
+from bot_app.config import MEDIA_PATH
+
+MEDIA_GROUP_MAX_SIZE = 10
+
+# Telegram file_id of every gallery photo uploaded at least once
+file_ids: Dict[int, str] = {}
+
+
+async def load_file_ids():
+    file_ids.update(await db.get_file_ids())
+
+
+def _media_path(gallery_id: int) -> str:
+    return f"{MEDIA_PATH}{gallery_id + 1}.jpg"
+
+
+def _gallery_photo(gallery_id: int) -> Union[str, types.InputFile]:
+    file_id = file_ids.get(gallery_id)
+    if file_id is not None:
+        return file_id
+    return types.InputFile(_media_path(gallery_id))
+
+
+def _write_media(path: str, data: bytes):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+
+
+async def save_gallery_photo(gallery_id: int, data: io.BytesIO, file_id: str):
+    """
+    Saves the photo of a new gallery_id to MEDIA_PATH and remembers
+    its Telegram file_id, so it is sent without being uploaded.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        None, _write_media, _media_path(gallery_id), data.getvalue()
+    )
+    file_ids[gallery_id] = file_id
+    await db.insert_file_id(gallery_id, file_id)
+
+
+async def _remember_file_ids(
+    gallery_ids: List[int], sent_messages: List[types.Message]
+):
+    for gallery_id, sent_message in zip(gallery_ids, sent_messages):
+        if gallery_id not in file_ids:
+            file_id = sent_message.photo[-1].file_id
+            file_ids[gallery_id] = file_id
+            with stage("db_insert_file_id"):
+                await db.insert_file_id(gallery_id, file_id)
+
+
+async def send_gallery_photos(message: types.Message, gallery_ids: List[int]):
+    """
+    Answers the message with the gallery photos of gallery_ids in one
+    media group, reusing the file_id of the photos uploaded before.
+    """
+    for start in range(0, len(gallery_ids), MEDIA_GROUP_MAX_SIZE):
+        chunk = gallery_ids[start : start + MEDIA_GROUP_MAX_SIZE]
+        if len(chunk) == 1:
+            sent_messages = [
+                await message.answer_photo(photo=_gallery_photo(chunk[0]))
+            ]
+        else:
+            media = types.MediaGroup()
+            for gallery_id in chunk:
+                media.attach_photo(_gallery_photo(gallery_id))
+            sent_messages = await message.answer_media_group(media)
+
+        await _remember_file_ids(chunk, sent_messages)
@@ -1,20 +1,28 @@
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 
-from bot_app.app import dp, bot, db
+from bot_app.app import dp, bot, rating_buffer
 from bot_app.states import RatingSystem
 from bot_app.markup import buttons_text
+from bot_app.metrics import stage, ratings
+from bot_app.config import MODEL_NAMES
 
 
 @dp.callback_query_handler(
     lambda c: c.data in buttons_text, state=RatingSystem.estimating
 )
 async def process_rate(callback_query: types.CallbackQuery, state: FSMContext):
-    await bot.answer_callback_query(callback_query_id=callback_query.id)
+    with stage("process_rate"):
+        with stage("answer_callback"):
+            await bot.answer_callback_query(
+                callback_query_id=callback_query.id
+            )
 
-    await db.insert_rating(
-        str(callback_query.from_user.id), int(callback_query.data) - 1
-    )
+        model_id = int(callback_query.data) - 1
+        with stage("save_rating", MODEL_NAMES[model_id]):
+            await rating_buffer.add(str(callback_query.from_user.id), model_id)
+        ratings.labels(MODEL_NAMES[model_id]).inc()
 
-    await bot.send_message(callback_query.from_user.id, "Thank you!")
-    await RatingSystem.start.set()
+        with stage("send_reply"):
+            await bot.send_message(callback_query.from_user.id, "Thank you!")
+        await RatingSystem.start.set()
@@ -1,27 +1,58 @@
+import io
+import os
+import signal
+import asyncio
+import hashlib
+
 from aiogram import types
 from aiogram.utils.emoji import emojize
 from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.filters import Command
 
-from typing import List
-from bot_app.utils.matcher.matcher import Matcher
+from typing import List, Tuple
+from bot_app.utils.admission.controller import (
+    AdmissionController,
+    AdmissionQueueFull,
+)
+from bot_app.utils.cache.result_cache import ResultCache
 from bot_app.utils.images.image_handler import ImageHandler
+from bot_app.utils.images.preprocessing_executor import (
+    PreprocessingExecutor,
+    PreprocessingQueueFull,
+)
 from bot_app.utils.images.image_preprocessors import (
     DefaultPreprocessor,
 )
+from bot_app.utils.matcher.matcher import REJECTED
 from bot_app.utils.models.models import ModelConfig, ModelData
-from bot_app.utils.models.mediator import Mediator
+from bot_app.inference import infer, arena_pool
+from bot_app.matching import (
+    get_most_similar_ids,
+    reload_indexes,
+    add_to_gallery,
+    snapshot_indexes,
+)
+from bot_app.gallery import send_gallery_photos, save_gallery_photo
+from bot_app.metrics import stage, photos, admission_wait
 from bot_app.states import RatingSystem
-from bot_app.app import (
-    client,
-    dp,
-    db,
-    bot,
+from bot_app.app import dp, db, bot
+from bot_app.config import (
     MODEL_NAMES,
     MODELS_NUM,
     DIMS,
-    MAX_ELEMENTS,
-    INDEX_PATHS,
-    MEDIA_PATH,
+    PREPROCESSING_EXECUTOR,
+    PREPROCESSING_WORKERS,
+    PREPROCESSING_QUEUE_SIZE,
+    PREPROCESSING_TIMEOUT,
+    ADMISSION_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_QUEUE_PER_USER,
+    ADMISSION_MAX_WAIT,
+    RESULTS_CACHE_SIZE,
+    RESULTS_CACHE_TTL,
+    STATS_CACHE_TTL,
+    ADMIN_IDS,
+    WORKERS,
 )
 from bot_app.markup import inline_kb
 from bot_app.message_text import (
@@ -29,28 +60,80 @@ from bot_app.message_text import (
     START_TEXT,
     HELP_TEXT,
     SHORT_HELP,
+    BUSY_TEXT,
+    NO_MATCH_TEXT,
 )
 
 
 image_handler = ImageHandler(
     image_preprocessors=([DefaultPreprocessor() for i in range(MODELS_NUM)])
 )
-matchers = [
-    Matcher(DIMS[i], MAX_ELEMENTS, path_to_index=INDEX_PATHS[i])
-    for i in range(MODELS_NUM)
+preprocessing_executor = PreprocessingExecutor(
+    image_handler,
+    kind=PREPROCESSING_EXECUTOR,
+    max_workers=PREPROCESSING_WORKERS,
+    max_queue_size=PREPROCESSING_QUEUE_SIZE,
+    timeout=PREPROCESSING_TIMEOUT,
+)
+# photos processed at a time, the spikes are shed with the busy reply
+# instead of slowing down every photo
+admission = AdmissionController(
+    ADMISSION_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    max_waiting_per_key=ADMISSION_QUEUE_PER_USER,
+    max_wait=ADMISSION_MAX_WAIT,
+    observe_wait=admission_wait.observe,
+)
+model_configs = [
+    ModelConfig(model_name, output_dims=[DIMS[i]])
+    for i, model_name in enumerate(MODEL_NAMES)
 ]
-model_configs = [ModelConfig(model_name) for model_name in MODEL_NAMES]
+# per-model image vectors and nearest gallery ids by the Telegram
+# file_unique_id and by the content hash of a photo
+results_cache = ResultCache(RESULTS_CACHE_SIZE, RESULTS_CACHE_TTL)
+# /show_stats is answered from counters, refreshed once per ttl
+stats_cache = ResultCache(1, STATS_CACHE_TTL)
 
 
-def get_most_similar_ids(image_vectors: List[ModelData]):
-    nearest_vector_ids = []
-    for i in range(MODELS_NUM):
-        nearest_vector_id = matchers[i].get_nearest_neighbour(
-            image_vectors[i].data
+async def get_image_vectors(data: io.BytesIO) -> List[ModelData]:
+    with stage("preprocess"):
+        arenas = await preprocessing_executor.preprocess_batch(
+            [data], arena_pool
         )
-        nearest_vector_ids.append(int(nearest_vector_id[0][0]))
+    try:
+        model_inputs = []
+        for index, arena in enumerate(arenas):
+            model_inputs.append(
+                ModelData(
+                    data=arena.buffer[0], model_config=model_configs[index]
+                )
+            )
+
+        return await infer(model_inputs)
+    finally:
+        for arena in arenas:
+            arena.release()
+
 
-    return nearest_vector_ids
+async def match_image(data: io.BytesIO) -> Tuple[List[ModelData], List[int]]:
+    image_vectors = await get_image_vectors(data)
+    return image_vectors, await get_most_similar_ids(image_vectors)
+
+
+async def match_photo(photo: types.PhotoSize) -> List[int]:
+    async def match_by_content():
+        with stage("download"):
+            data = await bot.download_file_by_id(photo.file_id)
+        with data.getbuffer() as buffer:
+            content_hash = hashlib.blake2b(buffer, digest_size=16).hexdigest()
+        return await results_cache.get_or_compute(
+            f"content:{content_hash}", lambda: match_image(data)
+        )
+
+    _, ids = await results_cache.get_or_compute(
+        f"file:{photo.file_unique_id}", match_by_content
+    )
+    return ids
 
 
 @dp.message_handler(commands=["start", "help"], state="*")
@@ -65,7 +148,7 @@ async def welcome(message: types.Message):
 
 @dp.message_handler(commands=["show_stats"], state="*")
 async def show_stats(message: types.Message):
-    stats = await db.get_stats()
+    stats = await stats_cache.get_or_compute("stats", db.get_stats)
     message_text = ""
     for record in stats:
         message_text += f"{record['model_id']} {record['model_name']} amount:\
@@ -77,6 +160,56 @@ async def show_stats(message: types.Message):
     await message.answer(message_text)
 
 
+async def reload_gallery_index():
+    await reload_indexes()
+    # cached ids were found in the old indexes
+    results_cache.clear()
+
+
+@dp.message_handler(
+    commands=["reload_index"],
+    user_id=ADMIN_IDS,
+    state="*",
+)
+async def reload_index(message: types.Message):
+    if WORKERS:
+        # the parent process reloads the indexes and replaces the workers
+        os.kill(os.getppid(), signal.SIGHUP)
+        await message.answer("Index reload started")
+        return
+    await reload_gallery_index()
+    await message.answer("Index reloaded")
+
+
+@dp.message_handler(
+    Command("add_to_gallery", ignore_caption=False),
+    content_types=types.ContentType.PHOTO,
+    user_id=ADMIN_IDS,
+    state="*",
+)
+async def add_photo_to_gallery(message: types.Message):
+    photo = message.photo[-1]
+    with stage("download"):
+        data = await bot.download_file_by_id(photo.file_id)
+    image_vectors = await get_image_vectors(data)
+    gallery_id = await add_to_gallery(
+        [image_vector.data for image_vector in image_vectors],
+        lambda gallery_id: save_gallery_photo(gallery_id, data, photo.file_id),
+    )
+    if WORKERS:
+        # the workers search their own copies of the indexes, so they
+        # are saved for the parent process to reload and replace them
+        await snapshot_indexes()
+        os.kill(os.getppid(), signal.SIGHUP)
+        await message.answer(
+            f"Added to the gallery as {gallery_id}, index reload started"
+        )
+        return
+    # the cached ids were found without the new photo
+    results_cache.clear()
+    await message.answer(f"Added to the gallery as {gallery_id}")
+
+
 @dp.message_handler(
     content_types=types.ContentType.PHOTO,
     state=[RatingSystem.processing, RatingSystem.estimating],
@@ -91,32 +224,47 @@ async def ignore(message: types.Message, state: FSMContext):
         await message.answer("Last photo is still processing, please wait")
 
 
-@dp.message_handler(content_types=types.ContentType.PHOTO, state="*")
-async def process_photo(message: types.Message, state: FSMContext):
-    await RatingSystem.processing.set()
-    data = await bot.download_file_by_id(message.photo[-1].file_id)
-
-    preprocessed_images = image_handler.preprocess_image(data)
-
-    model_inputs = []
-    for index, preprocessed_image in enumerate(preprocessed_images):
-        model_inputs.append(
-            ModelData(
-                data=preprocessed_image, model_config=model_configs[index]
-            )
-        )
+async def answer_photo(message: types.Message):
+    try:
+        ids = await match_photo(message.photo[-1])
+    except (PreprocessingQueueFull, asyncio.TimeoutError):
+        photos.labels("busy").inc()
+        await RatingSystem.start.set()
+        await message.answer(BUSY_TEXT)
+        return
 
-    mediator = Mediator(client, MODELS_NUM)
-    mediator.infer(model_inputs=model_inputs)
-    image_vectors = await mediator.get_results()
+    # every model's photo is needed to rate them
+    if REJECTED in ids:
+        photos.labels("no_match").inc()
+        await RatingSystem.start.set()
+        await message.answer(NO_MATCH_TEXT)
+        return
 
-    ids = get_most_similar_ids(image_vectors)
-
-    for index in ids:
-        photo_path = f"{MEDIA_PATH}{index + 1}.jpg"
-        await message.answer_photo(photo=types.InputFile(photo_path))
+    with stage("send_photos"):
+        await send_gallery_photos(message, ids)
+    photos.labels("matched").inc()
 
     await RatingSystem.estimating.set()
     await message.reply(
         "Choose the photo with the most similar face", reply_markup=inline_kb
     )
+
+
+@dp.message_handler(content_types=types.ContentType.PHOTO, state="*")
+async def process_photo(message: types.Message, state: FSMContext):
+    with stage("process_photo"):
+        await RatingSystem.processing.set()
+
+        try:
+            with stage("admission"):
+                await admission.acquire(message.from_user.id)
+        except (AdmissionQueueFull, asyncio.TimeoutError):
+            photos.labels("shed").inc()
+            await RatingSystem.start.set()
+            await message.answer(BUSY_TEXT)
+            return
+
+        try:
+            await answer_photo(message)
+        finally:
+            admission.release()
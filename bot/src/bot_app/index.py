@@ -0,0 +1,54 @@
+from typing import List, Union
+from bot_app.utils.matcher.matcher import Matcher
+from bot_app.utils.matcher.quantized_matcher import QuantizedMatcher
+from bot_app.utils.matcher.sharded_matcher import (
+    ShardedMatcher,
+    SHARD_SEPARATOR,
+)
+from bot_app.config import (
+    MODELS_NUM,
+    DIMS,
+    MAX_ELEMENTS,
+    INDEX_PATHS,
+    INDEX_KIND,
+    RERANK_PATHS,
+    RERANK_CANDIDATES,
+    MATCHER_EF,
+)
+
+
+AnyMatcher = Union[Matcher, QuantizedMatcher, ShardedMatcher]
+
+
+def load_matcher(i: int) -> AnyMatcher:
+    if INDEX_KIND == "quantized":
+        return QuantizedMatcher(
+            DIMS[i],
+            path_to_index=INDEX_PATHS[i],
+            vectors_path=RERANK_PATHS[i] if RERANK_PATHS else None,
+            rerank=RERANK_CANDIDATES,
+        )
+    if INDEX_KIND != "hnsw":
+        raise ValueError(
+            f"Expected INDEX_KIND to be hnsw or quantized, got: {INDEX_KIND}"
+        )
+    # every shard of a model has MAX_ELEMENTS capacity
+    if SHARD_SEPARATOR in INDEX_PATHS[i]:
+        return ShardedMatcher(
+            DIMS[i],
+            MAX_ELEMENTS,
+            path_to_index=INDEX_PATHS[i],
+            ef=MATCHER_EF,
+        )
+    return Matcher(
+        DIMS[i], MAX_ELEMENTS, path_to_index=INDEX_PATHS[i], ef=MATCHER_EF
+    )
+
+
+def load_matchers() -> List[AnyMatcher]:
+    return [load_matcher(i) for i in range(MODELS_NUM)]
+
+
+# loaded on import, so in the pre-fork mode the indexes are loaded once
+# by the parent process and shared by the workers copy-on-write
+matchers = load_matchers()
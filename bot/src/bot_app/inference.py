@@ -0,0 +1,52 @@
+import asyncio
+
+from typing import List, Tuple
+from bot_app.utils.batching.micro_batcher import MicroBatcher
+from bot_app.utils.images.tensor_arena import TensorArenaPool
+from bot_app.utils.models.models import ModelData
+from bot_app.app import mediator
+from bot_app.metrics import timed
+from bot_app.config import MAX_BATCH_SIZE, BATCH_WINDOW_MS
+
+
+arena_pool = TensorArenaPool()
+
+
+async def _infer_batch(
+    batch_key: Tuple[str, Tuple[int, ...], str],
+    model_inputs: List[ModelData],
+) -> List[ModelData]:
+    first = model_inputs[0].data
+    arena = arena_pool.acquire(first.shape, MAX_BATCH_SIZE, first.dtype)
+    try:
+        batch = ModelData.stack(
+            model_inputs, out=arena.buffer[: len(model_inputs)]
+        )
+        (result,) = await mediator.infer([batch])
+    finally:
+        arena.release()
+    return result.unbatch()
+
+
+inference_batcher = MicroBatcher(
+    _infer_batch, MAX_BATCH_SIZE, BATCH_WINDOW_MS / 1000
+)
+
+
+async def infer(model_inputs: List[ModelData]) -> List[ModelData]:
+    """
+    Infers every model input through inference_batcher, so inputs
+    of concurrent requests to the same model share one TIS request.
+    The shape of an input depends on the photo (e.g. grayscale ones
+    have no channels axis), so the inputs are batched by batch_key.
+    """
+    return await asyncio.gather(
+        *(
+            timed(
+                inference_batcher.submit(model_input.batch_key, model_input),
+                "inference",
+                model_input.model_config.model_name,
+            )
+            for model_input in model_inputs
+        )
+    )
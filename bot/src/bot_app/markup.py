@@ -2,7 +2,7 @@ from aiogram.types import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
 )
-from bot_app.app import MODELS_NUM
+from bot_app.config import MODELS_NUM
 
 buttons_text = [str(i + 1) for i in range(MODELS_NUM)]
 inline_kb = InlineKeyboardMarkup()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import functools
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List
+from bot_app.utils.batching.micro_batcher import MicroBatcher
+from bot_app.utils.models.models import ModelData
+from bot_app.index import matchers, load_matchers
+from bot_app.metrics import timed
+from bot_app.config import (
+    MODEL_NAMES,
+    MATCHER_BATCH_SIZE,
+    MATCHER_WINDOW_MS,
+    MATCHER_THREADS,
+    MATCHER_WORKERS,
+    INDEX_PATHS,
+    INDEX_SNAPSHOT_INTERVAL,
+    MAX_DISTANCES,
+)
+
+matcher_pool = ThreadPoolExecutor(max_workers=MATCHER_WORKERS)
+# indexes are loaded, grown and saved by a separate thread,
+# so matcher_pool is left for the searches
+index_pool = ThreadPoolExecutor(max_workers=1)
+# gallery ids are given out one at a time
+_gallery_lock = asyncio.Lock()
+
+
+async def _match_batch(
+    model_index: int, queries: List[np.ndarray]
+) -> List[np.ndarray]:
+    loop = asyncio.get_running_loop()
+    labels, distances = await loop.run_in_executor(
+        matcher_pool,
+        functools.partial(
+            matchers[model_index].get_top_k,
+            np.concatenate(queries),
+            max_distance=(
+                MAX_DISTANCES[model_index] if MAX_DISTANCES else None
+            ),
+            num_threads=MATCHER_THREADS,
+        ),
+    )
+    return np.split(labels, np.cumsum([len(query) for query in queries])[:-1])
+
+
+matcher_batcher = MicroBatcher(
+    _match_batch, MATCHER_BATCH_SIZE, MATCHER_WINDOW_MS / 1000
+)
+
+
+async def get_most_similar_ids(image_vectors: List[ModelData]) -> List[int]:
+    """
+    Finds the nearest gallery id for the vector of every model,
+    REJECTED if it is further than MAX_DISTANCES of the model.
+    Vectors of concurrent requests to the same model are searched
+    with a single query in matcher_pool.
+    """
+    labels = await asyncio.gather(
+        *(
+            timed(
+                matcher_batcher.submit(i, image_vector.data),
+                "matching",
+                MODEL_NAMES[i],
+            )
+            for i, image_vector in enumerate(image_vectors)
+        )
+    )
+    return [int(model_labels[0][0]) for model_labels in labels]
+
+
+async def add_to_gallery(
+    vectors: List[np.ndarray],
+    save_photo: Callable[[int], Awaitable[None]],
+) -> int:
+    """
+    Adds the gallery vectors of every model to its index under the next
+    gallery id while the indexes are searched and returns the id.
+    save_photo(gallery_id) is awaited before the vectors are added,
+    so the id is never matched without a photo to send.
+    The indexes are saved by the next snapshot_indexes.
+    """
+    loop = asyncio.get_running_loop()
+    async with _gallery_lock:
+        gallery_id = len(matchers[0])
+        await save_photo(gallery_id)
+        ids = np.array([gallery_id])
+        for matcher, data in zip(list(matchers), vectors):
+            await loop.run_in_executor(
+                index_pool, matcher.add_items, data, ids
+            )
+    return gallery_id
+
+
+async def snapshot_indexes():
+    """
+    Atomically replaces the files in INDEX_PATHS with
+    the indexes modified since they were loaded or saved.
+    """
+    loop = asyncio.get_running_loop()
+    for i, matcher in enumerate(list(matchers)):
+        if matcher.modified:
+            await loop.run_in_executor(
+                index_pool, matcher.snapshot, INDEX_PATHS[i]
+            )
+            logging.info(f"Saved index snapshot to {INDEX_PATHS[i]}")
+
+
+async def snapshot_indexes_periodically():
+    if INDEX_SNAPSHOT_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.sleep(INDEX_SNAPSHOT_INTERVAL)
+        try:
+            await snapshot_indexes()
+        except Exception:
+            logging.exception("Failed to save index snapshot")
+
+
+async def reload_indexes():
+    """
+    Loads the indexes from INDEX_PATHS in the background and swaps them
+    in for the following searches, the searches already running finish
+    on the old indexes. Items added and not saved yet are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    matchers[:] = await loop.run_in_executor(index_pool, load_matchers)
+    logging.info("Reloaded indexes")
@@ -15,3 +15,11 @@ Just send me a photo with a face, I can give you some photos with similar faces
 
 Then you need to choose the photo with the most similar face.
 """
+
+BUSY_TEXT = """
+Sorry, I am too busy right now, please send the photo a bit later.
+"""
+
+NO_MATCH_TEXT = """
+Sorry, I could not find a similar face in our photo database, please try another photo.
+"""
@@ -0,0 +1,166 @@
+"""
+Metrics of the bot served in the Prometheus text format on
+METRICS_HOST:METRICS_PORT, every pre-fork worker serves its own
+metrics on a port of its own.
+
+Every stage of the photos and ratings processing is timed by stage,
+which records its latency, the amount of its calls in progress and
+its failures, labelled by the stage and the model.
+"""
+import time
+import logging
+
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from aiohttp import web
+from bot_app.utils.metrics.registry import Counter, Gauge, Histogram, Registry
+from bot_app.config import METRICS_HOST, METRICS_PORT, METRICS_PATH
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "bot_stage_duration_seconds",
+    "Latency of the processing stages",
+    ["stage", "model"],
+)
+stage_in_progress = registry.gauge(
+    "bot_stage_in_progress",
+    "Calls of the processing stages in progress",
+    ["stage", "model"],
+)
+stage_errors = registry.counter(
+    "bot_stage_errors_total",
+    "Failed calls of the processing stages",
+    ["stage", "model"],
+)
+photos = registry.counter(
+    "bot_photos_total", "Processed photos by outcome", ["outcome"]
+)
+ratings = registry.counter(
+    "bot_ratings_total", "Ratings of the models", ["model"]
+)
+admission_wait = registry.histogram(
+    "bot_admission_wait_seconds", "Wait of the admitted photos"
+)
+webhook_latency = registry.histogram(
+    "bot_webhook_update_duration_seconds",
+    "Latency of the webhook updates from receiving to processed",
+)
+rating_flush_latency = registry.histogram(
+    "bot_rating_flush_duration_seconds", "Latency of the ratings writes"
+)
+
+# the port may be changed before the server starts, see workers
+port = METRICS_PORT
+
+_runners: List[web.AppRunner] = []
+_stages: Dict[Tuple[str, str], Tuple[Histogram, Gauge, Counter]] = {}
+
+
+def stage(name: str, model: str = "") -> ContextManager[None]:
+    """
+    Context manager recording the latency of a stage, its calls
+    in progress and its failures.
+    """
+    metrics = _stages.get((name, model))
+    if metrics is None:
+        metrics = _stages[(name, model)] = (
+            stage_seconds.labels(name, model),
+            stage_in_progress.labels(name, model),
+            stage_errors.labels(name, model),
+        )
+    return _track(*metrics)
+
+
+@contextmanager
+def _track(seconds: Histogram, in_progress: Gauge, errors: Counter):
+    in_progress.value += 1
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        errors.value += 1
+        raise
+    finally:
+        in_progress.value -= 1
+        seconds.observe(time.perf_counter() - started)
+
+
+async def timed(awaitable: Awaitable[Any], name: str, model: str = ""):
+    """
+    Awaits the awaitable as a stage, e.g. a stage of every model
+    of asyncio.gather.
+    """
+    with stage(name, model):
+        return await awaitable
+
+
+def export_stats(
+    name: str,
+    stats: Callable[[], Dict[str, Any]],
+    labels: Optional[Dict[str, str]] = None,
+):
+    """
+    Exports the numeric values of stats() as bot_{name}_{key} gauges
+    updated on every scrape, the dict values of the keys in labels
+    are exported as one gauge labelled by the given label name.
+    """
+    labels = labels or {}
+    gauges: Dict[str, Gauge] = {}
+    seen: Dict[str, Set[str]] = {}
+
+    def gauge(key: str) -> Gauge:
+        if key not in gauges:
+            gauges[key] = registry.gauge(
+                f"bot_{name}_{key}",
+                f"{key} of {name}",
+                (labels[key],) if key in labels else (),
+            )
+        return gauges[key]
+
+    def collect():
+        for key, value in stats().items():
+            if key in labels and isinstance(value, dict):
+                metric = gauge(key)
+                values = {
+                    "" if label is None else str(label): amount
+                    for label, amount in value.items()
+                }
+                # the labels missing from the stats are gone, not stale
+                for label in seen.setdefault(key, set()) - values.keys():
+                    metric.labels(label).set(0)
+                for label, amount in values.items():
+                    metric.labels(label).set(amount)
+                seen[key].update(values)
+            elif isinstance(value, (int, float)):
+                gauge(key).set(value)
+
+    registry.add_collector(collect)
+
+
+async def start_server():
+    """
+    Serves the metrics on METRICS_HOST:port unless port is 0.
+    """
+    if not port or _runners:
+        return
+    runner = web.AppRunner(registry.create_app(METRICS_PATH), access_log=None)
+    await runner.setup()
+    _runners.append(runner)
+    await web.TCPSite(runner, METRICS_HOST, port).start()
+    logging.info(f"Serving metrics on {METRICS_HOST}:{port}{METRICS_PATH}")
+
+
+async def stop_server():
+    while _runners:
+        await _runners.pop().cleanup()
@@ -1,6 +1,149 @@
+import signal
+import asyncio
+import logging
+
 from aiogram import Dispatcher
-from bot_app.app import db
+from bot_app.app import dp, db, mediator, rating_buffer, storage
+from bot_app.config import (
+    WORKERS,
+    PARTITIONS_MAINTENANCE_INTERVAL,
+    FSM_SNAPSHOT_INTERVAL,
+    FSM_STORAGE,
+    ADMISSION_STATS_INTERVAL,
+)
+from bot_app import metrics
+from bot_app.gallery import load_file_ids
+from bot_app.inference import inference_batcher
+from bot_app.matching import (
+    matcher_batcher,
+    matcher_pool,
+    index_pool,
+    snapshot_indexes,
+    snapshot_indexes_periodically,
+)
+from bot_app.handlers import callback_handlers
+from bot_app.handlers.message_handlers import (
+    admission,
+    preprocessing_executor,
+    reload_gallery_index,
+    results_cache,
+)
+
+background_tasks = []
+
+metrics.export_stats("admission", admission.stats)
+metrics.export_stats("rating_buffer", rating_buffer.stats)
+metrics.export_stats("fsm_storage", storage.stats, labels={"states": "state"})
+metrics.export_stats(
+    "results_cache",
+    lambda: {
+        "size": len(results_cache),
+        "hits": results_cache.hits,
+        "misses": results_cache.misses,
+    },
+)
+
+
+async def maintain_partitions_periodically():
+    if not db.partitioned or PARTITIONS_MAINTENANCE_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.sleep(PARTITIONS_MAINTENANCE_INTERVAL)
+        try:
+            created, dropped = await db.maintain_partitions()
+            if created or dropped:
+                logging.info(
+                    f"Created partitions {created}, dropped {dropped}"
+                )
+        except Exception:
+            logging.exception("Failed to maintain ratings partitions")
+
+
+async def snapshot_states_periodically():
+    if (
+        FSM_STORAGE != "memory"
+        or storage.path is None
+        or FSM_SNAPSHOT_INTERVAL <= 0
+    ):
+        return
+    while True:
+        await asyncio.sleep(FSM_SNAPSHOT_INTERVAL)
+        try:
+            storage.snapshot()
+        except Exception:
+            logging.exception("Failed to save states snapshot")
+        # the memory is estimated here rather than on every scrape,
+        # sizing the records takes a while on a big storage
+        memory = storage.estimate_memory() / 2**20
+        logging.info(
+            f"States storage: {storage.stats()}, about {memory:.1f} MiB"
+        )
+
+
+async def log_admission_periodically():
+    if ADMISSION_STATS_INTERVAL <= 0:
+        return
+    shed = 0
+    while True:
+        await asyncio.sleep(ADMISSION_STATS_INTERVAL)
+        stats = admission.stats()
+        # the photos shed since the last time are worth a warning
+        log = logging.info
+        if stats["rejected"] + stats["timed_out"] > shed:
+            log = logging.warning
+        shed = stats["rejected"] + stats["timed_out"]
+        log(f"Photos admission: {stats}")
 
 
 async def on_startup(dp: Dispatcher):
+    await metrics.start_server()
+    await db.connect()
     await db.create_table()
+    if FSM_STORAGE == "postgres":
+        await storage.start()
+    await load_file_ids()
+    rating_buffer.start()
+
+    # kill -HUP swaps in the indexes from INDEX_PATHS, the workers
+    # of the pre-fork mode are replaced by the parent process instead
+    if not WORKERS:
+        asyncio.get_event_loop().add_signal_handler(
+            signal.SIGHUP,
+            lambda: background_tasks.append(
+                asyncio.ensure_future(reload_gallery_index())
+            ),
+        )
+    background_tasks.append(
+        asyncio.ensure_future(snapshot_indexes_periodically())
+    )
+    background_tasks.append(
+        asyncio.ensure_future(maintain_partitions_periodically())
+    )
+    background_tasks.append(
+        asyncio.ensure_future(snapshot_states_periodically())
+    )
+    background_tasks.append(
+        asyncio.ensure_future(log_admission_periodically())
+    )
+
+
+async def on_shutdown(dp: Dispatcher):
+    for task in background_tasks:
+        task.cancel()
+    await metrics.stop_server()
+    await snapshot_indexes()
+    await rating_buffer.close()
+    logging.info(f"Ratings buffer: {rating_buffer.stats()}")
+    logging.info(f"Photos admission: {admission.stats()}")
+    if FSM_STORAGE == "postgres":
+        # the pending states are written before the pool is closed,
+        # closing the storage again by the executor does nothing
+        await storage.close()
+        logging.info(f"States storage: {storage.stats()}")
+    await db.close_connection()
+    index_pool.shutdown()
+    await inference_batcher.close()
+    await matcher_batcher.close()
+    matcher_pool.shutdown(wait=False)
+    await mediator.close()
+    preprocessing_executor.shutdown()
@@ -0,0 +1,80 @@
+import asyncio
+import numpy as np
+
+from bot_app import index
+from bot_app.config import MODELS_NUM, DIMS
+from bot_app.matching import (
+    matchers,
+    reload_indexes,
+    add_to_gallery,
+    snapshot_indexes,
+)
+
+
+def test_reload_indexes(monkeypatch):
+    old_matchers = list(matchers)
+    loaded = []
+
+    def load_matchers():
+        loaded.append(1)
+        return index.load_matchers()
+
+    monkeypatch.setattr("bot_app.matching.load_matchers", load_matchers)
+    asyncio.run(reload_indexes())
+
+    assert loaded == [1]
+    assert len(matchers) == MODELS_NUM
+    for old_matcher, matcher in zip(old_matchers, matchers):
+        assert matcher is not old_matcher
+        assert type(matcher) is type(old_matcher)
+        assert len(matcher) == len(old_matcher)
+
+
+def test_add_to_gallery_and_snapshot(monkeypatch, tmp_path):
+    # the gallery is grown on copies, so the loaded indexes stay intact
+    old_matchers = list(matchers)
+    matchers[:] = index.load_matchers()
+    paths = [str(tmp_path / f"{i}.bin") for i in range(MODELS_NUM)]
+    monkeypatch.setattr("bot_app.matching.INDEX_PATHS", paths)
+    size = len(matchers[0])
+    vectors = [
+        np.full((1, DIMS[i]), 100.0, np.float32) for i in range(MODELS_NUM)
+    ]
+    saved = []
+
+    async def save_photo(gallery_id):
+        saved.append((gallery_id, [len(matcher) for matcher in matchers]))
+
+    async def run():
+        first = await add_to_gallery(vectors, save_photo)
+        second = await add_to_gallery(vectors, save_photo)
+        await snapshot_indexes()
+        return first, second
+
+    try:
+        assert asyncio.run(run()) == (size, size + 1)
+        # the photo is saved before its id can be matched
+        assert saved == [
+            (size, [size] * MODELS_NUM),
+            (size + 1, [size + 1] * MODELS_NUM),
+        ]
+        for i, matcher in enumerate(matchers):
+            assert not matcher.modified
+            labels, _ = matcher.get_top_k(vectors[i])
+            assert labels[0][0] in (size, size + 1)
+
+        # the snapshots are what the reload of the indexes reads
+        monkeypatch.setattr("bot_app.index.INDEX_PATHS", paths)
+        for matcher in index.load_matchers():
+            assert len(matcher) == size + 2
+    finally:
+        matchers[:] = old_matchers
+
+
+def test_snapshot_skips_unmodified(monkeypatch, tmp_path):
+    paths = [str(tmp_path / f"{i}.bin") for i in range(MODELS_NUM)]
+    monkeypatch.setattr("bot_app.matching.INDEX_PATHS", paths)
+
+    asyncio.run(snapshot_indexes())
+
+    assert list(tmp_path.iterdir()) == []
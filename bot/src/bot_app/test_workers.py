@@ -0,0 +1,99 @@
+import signal
+
+from bot_app import workers
+from bot_app.workers import _Supervisor, format_memory, memory_usage
+
+SMAPS_ROLLUP = """\
+00400000-7ffc4a5fe000 ---p 00000000 00:00 0                  [rollup]
+Rss:              204800 kB
+Pss:              102400 kB
+Pss_Anon:          51200 kB
+Shared_Clean:     153600 kB
+Shared_Dirty:          0 kB
+Private_Clean:     10240 kB
+Private_Dirty:     40960 kB
+Swap:                  0 kB
+"""
+
+
+def test_memory_usage(tmp_path, monkeypatch):
+    path = tmp_path / "smaps_rollup"
+    path.write_text(SMAPS_ROLLUP)
+    monkeypatch.setattr(workers, "SMAPS_PATH", str(path))
+
+    usage = memory_usage()
+
+    assert usage == {
+        "Rss": 204800,
+        "Pss": 102400,
+        "Shared_Clean": 153600,
+        "Shared_Dirty": 0,
+        "Private_Clean": 10240,
+        "Private_Dirty": 40960,
+    }
+    assert format_memory(usage) == (
+        "RSS 200.0 MB, PSS 100.0 MB, shared 150.0 MB, private 50.0 MB"
+    )
+
+
+def test_memory_usage_not_available(tmp_path, monkeypatch):
+    monkeypatch.setattr(workers, "SMAPS_PATH", str(tmp_path / "missing"))
+
+    assert memory_usage() == {}
+    assert format_memory({}) == "memory usage is not available"
+
+
+class FakeProcesses:
+    def __init__(self, exited):
+        self.exited = list(exited)
+        self.next_pid = 100
+        self.killed = []
+
+    def fork(self):
+        self.next_pid += 1
+        return self.next_pid
+
+    def waitpid(self, pid, options):
+        if self.exited:
+            return self.exited.pop(0), 1
+        return 0, 0
+
+    def kill(self, pid, signum):
+        self.killed.append((pid, signum))
+
+
+def fake_processes(monkeypatch, exited=()) -> FakeProcesses:
+    processes = FakeProcesses(exited)
+    monkeypatch.setattr(workers.os, "fork", processes.fork)
+    monkeypatch.setattr(workers.os, "waitpid", processes.waitpid)
+    monkeypatch.setattr(workers.os, "kill", processes.kill)
+    monkeypatch.setattr(workers.time, "sleep", lambda seconds: None)
+    return processes
+
+
+def test_reap_respawns_into_same_slot(monkeypatch):
+    processes = fake_processes(monkeypatch)
+    supervisor = _Supervisor(sock=None, workers=3)
+    for slot in range(3):
+        supervisor.spawn(slot)
+    assert supervisor.children == {101: 0, 102: 1, 103: 2}
+
+    processes.exited = [102]
+    supervisor.reap()
+
+    assert supervisor.children == {101: 0, 103: 2, 104: 1}
+
+
+def test_reap_after_stop(monkeypatch):
+    processes = fake_processes(monkeypatch)
+    supervisor = _Supervisor(sock=None, workers=2)
+    for slot in range(2):
+        supervisor.spawn(slot)
+
+    supervisor.stop(signal.SIGTERM, None)
+    assert processes.killed == [(101, signal.SIGTERM), (102, signal.SIGTERM)]
+    processes.exited = [101, 102]
+    supervisor.reap()
+
+    assert supervisor.children == {}
+    assert processes.next_pid == 102
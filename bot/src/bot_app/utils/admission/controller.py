@@ -0,0 +1,188 @@
+import time
+import asyncio
+
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Optional,
+)
+
+
+class AdmissionQueueFull(Exception):
+    """
+    Raised when there are too many requests waiting for admission.
+    """
+
+
+class AdmissionController:
+    """
+    Limits the amount of requests processed at a time.
+
+    A request is admitted at once while less than max_concurrency
+    requests are processed, otherwise it waits in a bounded queue.
+    The waiting requests are admitted one per key (user) in turn, so
+    a user sending many requests delays the others by one request at
+    most. When the queue or the requests of the key in it are full,
+    the request is rejected at once with AdmissionQueueFull, and
+    a request waiting longer than max_wait is rejected with
+    asyncio.TimeoutError, so the wait of an admitted request is bounded.
+
+    None of the methods are thread safe: the controller is intended to be
+    used from one event loop.
+
+    Parameters
+    ----------
+    max_concurrency : max amount of requests processed at a time
+
+    max_waiting : max amount of requests waiting for admission
+
+    max_waiting_per_key : max amount of waiting requests of a key,
+        not limited if None
+
+    max_wait : max seconds a request waits for admission,
+        not limited if None
+
+    observe_wait : function called with the seconds every admitted
+        request waited for, e.g. observe of a latency histogram
+
+    clock : function returning the current time in seconds
+
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_waiting: int,
+        max_waiting_per_key: Optional[int] = None,
+        max_wait: Optional[float] = None,
+        observe_wait: Optional[Callable[[float], Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise ValueError("Expected max_concurrency to be a positive int")
+        if not isinstance(max_waiting, int) or max_waiting < 0:
+            raise ValueError("Expected max_waiting to be a non-negative int")
+        if max_waiting_per_key is not None and (
+            not isinstance(max_waiting_per_key, int) or max_waiting_per_key < 1
+        ):
+            raise ValueError(
+                "Expected max_waiting_per_key to be a positive int or None"
+            )
+        if max_wait is not None and max_wait <= 0:
+            raise ValueError("Expected max_wait to be positive or None")
+
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.max_waiting_per_key = max_waiting_per_key
+        self.max_wait = max_wait
+        self.observe_wait = observe_wait
+        self.clock = clock
+
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # waiting requests of every key, the keys in the order of turns
+        self._queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = (
+            OrderedDict()
+        )
+
+    async def acquire(self, key: Hashable):
+        """
+        Waits for the admission of a request of the key, release must be
+        called when the request is processed.
+        """
+        if self.running < self.max_concurrency and not self.waiting:
+            self.running += 1
+            self.admitted += 1
+            if self.observe_wait is not None:
+                self.observe_wait(0.0)
+            return
+
+        queue = self._queues.get(key)
+        if self.waiting >= self.max_waiting or (
+            queue is not None
+            and self.max_waiting_per_key is not None
+            and len(queue) >= self.max_waiting_per_key
+        ):
+            self.rejected += 1
+            raise AdmissionQueueFull(
+                f"{self.waiting} requests are waiting for admission"
+            )
+
+        if queue is None:
+            queue = self._queues[key] = deque()
+        waiter = asyncio.get_event_loop().create_future()
+        queue.append(waiter)
+        self.waiting += 1
+        started = self.clock()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except BaseException as error:
+            if waiter.done() and not waiter.cancelled():
+                # admitted just before the timeout or cancellation,
+                # the slot goes to the next request
+                self.release()
+            else:
+                waiter.cancel()
+                self.__remove(key, waiter)
+                if isinstance(error, asyncio.TimeoutError):
+                    self.timed_out += 1
+            raise
+        self.admitted += 1
+        if self.observe_wait is not None:
+            self.observe_wait(self.clock() - started)
+
+    def __remove(self, key: Hashable, waiter: asyncio.Future):
+        queue = self._queues.get(key)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self.waiting -= 1
+        if not queue:
+            del self._queues[key]
+
+    def release(self):
+        """
+        Releases the slot of a processed request to the next waiting one.
+        """
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self.waiting -= 1
+            # the key takes the next turn after the other keys
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    @asynccontextmanager
+    async def admit(self, key: Hashable) -> AsyncIterator[None]:
+        """
+        Context manager processing a request of the key after admission.
+        """
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "waiting_keys": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
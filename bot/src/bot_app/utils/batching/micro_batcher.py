@@ -0,0 +1,111 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent callers into batches and
+    processes every batch with a single call of process_batch.
+
+    A batch is formed per key: it is flushed when it holds max_batch_size
+    items or when window seconds passed since its first item arrived,
+    whichever comes first. Every caller gets back the result computed
+    for its own item.
+
+    Parameters
+    ----------
+    process_batch : coroutine function process_batch(key, items) returning
+        a list of results, one per item and in the same order
+
+    max_batch_size : max amount of items in one batch
+
+    window : seconds to wait for more items after the first item
+        of a batch arrived
+
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int,
+        window: float,
+    ):
+        if not callable(process_batch):
+            raise TypeError("Expected process_batch to be callable")
+        if not isinstance(max_batch_size, int) or max_batch_size < 1:
+            raise ValueError("Expected max_batch_size to be a positive int")
+        if not isinstance(window, (int, float)) or window < 0:
+            raise ValueError("Expected window to be a non-negative number")
+
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """
+        Adds item to the batch of the given key and waits for its result.
+
+        Parameters
+        ----------
+        key : items are batched together only with items of the same key
+
+        item : item to process
+
+        Returns
+        -------
+        result : the result computed by process_batch for the item
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(key)
+        elif len(pending) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+
+        return await future
+
+    async def close(self):
+        """
+        Flushes all the pending batches and waits until they are processed.
+        """
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.ensure_future(self._process(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, key: Hashable, batch: List[Tuple[Any, Any]]):
+        items = [item for item, _ in batch]
+        try:
+            results = await self.process_batch(key, items)
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Expected {len(items)} results from process_batch,"
+                    f" instead got: {len(results)}"
+                )
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
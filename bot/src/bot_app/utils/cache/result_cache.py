@@ -0,0 +1,135 @@
+import time
+import asyncio
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+_MISSING = object()
+
+
+class ResultCache:
+    """
+    Bounded cache of computation results with LRU eviction and TTL.
+
+    Concurrent get_or_compute calls for a key that is not cached yet
+    share a single computation. Failed computations are not cached.
+
+    None of the methods are thread safe: the cache is intended to be used
+    from one event loop.
+
+    Parameters
+    ----------
+    max_size : max amount of cached results, the least recently used
+        results are evicted first
+
+    ttl : seconds a result stays cached for
+
+    clock : function returning the current time in seconds
+
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not isinstance(max_size, int) or max_size < 1:
+            raise ValueError("Expected max_size to be a positive int")
+        if not isinstance(ttl, (int, float)) or ttl <= 0:
+            raise ValueError("Expected ttl to be a positive number")
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        # bumped by clear, results computed under an older generation
+        # are not stored
+        self.generation = 0
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = (
+            OrderedDict()
+        )
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached result for the key or default if there is none.
+        Does not change hits and misses counters.
+        """
+        entry = self._results.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._results[key]
+            return default
+
+        self._results.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Caches the value for the key, evicting the least recently used
+        results if the cache is full.
+        """
+        self._results[key] = (self.clock() + self.ttl, value)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops all the stored results. The results being computed are
+        returned to their callers but are not stored, and the following
+        calls start new computations.
+        """
+        self.generation += 1
+        self._results.clear()
+        self._in_flight.clear()
+
+    async def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Returns the cached result for the key, computing and caching it
+        with compute() if there is none.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        # the computation runs in its own task, so it is not cancelled
+        # together with the caller that started it
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            self.misses += 1
+            in_flight = asyncio.ensure_future(
+                self.__compute(key, compute, self.generation)
+            )
+            self._in_flight[key] = in_flight
+        else:
+            self.collapsed += 1
+
+        return await asyncio.shield(in_flight)
+
+    async def __compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        generation: int,
+    ) -> Any:
+        try:
+            value = await compute()
+            if generation == self.generation:
+                self.put(key, value)
+            return value
+        finally:
+            if generation == self.generation:
+                del self._in_flight[key]
@@ -0,0 +1,323 @@
+import os
+import sys
+import copy
+import json
+import time
+import contextlib
+
+from itertools import islice
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+from aiogram.dispatcher.storage import BaseStorage
+
+Address = Union[str, int, None]
+
+
+class _Record:
+    # empty data and bucket are None, so most records hold a state only
+    __slots__ = ("state", "data", "bucket", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.state: Optional[str] = None
+        self.data: Optional[dict] = None
+        self.bucket: Optional[dict] = None
+        self.expires_at = expires_at
+
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data and not self.bucket
+
+
+class CompactStorage(BaseStorage):
+    """
+    In-memory FSM storage of aiogram with expiry of idle records.
+
+    A record of a (chat, user) pair holding no state, data and bucket
+    is deleted. A record not accessed for ttl seconds is deleted as well,
+    so users leaving the bot in the middle of a dialog do not take memory
+    forever. The records can be saved to a JSON file and loaded back
+    on restart, the data and buckets must be JSON serializable.
+
+    None of the methods are thread safe: the storage is intended to be
+    used from one event loop.
+
+    Parameters
+    ----------
+    ttl : seconds a record is kept for since its last access
+
+    path : path to save the records to on snapshot and close,
+        the records are loaded from it if it exists
+
+    clock : function returning the current time in seconds, the time
+        of the records saved to path must be the same after restart
+
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        if not isinstance(ttl, (int, float)) or ttl <= 0:
+            raise ValueError("Expected ttl to be a positive number")
+
+        self.ttl = ttl
+        self.path = path
+        self.clock = clock
+        self.expired = 0
+        # records are ordered by their last access, so by expiry time
+        self._records: "OrderedDict[Tuple[Hashable, Hashable], _Record]" = (
+            OrderedDict()
+        )
+        # amount of records of every state, kept up to date on every
+        # change, so the stats do not go over the records
+        self._states: Dict[Optional[str], int] = {}
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __get(self, chat: Address, user: Address) -> Optional[_Record]:
+        key = tuple(self.check_address(chat=chat, user=user))
+        record = self._records.get(key)
+        now = self.clock()
+        if record is None:
+            return None
+        if record.expires_at <= now:
+            del self._records[key]
+            self.__count(record.state, -1)
+            self.expired += 1
+            return None
+
+        record.expires_at = now + self.ttl
+        self._records.move_to_end(key)
+        return record
+
+    def __get_or_create(self, chat: Address, user: Address) -> _Record:
+        record = self.__get(chat, user)
+        if record is None:
+            self.evict_expired()
+            key = tuple(self.check_address(chat=chat, user=user))
+            record = _Record(self.clock() + self.ttl)
+            self._records[key] = record
+            self.__count(None, 1)
+        return record
+
+    def __cleanup(self, chat: Address, user: Address, record: _Record):
+        if record.is_empty():
+            key = tuple(self.check_address(chat=chat, user=user))
+            if self._records.pop(key, None) is not None:
+                self.__count(record.state, -1)
+
+    def __count(self, state: Optional[str], amount: int):
+        count = self._states.get(state, 0) + amount
+        if count:
+            self._states[state] = count
+        else:
+            del self._states[state]
+
+    def evict_expired(self) -> int:
+        """
+        Deletes the expired records, returns their amount.
+        """
+        now = self.clock()
+        evicted = 0
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record.expires_at > now:
+                break
+            del self._records[key]
+            self.__count(record.state, -1)
+            evicted += 1
+        self.expired += evicted
+        return evicted
+
+    async def get_state(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        default: Optional[str] = None,
+    ) -> Optional[str]:
+        record = self.__get(chat, user)
+        if record is None or record.state is None:
+            return self.resolve_state(default)
+        return record.state
+
+    async def set_state(
+        self, *, chat: Address = None, user: Address = None, state: Any = None
+    ):
+        state = self.resolve_state(state)
+        record = self.__get_or_create(chat, user)
+        self.__count(record.state, -1)
+        # the states are a few strings shared by all the records
+        record.state = None if state is None else sys.intern(state)
+        self.__count(record.state, 1)
+        self.__cleanup(chat, user, record)
+
+    async def get_data(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        default: Optional[dict] = None,
+    ) -> Dict:
+        record = self.__get(chat, user)
+        if record is None or not record.data:
+            return copy.deepcopy(default) if default else {}
+        return copy.deepcopy(record.data)
+
+    async def set_data(
+        self, *, chat: Address = None, user: Address = None, data: Dict = None
+    ):
+        record = self.__get_or_create(chat, user)
+        record.data = copy.deepcopy(data) or None
+        self.__cleanup(chat, user, record)
+
+    async def update_data(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        data: Dict = None,
+        **kwargs,
+    ):
+        record = self.__get_or_create(chat, user)
+        updated = record.data or {}
+        updated.update(data or {}, **kwargs)
+        record.data = updated or None
+        self.__cleanup(chat, user, record)
+
+    def has_bucket(self) -> bool:
+        return True
+
+    async def get_bucket(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        default: Optional[dict] = None,
+    ) -> Dict:
+        record = self.__get(chat, user)
+        if record is None or not record.bucket:
+            return copy.deepcopy(default) if default else {}
+        return copy.deepcopy(record.bucket)
+
+    async def set_bucket(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        bucket: Dict = None,
+    ):
+        record = self.__get_or_create(chat, user)
+        record.bucket = copy.deepcopy(bucket) or None
+        self.__cleanup(chat, user, record)
+
+    async def update_bucket(
+        self,
+        *,
+        chat: Address = None,
+        user: Address = None,
+        bucket: Dict = None,
+        **kwargs,
+    ):
+        record = self.__get_or_create(chat, user)
+        updated = record.bucket or {}
+        updated.update(bucket or {}, **kwargs)
+        record.bucket = updated or None
+        self.__cleanup(chat, user, record)
+
+    def snapshot(self, path: Optional[str] = None):
+        """
+        Saves the records to a temporary file and atomically renames it
+        to path, self.path if not given.
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError("Expected path to save the records to")
+
+        self.evict_expired()
+        records = [
+            [
+                chat,
+                user,
+                record.state,
+                record.data,
+                record.bucket,
+                record.expires_at,
+            ]
+            for (chat, user), record in self._records.items()
+        ]
+        temporary_path = f"{path}.tmp"
+        try:
+            with open(temporary_path, "w") as file:
+                json.dump(records, file)
+            os.replace(temporary_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporary_path)
+            raise
+
+    def load(self, path: str):
+        """
+        Replaces the records with the ones saved to path
+        which have not expired yet.
+        """
+        with open(path) as file:
+            records = json.load(file)
+
+        now = self.clock()
+        self._records.clear()
+        self._states.clear()
+        for chat, user, state, data, bucket, expires_at in sorted(
+            records, key=lambda record: record[-1]
+        ):
+            if expires_at <= now:
+                continue
+            record = _Record(expires_at)
+            record.state = None if state is None else sys.intern(state)
+            record.data = data or None
+            record.bucket = bucket or None
+            self._records[(chat, user)] = record
+            self.__count(record.state, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Amount of records, records by state and amount of expired records,
+        cheap enough to be taken on every metrics scrape.
+        """
+        return {
+            "entries": len(self._records),
+            "states": dict(self._states),
+            "expired": self.expired,
+        }
+
+    def estimate_memory(self, samples: int = 1000) -> int:
+        """
+        Approximate memory taken by the records in bytes, extrapolated
+        from the sizes of the samples most recently used records.
+        """
+        memory = sys.getsizeof(self._records)
+        sampled, sampled_memory = 0, 0
+        for key, record in islice(reversed(self._records.items()), samples):
+            sampled += 1
+            sampled_memory += sys.getsizeof(key) + sys.getsizeof(record)
+            sampled_memory += sum(sys.getsizeof(part) for part in key)
+            for part in (record.data, record.bucket):
+                if part is not None:
+                    sampled_memory += sys.getsizeof(part)
+        if sampled:
+            memory += sampled_memory * len(self._records) // sampled
+        return memory
+
+    async def close(self):
+        if self.path is not None:
+            self.snapshot()
+        self._records.clear()
+        self._states.clear()
+
+    async def wait_closed(self):
+        pass
@@ -1,8 +1,9 @@
 import io
 import numpy as np
-from typing import Iterable, List
+from typing import Iterable, List, Sequence
 from PIL import Image
 from .image_preprocessors import ImagePreprocessor
+from .tensor_arena import TensorArena, TensorArenaPool
 
 
 class ImageHandler:
@@ -30,6 +31,31 @@ class ImageHandler:
         else:
             raise ValueError("Expected image_preprocessors to be Iterable")
 
+    def decode_image(self, image_data: io.BytesIO) -> Image.Image:
+        """
+        Decodes the image from image_data once for all of
+        self.image_preprocessors and only as much of it as they need.
+
+        If every preprocessor declares input_size, JPEG images are decoded
+        at the lowest scale not smaller than the largest input_size.
+        The regions are not cropped here, cropping decodes the whole
+        image anyway, so it would only add a copy of the region.
+        """
+        image = Image.open(image_data)
+
+        input_sizes = [p.input_size for p in self.image_preprocessors]
+        if input_sizes and None not in input_sizes:
+            image.draft(
+                image.mode,
+                (
+                    max(width for width, _ in input_sizes),
+                    max(height for _, height in input_sizes),
+                ),
+            )
+
+        image.load()
+        return image
+
     def preprocess_image(self, image_data: io.BytesIO) -> List[np.ndarray]:
         """
         Preprocesses the image from image_data with self.image_preprocessors.
@@ -51,10 +77,81 @@ class ImageHandler:
                 f"instead got: {type(image_data)}"
             )
 
-        image = Image.open(image_data)
+        image = self.decode_image(image_data)
         preprocessed_images = []
 
         for image_preprocessor in self.image_preprocessors:
             preprocessed_images.append(image_preprocessor.preprocess(image))
 
         return preprocessed_images
+
+    def preprocess_batch(
+        self, images_data: Sequence[io.BytesIO], arena_pool: TensorArenaPool
+    ) -> List[TensorArena]:
+        """
+        Preprocesses a batch of images with self.image_preprocessors
+        writing the results straight into arenas taken from arena_pool.
+
+        Parameters
+        ----------
+        images_data : io.BytesIO of every image to preprocess
+
+        arena_pool : TensorArenaPool to take the arenas from
+
+        Returns
+        -------
+        arenas : List[TensorArena], one for each of
+            self.image_preprocessors, the i-th row of an arena holds
+            the i-th preprocessed image. The arenas must be released
+            by the caller.
+        """
+        for image_data in images_data:
+            if not isinstance(image_data, io.BytesIO):
+                raise ValueError(
+                    "Expected every image_data to be of io.BytesIO type,"
+                    f"instead got: {type(image_data)}"
+                )
+        if not images_data:
+            raise ValueError("Expected at least one image to preprocess")
+
+        images = [self.decode_image(image_data) for image_data in images_data]
+        arenas = []
+        try:
+            for image_preprocessor in self.image_preprocessors:
+                arenas.append(
+                    self.__preprocess_into_arena(
+                        image_preprocessor, images, arena_pool
+                    )
+                )
+        except Exception:
+            for arena in arenas:
+                arena.release()
+            raise
+
+        return arenas
+
+    @staticmethod
+    def __preprocess_into_arena(
+        image_preprocessor: ImagePreprocessor,
+        images: List[Image.Image],
+        arena_pool: TensorArenaPool,
+    ) -> TensorArena:
+        first = None
+        shape = image_preprocessor.output_shape(images[0])
+        if shape is None:
+            first = image_preprocessor.preprocess(images[0])
+            shape = first.shape
+
+        arena = arena_pool.acquire(shape, len(images))
+        try:
+            for i, image in enumerate(images):
+                if i == 0 and first is not None:
+                    arena.buffer[0] = first
+                else:
+                    image_preprocessor.preprocess_into(image, arena.buffer[i])
+        except Exception:
+            arena.release()
+            raise
+
+        arena.size = len(images)
+        return arena
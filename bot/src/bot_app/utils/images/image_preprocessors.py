@@ -1,13 +1,35 @@
 import numpy as np
 from PIL.Image import Image
+from typing import Optional, Tuple
+
+
+def _cropped_shape(
+    image: Image, box: Tuple[int, int, int, int]
+) -> Tuple[int, ...]:
+    # shape of np.asarray(image.crop(box))
+    shape = (box[3] - box[1], box[2] - box[0])
+    bands = len(image.getbands())
+    return shape if bands == 1 else (*shape, bands)
 
 
 class ImagePreprocessor:
     """
     Base class for ImagePreprocessors, which preprocesses
     the image by cropping it and then converting to numpy.
+
+    Subclasses declare the part of the image they need:
+
+    region : (left, upper, right, lower) box of the image read at full
+        resolution, None if the whole image may be read
+
+    input_size : (width, height) the image is resized to, if the
+        preprocessor does so, then ImageHandler decodes the image at a
+        lower resolution as long as it is not smaller than input_size
     """
 
+    region: Optional[Tuple[int, int, int, int]] = None
+    input_size: Optional[Tuple[int, int]] = None
+
     def preprocess(self, image: Image):
         if isinstance(image, Image):
             cropped_image = self.crop(image)
@@ -15,6 +37,20 @@ class ImagePreprocessor:
         else:
             raise ValueError(f"Expected PIL.Image.Image, got: {type(image)}")
 
+    def output_shape(self, image: Image) -> Optional[Tuple[int, ...]]:
+        """
+        Shape of the array preprocess(image) returns, if it is known
+        without preprocessing the image, otherwise None.
+        """
+        return None
+
+    def preprocess_into(self, image: Image, out: np.ndarray):
+        """
+        Preprocesses the image writing the result into out,
+        which must be of output_shape(image) shape.
+        """
+        out[...] = self.preprocess(image)
+
     @staticmethod
     def crop(image: Image) -> Image:
         raise NotImplementedError
@@ -29,6 +65,16 @@ class DefaultPreprocessor(ImagePreprocessor):
     Default image preprocessor
     """
 
+    region = (0, 0, 20, 20)
+
+    def output_shape(self, image: Image) -> Tuple[int, ...]:
+        return _cropped_shape(image, self.region)
+
+    def preprocess_into(self, image: Image, out: np.ndarray):
+        if not isinstance(image, Image):
+            raise ValueError(f"Expected PIL.Image.Image, got: {type(image)}")
+        np.copyto(out, np.asarray(self.crop(image)), casting="unsafe")
+
     @staticmethod
     def crop(image: Image) -> Image:
         return image.crop((0, 0, 20, 20))
@@ -43,6 +89,17 @@ class ResNetPreprocessor(ImagePreprocessor):
     Preprocesses image for ResNet
     """
 
+    region = (0, 0, 1280, 720)
+
+    def output_shape(self, image: Image) -> Tuple[int, ...]:
+        return _cropped_shape(image, self.region)[::-1]
+
+    def preprocess_into(self, image: Image, out: np.ndarray):
+        if not isinstance(image, Image):
+            raise ValueError(f"Expected PIL.Image.Image, got: {type(image)}")
+        image_np = np.asarray(self.crop(image))
+        np.copyto(out, image_np.reshape(out.shape), casting="unsafe")
+
     @staticmethod
     def crop(image: Image) -> Image:
         return image.crop((0, 0, 1280, 720))
@@ -0,0 +1,277 @@
+import io
+import asyncio
+import functools
+import multiprocessing
+import numpy as np
+
+from concurrent import futures
+from multiprocessing import shared_memory
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+from .image_handler import ImageHandler
+from .image_preprocessors import ImagePreprocessor
+from .tensor_arena import TensorArena, TensorArenaPool
+
+_worker_image_handler: Optional[ImageHandler] = None
+
+ArraysLayout = List[Tuple[Tuple[int, ...], str, int]]
+
+
+def _init_worker(image_preprocessors: Iterable[ImagePreprocessor]):
+    global _worker_image_handler
+    _worker_image_handler = ImageHandler(image_preprocessors)
+
+
+def _preprocess_to_shared_memory(
+    images_bytes: List[bytes],
+) -> Tuple[str, ArraysLayout]:
+    """
+    Preprocesses the images in a worker process and places the results
+    into a new shared memory block, so they are not pickled on the way
+    back. The block is unlinked by the parent process.
+
+    The layout lists the results of every preprocessor for the first
+    image, then for the second one and so on.
+    """
+    preprocessed_images = [
+        preprocessed_image
+        for image_bytes in images_bytes
+        for preprocessed_image in _worker_image_handler.preprocess_image(
+            io.BytesIO(image_bytes)
+        )
+    ]
+
+    layout = []
+    offset = 0
+    for preprocessed_image in preprocessed_images:
+        layout.append(
+            (preprocessed_image.shape, preprocessed_image.dtype.str, offset)
+        )
+        offset += preprocessed_image.nbytes
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for preprocessed_image, (shape, dtype, offset) in zip(
+            preprocessed_images, layout
+        ):
+            view = np.ndarray(
+                shape, dtype=dtype, buffer=block.buf, offset=offset
+            )
+            view[...] = preprocessed_image
+            del view
+    finally:
+        block.close()
+    return block.name, layout
+
+
+def _read_shared_memory(
+    name: str, layout: ArraysLayout, outs: List[np.ndarray]
+):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        for out, (shape, dtype, offset) in zip(outs, layout):
+            view = np.ndarray(
+                shape, dtype=dtype, buffer=block.buf, offset=offset
+            )
+            np.copyto(out, view)
+            del view
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _unlink_shared_memory(result: Tuple[str, ArraysLayout]):
+    block = shared_memory.SharedMemory(name=result[0])
+    block.close()
+    block.unlink()
+
+
+def _release_arenas(arenas: List[TensorArena]):
+    for arena in arenas:
+        arena.release()
+
+
+def _discard_result(discard: Callable, future: futures.Future):
+    if not future.cancelled() and future.exception() is None:
+        discard(future.result())
+
+
+class PreprocessingQueueFull(Exception):
+    """
+    Raised when there are too many images waiting for preprocessing.
+    """
+
+
+class PreprocessingExecutor:
+    """
+    Preprocesses images with ImageHandler off the event loop
+    in a pool of threads or processes.
+
+    In the process pool the preprocessed images are returned through
+    shared memory instead of pickling. Worker processes are forked,
+    so the preprocessors do not need to be importable by the workers.
+
+    Parameters
+    ----------
+    image_handler : ImageHandler to preprocess images with
+
+    kind : "thread" or "process", the kind of the workers pool
+
+    max_workers : amount of workers in the pool
+
+    max_queue_size : max amount of images submitted and not yet
+        preprocessed, the rest are rejected with PreprocessingQueueFull
+
+    timeout : seconds to wait for an image to be preprocessed before
+        raising asyncio.TimeoutError
+
+    """
+
+    KINDS = ("thread", "process")
+
+    def __init__(
+        self,
+        image_handler: ImageHandler,
+        kind: str = "thread",
+        max_workers: Optional[int] = None,
+        max_queue_size: int = 64,
+        timeout: Optional[float] = None,
+    ):
+        if not isinstance(image_handler, ImageHandler):
+            raise ValueError(
+                "Expected image_handler to be of ImageHandler type,"
+                f"instead got: {type(image_handler)}"
+            )
+        if kind not in self.KINDS:
+            raise ValueError(f"Expected kind to be one of {self.KINDS}")
+        if not isinstance(max_queue_size, int) or max_queue_size < 1:
+            raise ValueError("Expected max_queue_size to be a positive int")
+
+        self.image_handler = image_handler
+        self.kind = kind
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout
+        self.queue_size = 0
+
+        if kind == "thread":
+            self.pool = futures.ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            self.pool = futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                # spawn is the default on some platforms and since
+                # Python 3.14 on Linux too
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker,
+                initargs=(list(image_handler.image_preprocessors),),
+            )
+
+    async def preprocess(self, image_data: io.BytesIO) -> List[np.ndarray]:
+        """
+        Preprocesses the image from image_data, see
+        ImageHandler.preprocess_image.
+        """
+        self.__verify_image_data(image_data)
+
+        if self.kind == "thread":
+            return await self.__run(
+                None, self.image_handler.preprocess_image, image_data
+            )
+
+        name, layout = await self.__run(
+            _unlink_shared_memory,
+            _preprocess_to_shared_memory,
+            [image_data.getvalue()],
+        )
+        outs = [np.empty(shape, dtype=dtype) for shape, dtype, _ in layout]
+        _read_shared_memory(name, layout, outs)
+        return outs
+
+    async def preprocess_batch(
+        self, images_data: Sequence[io.BytesIO], arena_pool: TensorArenaPool
+    ) -> List[TensorArena]:
+        """
+        Preprocesses the images from images_data into arenas taken from
+        arena_pool, see ImageHandler.preprocess_batch.
+        """
+        for image_data in images_data:
+            self.__verify_image_data(image_data)
+        if not images_data:
+            raise ValueError("Expected at least one image to preprocess")
+
+        if self.kind == "thread":
+            return await self.__run(
+                _release_arenas,
+                self.image_handler.preprocess_batch,
+                images_data,
+                arena_pool,
+            )
+
+        name, layout = await self.__run(
+            _unlink_shared_memory,
+            _preprocess_to_shared_memory,
+            [image_data.getvalue() for image_data in images_data],
+        )
+
+        # results are laid out image by image, arenas hold
+        # the results of a single preprocessor each
+        batch_size = len(images_data)
+        preprocessors_num = len(layout) // batch_size
+        arenas = []
+        outs = [None] * len(layout)
+        try:
+            for j in range(preprocessors_num):
+                shape, dtype, _ = layout[j]
+                arena = arena_pool.acquire(shape, batch_size, dtype)
+                arena.size = batch_size
+                arenas.append(arena)
+                for i in range(batch_size):
+                    outs[i * preprocessors_num + j] = arena.buffer[i]
+            _read_shared_memory(name, layout, outs)
+        except Exception:
+            _release_arenas(arenas)
+            raise
+
+        return arenas
+
+    @staticmethod
+    def __verify_image_data(image_data: io.BytesIO):
+        if not isinstance(image_data, io.BytesIO):
+            raise ValueError(
+                "Expected image_data to be of io.BytesIO type,"
+                f"instead got: {type(image_data)}"
+            )
+
+    async def __run(self, discard: Optional[Callable], fn: Callable, *args):
+        # discard frees the result of fn if the caller stops waiting for it
+        if self.queue_size >= self.max_queue_size:
+            raise PreprocessingQueueFull
+
+        future = self.pool.submit(fn, *args)
+
+        # the slot is freed only when the worker is done with the image,
+        # even if the caller has stopped waiting for it
+        loop = asyncio.get_running_loop()
+        self.queue_size += 1
+        future.add_done_callback(functools.partial(self.__on_done, loop))
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=self.timeout
+            )
+        except BaseException:
+            if discard is not None:
+                future.add_done_callback(
+                    functools.partial(_discard_result, discard)
+                )
+            raise
+
+    def __on_done(
+        self, loop: asyncio.AbstractEventLoop, future: futures.Future
+    ):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self.__release)
+
+    def __release(self):
+        self.queue_size -= 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,102 @@
+import threading
+import numpy as np
+
+from typing import Dict, List, Tuple
+
+ArenaKey = Tuple[Tuple[int, ...], int, str]
+
+
+class TensorArena:
+    """
+    Preallocated buffer for a batch of tensors of the same shape.
+
+    Arenas are taken from a TensorArenaPool and must be returned to it
+    by release as soon as the tensors are not needed anymore.
+
+    Parameters
+    ----------
+    pool : TensorArenaPool the arena belongs to
+
+    shape : shape of a single tensor
+
+    batch_size : max amount of tensors in the arena
+
+    dtype : data type of the tensors
+
+    """
+
+    def __init__(
+        self,
+        pool: "TensorArenaPool",
+        shape: Tuple[int, ...],
+        batch_size: int,
+        dtype: np.dtype,
+    ):
+        self.pool = pool
+        self.buffer = np.empty((batch_size, *shape), dtype=dtype)
+        self.size = 0
+
+    @property
+    def key(self) -> ArenaKey:
+        return (
+            self.buffer.shape[1:],
+            self.buffer.shape[0],
+            self.buffer.dtype.str,
+        )
+
+    def view(self) -> np.ndarray:
+        """
+        Returns the filled part of the buffer without copying it.
+        """
+        return self.buffer[: self.size]
+
+    def release(self):
+        """
+        Returns the arena to its pool, the views of the buffer
+        must not be used afterwards.
+        """
+        self.size = 0
+        self.pool.release(self)
+
+
+class TensorArenaPool:
+    """
+    Pool of TensorArena objects reused by their shape, batch size
+    and data type. The pool is thread safe.
+
+    Parameters
+    ----------
+    max_free : max amount of released arenas kept for every key,
+        the rest are left to the garbage collector
+
+    """
+
+    def __init__(self, max_free: int = 16):
+        self.max_free = max_free
+        self.allocated = 0
+        self._free: Dict[ArenaKey, List[TensorArena]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(
+        self,
+        shape: Tuple[int, ...],
+        batch_size: int,
+        dtype: np.dtype = np.float32,
+    ) -> TensorArena:
+        """
+        Gets a free arena for batch_size tensors of the given shape
+        and dtype, allocating a new one if there are none.
+        """
+        key = (tuple(shape), batch_size, np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+            self.allocated += 1
+        return TensorArena(self, tuple(shape), batch_size, dtype)
+
+    def release(self, arena: TensorArena):
+        with self._lock:
+            free = self._free.setdefault(arena.key, [])
+            if len(free) < self.max_free:
+                free.append(arena)
@@ -0,0 +1,261 @@
+"""
+Recall/latency benchmark of Matcher against exact brute force search.
+
+Builds an index for every (M, ef_construction) pair of the grid,
+searches it with every ef and prints recall@k, p50/p99 latency of
+a single query, build time and index size. Configurations on the
+recall/p99 Pareto front are marked with "*".
+
+Usage (from the utils directory):
+
+    python -m matcher.benchmark --dim 128 --size 100000 \\
+        --M 8 16 32 --ef-construction 100 200 --ef 16 32 64 128
+
+    python -m matcher.benchmark --vectors embeddings.npy --k 1 5
+
+An index of the bot (INDEX_PATHS) is benchmarked on its own vectors:
+
+    python -m matcher.benchmark --vectors ../../../index/model_1.bin \\
+        --dim 5 --queries 100
+"""
+import time
+import argparse
+import hnswlib
+import numpy as np
+
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+from .matcher import Matcher
+
+
+class BenchmarkResult(NamedTuple):
+    M: int
+    ef_construction: int
+    ef: int
+    k: int
+    recall: float
+    p50_ms: float
+    p99_ms: float
+    build_s: float
+    index_mb: float
+
+
+def synthetic_vectors(
+    size: int, dim: int, clusters: int = 100, seed: int = 0
+) -> np.ndarray:
+    """
+    Generates size normalized vectors around clusters random centers,
+    which resembles face embeddings better than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(clusters, size=size)]
+    vectors += 0.3 * rng.standard_normal((size, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def load_vectors(path: str, dim: Optional[int] = None) -> np.ndarray:
+    """
+    Loads vectors from a .npy file or from a saved hnswlib index,
+    dim is required for the latter.
+    """
+    if path.endswith(".npy"):
+        return np.load(path).astype(np.float32)
+
+    if dim is None:
+        raise ValueError("Expected dim to load vectors from an index")
+    index = hnswlib.Index(space="l2", dim=dim)
+    index.load_index(path)
+    return np.asarray(index.get_items(index.get_ids_list()), dtype=np.float32)
+
+
+def brute_force_knn(
+    data: np.ndarray, queries: np.ndarray, k: int, chunk_size: int = 1024
+) -> np.ndarray:
+    """
+    Finds exact k nearest (l2) rows of data for every query,
+    nearest first.
+    """
+    data_norms = np.einsum("ij,ij->i", data, data)
+    labels = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), chunk_size):
+        chunk = queries[start : start + chunk_size]
+        # squared distances without the constant norm of the query
+        distances = data_norms[None, :] - 2 * chunk @ data.T
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(
+            np.take_along_axis(distances, nearest, axis=1), axis=1
+        )
+        labels[start : start + chunk_size] = np.take_along_axis(
+            nearest, order, axis=1
+        )
+    return labels
+
+
+def recall_at_k(labels: np.ndarray, truth: np.ndarray) -> float:
+    """
+    Share of the exact k nearest neighbours found among k returned ones.
+    """
+    k = truth.shape[1]
+    found = sum(
+        len(np.intersect1d(row[:k], true_row))
+        for row, true_row in zip(labels, truth)
+    )
+    return found / truth.size
+
+
+def run_benchmark(
+    data: np.ndarray,
+    queries: np.ndarray,
+    Ms: Iterable[int],
+    ef_constructions: Iterable[int],
+    efs: Iterable[int],
+    ks: Sequence[int] = (1,),
+    num_threads: int = -1,
+) -> List[BenchmarkResult]:
+    """
+    Benchmarks Matcher on data for every combination of the parameters.
+    Latencies are measured one query at a time in a single thread,
+    as the bot searches the vectors of a request.
+    """
+    truth = brute_force_knn(data, queries, max(ks))
+    efs = list(efs)
+    ef_constructions = list(ef_constructions)
+    results = []
+    for M in Ms:
+        for ef_construction in ef_constructions:
+            start = time.perf_counter()
+            matcher = Matcher(
+                data.shape[1], len(data), M=M, ef_construction=ef_construction
+            )
+            matcher.index.add_items(data, num_threads=num_threads)
+            build_s = time.perf_counter() - start
+            index_mb = matcher.index.index_file_size() / 2**20
+
+            for ef in efs:
+                matcher.set_ef(max(ef, max(ks)))
+                labels = np.empty((len(queries), max(ks)), dtype=np.int64)
+                latencies = np.empty(len(queries))
+                for i in range(len(queries)):
+                    start = time.perf_counter()
+                    labels[i], _ = matcher.index.knn_query(
+                        queries[i : i + 1], k=max(ks), num_threads=1
+                    )
+                    latencies[i] = time.perf_counter() - start
+
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+                for k in ks:
+                    results.append(
+                        BenchmarkResult(
+                            M,
+                            ef_construction,
+                            matcher.ef,
+                            k,
+                            recall_at_k(labels[:, :k], truth[:, :k]),
+                            p50,
+                            p99,
+                            build_s,
+                            index_mb,
+                        )
+                    )
+    return results
+
+
+def pareto_front(results: List[BenchmarkResult]) -> List[BenchmarkResult]:
+    """
+    Results of every k not dominated by another one with
+    at least the same recall and at most the same p99 latency.
+    """
+
+    def dominates(a: BenchmarkResult, b: BenchmarkResult) -> bool:
+        return (
+            a.k == b.k
+            and a.recall >= b.recall
+            and a.p99_ms <= b.p99_ms
+            and (a.recall > b.recall or a.p99_ms < b.p99_ms)
+        )
+
+    return [
+        result
+        for result in results
+        if not any(dominates(other, result) for other in results)
+    ]
+
+
+def format_table(results: List[BenchmarkResult]) -> str:
+    front = set(pareto_front(results))
+    header = (
+        f"{'':1} {'M':>4} {'efC':>5} {'ef':>5} {'k':>3} {'recall':>7} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'index MB':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for result in sorted(results, key=lambda r: (r.k, r.p99_ms)):
+        lines.append(
+            f"{'*' if result in front else '':1} {result.M:>4} "
+            f"{result.ef_construction:>5} {result.ef:>5} {result.k:>3} "
+            f"{result.recall:>7.4f} {result.p50_ms:>8.3f} "
+            f"{result.p99_ms:>8.3f} {result.build_s:>8.2f} "
+            f"{result.index_mb:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Recall/latency benchmark of Matcher"
+    )
+    parser.add_argument(
+        "--vectors", help=".npy file or saved hnswlib index to index"
+    )
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--M", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument(
+        "--ef-construction", type=int, nargs="+", default=[100, 200]
+    )
+    parser.add_argument(
+        "--ef", type=int, nargs="+", default=[10, 20, 50, 100, 200]
+    )
+    parser.add_argument("--k", type=int, nargs="+", default=[1])
+    parser.add_argument("--threads", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.vectors:
+        data = load_vectors(args.vectors, args.dim)
+    else:
+        data = synthetic_vectors(
+            args.size + args.queries, args.dim, seed=args.seed
+        )
+
+    if len(data) < args.queries + max(args.k):
+        parser.error(
+            f"Expected at least {args.queries + max(args.k)} vectors "
+            f"for {args.queries} queries, got {len(data)}, see --queries"
+        )
+
+    # queries are held out of the index, so the nearest
+    # neighbour is not trivially the query itself
+    rng = np.random.default_rng(args.seed)
+    permutation = rng.permutation(len(data))
+    queries = data[permutation[: args.queries]]
+    data = np.ascontiguousarray(data[permutation[args.queries :]])
+
+    results = run_benchmark(
+        data,
+        queries,
+        args.M,
+        args.ef_construction,
+        args.ef,
+        args.k,
+        args.threads,
+    )
+    print(
+        f"{len(data)} vectors of dim {data.shape[1]}, {len(queries)} queries"
+    )
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main()
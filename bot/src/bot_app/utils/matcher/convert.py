@@ -0,0 +1,112 @@
+"""
+Converts a saved hnswlib index of Matcher to QuantizedMatcher index
+and reports the memory saved and the recall@1 of the quantized search
+against exact brute force search.
+
+Usage (from the utils directory):
+
+    python -m matcher.convert ../../index/model_1.bin model_1.npz --dim 5
+    python -m matcher.convert model_1.bin model_1.npz --dim 128 \\
+        --vectors model_1.npy --rerank 16
+"""
+import argparse
+import hnswlib
+import numpy as np
+
+from typing import Optional, Sequence, Tuple
+from .benchmark import brute_force_knn, recall_at_k
+from .quantized_matcher import QuantizedMatcher
+
+
+def load_hnsw_index(path: str, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads the vectors and their labels from a saved hnswlib index.
+    """
+    index = hnswlib.Index(space="l2", dim=dim)
+    index.load_index(path)
+    labels = np.asarray(index.get_ids_list(), dtype=np.uint64)
+    vectors = np.asarray(index.get_items(labels), dtype=np.float32)
+    return vectors, labels
+
+
+def convert(
+    index_path: str,
+    output_path: str,
+    dim: int,
+    vectors_path: Optional[str] = None,
+) -> QuantizedMatcher:
+    """
+    Saves the vectors of the hnswlib index at index_path quantized
+    to output_path and, if vectors_path is given, the float32 vectors
+    to re-rank with in the same order.
+    """
+    vectors, labels = load_hnsw_index(index_path, dim)
+    matcher = QuantizedMatcher(dim)
+    matcher.quantize(vectors, labels)
+    matcher.save_index(output_path)
+    if vectors_path is not None:
+        np.save(vectors_path, vectors)
+    return matcher
+
+
+def measure_recall(
+    matcher: QuantizedMatcher,
+    vectors: np.ndarray,
+    queries_num: int = 1000,
+    noise: float = 0.1,
+    seed: int = 0,
+) -> float:
+    """
+    Recall@1 of matcher for random vectors of the index moved by
+    gaussian noise of noise times the spread of every dimension.
+    """
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(len(vectors), size=queries_num)]
+    queries = queries + noise * vectors.std(axis=0) * rng.standard_normal(
+        queries.shape
+    ).astype(np.float32)
+
+    truth = brute_force_knn(vectors, queries, 1)
+    labels = matcher.get_nearest_neighbour(queries)
+    # brute force returns positions, the labels are in the same order
+    return recall_at_k(labels, matcher._store.labels[truth])
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Convert hnswlib index to QuantizedMatcher index"
+    )
+    parser.add_argument("index", help="saved hnswlib index")
+    parser.add_argument("output", help="path to save quantized index to")
+    parser.add_argument("--dim", type=int, required=True)
+    parser.add_argument(
+        "--vectors", help="path to save float32 vectors to re-rank with"
+    )
+    parser.add_argument("--rerank", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    vectors, _ = load_hnsw_index(args.index, args.dim)
+    matcher = convert(args.index, args.output, args.dim, args.vectors)
+    float_bytes = vectors.nbytes + 8 * len(vectors)
+    print(
+        f"{len(matcher)} vectors: "
+        f"{matcher.nbytes / 2 ** 20:.2f} MB quantized, "
+        f"{float_bytes / 2 ** 20:.2f} MB as float32 with labels "
+        f"({float_bytes / matcher.nbytes:.1f}x)"
+    )
+    print(f"recall@1: {measure_recall(matcher, vectors, args.queries):.4f}")
+
+    if args.rerank and args.vectors:
+        reranking = QuantizedMatcher(
+            args.dim,
+            path_to_index=args.output,
+            vectors_path=args.vectors,
+            rerank=args.rerank,
+        )
+        recall = measure_recall(reranking, vectors, args.queries)
+        print(f"recall@1 with re-rank of {args.rerank}: {recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,62 @@
+import os
 import hnswlib
+import threading
+import contextlib
 import numpy as np
 
-from typing import Optional
+from typing import Iterator, Optional, Tuple
+
+# label of the matches rejected by the distance threshold
+REJECTED = -1
+
+
+def reject_distant(
+    labels: np.ndarray, distances: np.ndarray, max_distance: Optional[float]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Replaces the labels of the matches more distant than max_distance
+    with REJECTED, the labels are returned as int64.
+    """
+    labels = labels.astype(np.int64)
+    if max_distance is not None:
+        labels[distances > max_distance] = REJECTED
+    return labels, distances
+
+
+class _SearchLock:
+    """
+    Lets any amount of searches run together, while resizing
+    the index waits for them to finish and holds off new ones.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._searches = 0
+        self._resizing = False
+
+    @contextlib.contextmanager
+    def search(self) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._resizing)
+            self._searches += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._searches -= 1
+                self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def resize(self) -> Iterator[None]:
+        with self._condition:
+            self._resizing = True
+            self._condition.wait_for(lambda: self._searches == 0)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._resizing = False
+                self._condition.notify_all()
 
 
 class Matcher:
@@ -23,20 +78,35 @@ class Matcher:
 
     path_to_index : path to saved file index
 
+    ef : parameter that controls speed/accuracy trade-off during
+        the search, must not be less than the amount of searched
+        neighbours, hnswlib default is used if not given
+
+    Items can be added while the index is being searched from other
+    threads, the index grows GROWTH_FACTOR times when it is full.
+
     """
 
+    GROWTH_FACTOR = 2
+
     def __init__(
         self,
         dim: int,
         max_elements: int,
-        M: Optional[int] = None,
-        ef_construction: Optional[int] = None,
+        M: int = 16,
+        ef_construction: int = 200,
         path_to_index: Optional[str] = None,
+        ef: Optional[int] = None,
     ):
         self.dim = dim
         self.path_to_index = path_to_index
         self.max_elements = max_elements
+        self.modified = False
         self.index = hnswlib.Index(space="l2", dim=self.dim)
+        # adding, resizing and saving are serialized by _write_lock,
+        # searches only have to wait for resizing
+        self._write_lock = threading.Lock()
+        self._search_lock = _SearchLock()
 
         if self.path_to_index:
             self.index.load_index(
@@ -50,24 +120,79 @@ class Matcher:
                 ef_construction=ef_construction,
             )
 
-    def add_items(self, data: np.ndarray):
+        if ef is not None:
+            self.set_ef(ef)
+
+    @property
+    def ef(self) -> int:
+        return self.index.ef
+
+    def set_ef(self, ef: int):
         """
-        Adds data to index
+        Sets ef used by the following searches
         """
+        if not isinstance(ef, int) or isinstance(ef, bool):
+            raise TypeError(f"Expected ef to be int, instead got: {type(ef)}")
+        if ef < 1:
+            raise ValueError("Expected ef to be positive")
 
-        self.index.add_items(data)
+        self.index.set_ef(ef)
+
+    def add_items(self, data: np.ndarray, ids: Optional[np.ndarray] = None):
+        """
+        Adds data to index with the given ids (labels), the next free ids
+        are taken if ids are not given. The index is resized
+        if there is no room for data.
+        """
+        with self._write_lock:
+            required = self.index.get_current_count() + len(data)
+            if required > self.max_elements:
+                self.__resize(
+                    max(required, self.max_elements * self.GROWTH_FACTOR)
+                )
+            self.index.add_items(data, ids)
+            self.modified = True
+
+    def __resize(self, max_elements: int):
+        with self._search_lock.resize():
+            self.index.resize_index(max_elements)
+        self.max_elements = max_elements
 
     def save_index(self, path_to_index: str):
         """
         Saves self.index to path_to_index
         """
+        with self._write_lock:
+            self.index.save_index(path_to_index)
+            self.path_to_index = path_to_index
+            self.modified = False
 
-        self.index.save_index(path_to_index)
-        self.path_to_index = path_to_index
+    def snapshot(self, path_to_index: str):
+        """
+        Saves self.index to a temporary file and atomically renames it
+        to path_to_index, so readers of path_to_index never see
+        a partially written index. Searches are not blocked meanwhile.
+        """
+        temporary_path = f"{path_to_index}.tmp"
+        with self._write_lock:
+            try:
+                self.index.save_index(temporary_path)
+                os.replace(temporary_path, path_to_index)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temporary_path)
+                raise
+            self.path_to_index = path_to_index
+            self.modified = False
+
+    def __len__(self) -> int:
+        return self.index.get_current_count()
 
-    def get_nearest_neighbour(self, data: np.ndarray) -> np.ndarray:
+    def knn_query(
+        self, data: np.ndarray, k: int = 1, num_threads: int = -1
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Finds nearest neighbours in indexed-dataset from self.index
+        Finds k nearest neighbours in indexed-dataset from self.index
         for every data's row
 
         Parameters
@@ -75,10 +200,16 @@ class Matcher:
         data : len(data.shape) == 2 and data.shape[1] == self.dim
             the first axis states the amounts of vectors
 
+        k : amount of neighbours to find, not more than len(self)
+
+        num_threads : amount of threads the rows are searched with,
+            -1 stands for the amount of cpu cores
+
         Returns
         -------
-        labels : labels of the matched (nearest) vectors
-            for data.shape[0] vectors
+        labels : labels of k nearest vectors for every row, nearest first
+
+        distances : squared l2 distances to the vectors in labels
         """
         if not isinstance(data, np.ndarray):
             raise TypeError(
@@ -90,5 +221,53 @@ class Matcher:
                 f"Wrong shape must be 2-dim with {self.dim} on the second axis"
             )
 
-        labels, distances = self.index.knn_query(data, k=1)
+        with self._search_lock.search():
+            return self.index.knn_query(data, k=k, num_threads=num_threads)
+
+    def get_top_k(
+        self,
+        data: np.ndarray,
+        k: int = 1,
+        max_distance: Optional[float] = None,
+        num_threads: int = -1,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds k nearest neighbours for every data's row and rejects
+        the ones more distant than max_distance, see knn_query.
+
+        The distances are exact, as hnswlib keeps float32 vectors, so
+        the accuracy lost with a low ef is restored by a higher k
+        rather than by re-ranking.
+
+        Returns
+        -------
+        labels : int64 labels of k nearest vectors for every row,
+            REJECTED for the vectors more distant than max_distance
+
+        distances : squared l2 distances to the vectors
+        """
+        labels, distances = self.knn_query(data, k, num_threads)
+        return reject_distant(labels, distances, max_distance)
+
+    def get_nearest_neighbour(
+        self, data: np.ndarray, num_threads: int = -1
+    ) -> np.ndarray:
+        """
+        Finds nearest neighbours in indexed-dataset from self.index
+        for every data's row
+
+        Parameters
+        ----------
+        data : len(data.shape) == 2 and data.shape[1] == self.dim
+            the first axis states the amounts of vectors
+
+        num_threads : amount of threads the rows are searched with,
+            -1 stands for the amount of cpu cores
+
+        Returns
+        -------
+        labels : labels of the matched (nearest) vectors
+            for data.shape[0] vectors
+        """
+        labels, distances = self.knn_query(data, k=1, num_threads=num_threads)
         return labels
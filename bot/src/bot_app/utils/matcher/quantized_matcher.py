@@ -0,0 +1,340 @@
+import os
+import threading
+import contextlib
+import numpy as np
+
+from typing import NamedTuple, Optional, Tuple
+from .matcher import reject_distant
+
+
+class _QuantizedStore(NamedTuple):
+    codes: np.ndarray
+    norms: np.ndarray
+    labels: np.ndarray
+    offset: np.ndarray
+    scale: np.ndarray
+
+    def encode(self, data: np.ndarray) -> np.ndarray:
+        codes = np.rint((data - self.offset) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.offset + self.scale * codes.astype(np.float32)
+
+    def norms_of(self, codes: np.ndarray) -> np.ndarray:
+        scaled = self.scale * codes.astype(np.float32)
+        return np.einsum("ij,ij->i", scaled, scaled)
+
+
+class QuantizedMatcher:
+    """
+    Matches given vectors in data with nearest (l2) vectors in dataset
+    stored with int8 scalar quantization, 4 times more compact
+    than float32. The search is exhaustive over the codes.
+
+    Every dimension is quantized to 256 levels between its min and max
+    values in the data given to quantize, vectors added later by
+    add_items are clipped to them. Items can be added and the index
+    saved while it is searched from other threads.
+
+    Parameters
+    ----------
+    dim : dimensionality of vectors
+
+    path_to_index : path to saved file index, see save_index
+
+    vectors_path : path to .npy file with float32 vectors in the order
+        of the index, they are memory mapped to re-rank candidates
+
+    rerank : amount of the nearest candidates by the codes to re-rank
+        by exact distances to vectors from vectors_path
+
+    chunk_size : amount of codes decoded at once during the search
+
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        path_to_index: Optional[str] = None,
+        vectors_path: Optional[str] = None,
+        rerank: int = 0,
+        chunk_size: int = 65536,
+    ):
+        if not isinstance(dim, int) or dim < 1:
+            raise TypeError(f"Expected dim to be positive int, got: {dim}")
+        if not isinstance(rerank, int) or rerank < 0:
+            raise TypeError("Expected rerank to be non-negative int")
+        if rerank and vectors_path is None:
+            raise ValueError("Expected vectors_path to re-rank candidates")
+
+        self.dim = dim
+        self.path_to_index = path_to_index
+        self.rerank = rerank
+        self.chunk_size = chunk_size
+        self.modified = False
+        # searches take the current store, writers replace it as a whole
+        self._store = _QuantizedStore(
+            np.empty((0, dim), dtype=np.uint8),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.uint64),
+            np.zeros(dim, dtype=np.float32),
+            np.ones(dim, dtype=np.float32),
+        )
+        self._write_lock = threading.Lock()
+
+        if path_to_index:
+            self.__load(path_to_index)
+
+        self.vectors: Optional[np.ndarray] = None
+        if vectors_path:
+            self.vectors = np.load(vectors_path, mmap_mode="r")
+            if self.vectors.shape != (len(self), dim):
+                raise ValueError(
+                    f"Expected {len(self)} vectors of dim {dim} "
+                    f"in {vectors_path}, got: {self.vectors.shape}"
+                )
+
+    def __len__(self) -> int:
+        return len(self._store.labels)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory taken by the quantized vectors and their labels.
+        """
+        return sum(array.nbytes for array in self._store)
+
+    def quantize(self, data: np.ndarray, ids: Optional[np.ndarray] = None):
+        """
+        Replaces the index with data quantized by its own ranges,
+        ids are the labels of data rows, 0, 1, ... if not given
+        """
+        self.__verify_data(data)
+        if ids is None:
+            ids = np.arange(len(data))
+        minimum = data.min(axis=0).astype(np.float32)
+        scale = (data.max(axis=0).astype(np.float32) - minimum) / 255
+        store = _QuantizedStore(
+            None,
+            None,
+            np.asarray(ids, dtype=np.uint64),
+            minimum,
+            np.where(scale > 0, scale, 1).astype(np.float32),
+        )
+        codes = store.encode(data)
+        with self._write_lock:
+            self._store = store._replace(
+                codes=codes, norms=store.norms_of(codes)
+            )
+            self.modified = True
+
+    def add_items(self, data: np.ndarray, ids: Optional[np.ndarray] = None):
+        """
+        Adds data to index with the given ids (labels), the next free ids
+        are taken if ids are not given. Vectors added are not re-ranked.
+        """
+        self.__verify_data(data)
+        with self._write_lock:
+            store = self._store
+            if ids is None:
+                first = int(store.labels.max()) + 1 if len(store.labels) else 0
+                ids = np.arange(first, first + len(data))
+            codes = store.encode(data)
+            self._store = store._replace(
+                codes=np.concatenate([store.codes, codes]),
+                norms=np.concatenate([store.norms, store.norms_of(codes)]),
+                labels=np.concatenate(
+                    [store.labels, np.asarray(ids, np.uint64)]
+                ),
+            )
+            self.modified = True
+
+    def save_index(self, path_to_index: str):
+        """
+        Saves the quantized vectors to path_to_index in .npz format
+        """
+        with self._write_lock:
+            with open(path_to_index, "wb") as file:
+                np.savez(
+                    file,
+                    codes=self._store.codes,
+                    labels=self._store.labels,
+                    offset=self._store.offset,
+                    scale=self._store.scale,
+                )
+            self.path_to_index = path_to_index
+            self.modified = False
+
+    def snapshot(self, path_to_index: str):
+        """
+        Saves the index to a temporary file and atomically renames it
+        to path_to_index.
+        """
+        temporary_path = f"{path_to_index}.tmp"
+        try:
+            self.save_index(temporary_path)
+            os.replace(temporary_path, path_to_index)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporary_path)
+            raise
+        self.path_to_index = path_to_index
+
+    def __load(self, path_to_index: str):
+        with np.load(path_to_index) as index:
+            store = _QuantizedStore(
+                index["codes"],
+                None,
+                index["labels"],
+                index["offset"],
+                index["scale"],
+            )
+        if store.codes.shape[1:] != (self.dim,):
+            raise ValueError(
+                f"Expected index of dim {self.dim}, "
+                f"got: {store.codes.shape[1:]}"
+            )
+        self._store = store._replace(norms=store.norms_of(store.codes))
+
+    def __verify_data(self, data: np.ndarray):
+        if not isinstance(data, np.ndarray):
+            raise TypeError(
+                "Expected data to be np.ndarray," f"instead got: {type(data)}"
+            )
+
+        if len(data.shape) != 2 or data.shape[1] != self.dim:
+            raise ValueError(
+                f"Wrong shape must be 2-dim with {self.dim} on the second axis"
+            )
+
+    def __search(
+        self, store: _QuantizedStore, queries: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # ||q - o - s*c||^2 = ||q - o||^2 - 2 (q - o)s . c + ||s*c||^2,
+        # the first term is the same for every code and is added last
+        shifted = queries - store.offset
+        weights = shifted * store.scale
+        positions = np.empty((len(queries), 0), dtype=np.int64)
+        distances = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(store.codes), self.chunk_size):
+            codes = store.codes[start : start + self.chunk_size]
+            chunk_distances = store.norms[start : start + len(codes)] - 2 * (
+                weights @ codes.T.astype(np.float32)
+            )
+            chunk_positions = np.broadcast_to(
+                np.arange(start, start + len(codes)),
+                (len(queries), len(codes)),
+            )
+            positions = np.concatenate([positions, chunk_positions], axis=1)
+            distances = np.concatenate([distances, chunk_distances], axis=1)
+            if distances.shape[1] > k:
+                nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                positions = np.take_along_axis(positions, nearest, axis=1)
+                distances = np.take_along_axis(distances, nearest, axis=1)
+
+        order = np.argsort(distances, axis=1)
+        positions = np.take_along_axis(positions, order, axis=1)
+        distances = np.take_along_axis(distances, order, axis=1)
+        return (
+            positions,
+            distances + np.einsum("ij,ij->i", shifted, shifted)[:, None],
+        )
+
+    def __rerank(
+        self,
+        store: _QuantizedStore,
+        queries: np.ndarray,
+        positions: np.ndarray,
+        k: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # vectors added after vectors_path was written are decoded instead
+        reranked = np.empty((len(queries), k), dtype=np.int64)
+        reranked_distances = np.empty((len(queries), k), dtype=np.float32)
+        for i, (query, candidates) in enumerate(zip(queries, positions)):
+            candidates = np.sort(candidates)
+            stored = candidates[candidates < len(self.vectors)]
+            vectors = np.concatenate(
+                [
+                    np.asarray(self.vectors[stored], dtype=np.float32),
+                    store.decode(store.codes[candidates[len(stored) :]]),
+                ]
+            )
+            distances = ((vectors - query) ** 2).sum(axis=1)
+            nearest = np.argsort(distances, kind="stable")[:k]
+            reranked[i] = candidates[nearest]
+            reranked_distances[i] = distances[nearest]
+        return reranked, reranked_distances
+
+    def get_top_k(
+        self,
+        data: np.ndarray,
+        k: int = 1,
+        max_distance: Optional[float] = None,
+        num_threads: int = -1,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds k nearest neighbours for every data's row and rejects
+        the ones more distant than max_distance.
+
+        max(k, rerank) candidates are found by the codes and re-ranked
+        by exact distances if vectors_path is given, otherwise
+        the distances are approximated by the codes.
+
+        Parameters
+        ----------
+        data : len(data.shape) == 2 and data.shape[1] == self.dim
+            the first axis states the amounts of vectors
+
+        k : amount of neighbours to find, not more than len(self)
+
+        max_distance : max squared l2 distance of a match
+
+        num_threads : kept for compatibility with Matcher, the search
+            is parallelized by numpy
+
+        Returns
+        -------
+        labels : int64 labels of k nearest vectors for every row,
+            REJECTED for the vectors more distant than max_distance
+
+        distances : squared l2 distances to the vectors
+        """
+        self.__verify_data(data)
+        store = self._store
+        if not 0 < k <= len(store.labels):
+            raise RuntimeError(
+                f"Expected k to be from 1 to {len(store.labels)}, got: {k}"
+            )
+
+        queries = data.astype(np.float32)
+        reranking = self.rerank and self.vectors is not None
+        candidates = min(max(k, self.rerank), len(store.labels))
+        positions, distances = self.__search(store, queries, candidates)
+        if reranking:
+            positions, distances = self.__rerank(store, queries, positions, k)
+        return reject_distant(
+            store.labels[positions[:, :k]], distances[:, :k], max_distance
+        )
+
+    def get_nearest_neighbour(
+        self, data: np.ndarray, num_threads: int = -1
+    ) -> np.ndarray:
+        """
+        Finds nearest neighbours in indexed-dataset for every data's row
+
+        Parameters
+        ----------
+        data : len(data.shape) == 2 and data.shape[1] == self.dim
+            the first axis states the amounts of vectors
+
+        num_threads : kept for compatibility with Matcher, the search
+            is parallelized by numpy
+
+        Returns
+        -------
+        labels : labels of the matched (nearest) vectors
+            for data.shape[0] vectors
+        """
+        labels, distances = self.get_top_k(data, 1)
+        return labels
@@ -0,0 +1,63 @@
+"""
+Builds a ShardedMatcher in parallel from a saved hnswlib index
+or a .npy file of vectors and prints the INDEX_PATHS entry of it.
+
+Usage (from the utils directory):
+
+    python -m matcher.shard ../../index/model_1.bin ../../index/model_1 \\
+        --dim 5 --shards 4
+"""
+import time
+import argparse
+import numpy as np
+
+from typing import Optional, Sequence
+from .convert import load_hnsw_index
+from .sharded_matcher import ShardedMatcher, SHARD_SEPARATOR
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Build sharded index from hnswlib index or vectors"
+    )
+    parser.add_argument("source", help="saved hnswlib index or .npy file")
+    parser.add_argument(
+        "output", help="prefix of the shards paths, _<i>.bin is appended"
+    )
+    parser.add_argument("--dim", type=int)
+    parser.add_argument("--shards", type=int, required=True)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.source.endswith(".npy"):
+        vectors = np.load(args.source).astype(np.float32)
+        labels = np.arange(len(vectors))
+    else:
+        if args.dim is None:
+            parser.error("--dim is required to read hnswlib index")
+        vectors, labels = load_hnsw_index(args.source, args.dim)
+
+    started = time.perf_counter()
+    matcher = ShardedMatcher.build(
+        vectors,
+        args.shards,
+        ids=labels,
+        M=args.M,
+        ef_construction=args.ef_construction,
+    )
+    built = time.perf_counter() - started
+
+    path_to_index = SHARD_SEPARATOR.join(
+        f"{args.output}_{i}.bin" for i in range(args.shards)
+    )
+    matcher.save_index(path_to_index)
+    matcher.close()
+    print(
+        f"Built {len(matcher)} vectors in {args.shards} shards in {built:.2f}s"
+    )
+    print(f"INDEX_PATHS entry: {path_to_index}")
+
+
+if __name__ == "__main__":
+    main()
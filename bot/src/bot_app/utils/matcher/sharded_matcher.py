@@ -0,0 +1,232 @@
+import os
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+from .matcher import Matcher, reject_distant
+
+SHARD_SEPARATOR = ";"
+
+
+class ShardedMatcher:
+    """
+    Matches given vectors in data with nearest vectors in dataset split
+    into shards, every shard is a Matcher index of its own.
+
+    The shards are searched in parallel threads and their results are
+    merged by distance. Shards are labeled with the global gallery ids
+    (see build), so the labels need no mapping after the merge.
+
+    Parameters
+    ----------
+    dim : dimensionality of vectors
+
+    max_elements : max vectors amount of every shard
+
+    M : parameter that defines the maximum number of outgoing
+        connections in the graph of every shard
+
+    ef_construction : parameter that controls speed/accuracy trade-off
+        during the shards construction
+
+    path_to_index : paths to saved shards separated by SHARD_SEPARATOR
+
+    ef : parameter that controls speed/accuracy trade-off during
+        the search of every shard
+
+    shards_num : amount of empty shards to create if path_to_index
+        is not given
+
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        max_elements: int,
+        M: int = 16,
+        ef_construction: int = 200,
+        path_to_index: Optional[str] = None,
+        ef: Optional[int] = None,
+        shards_num: int = 1,
+    ):
+        self.dim = dim
+        self.path_to_index = path_to_index
+
+        if path_to_index:
+            paths = path_to_index.split(SHARD_SEPARATOR)
+        else:
+            if not isinstance(shards_num, int) or shards_num < 1:
+                raise ValueError("Expected shards_num to be a positive int")
+            paths = [None] * shards_num
+
+        self.shards_num = len(paths)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+        # shards are loaded in parallel as well as searched
+        self.shards: List[Matcher] = list(
+            self.pool.map(
+                lambda path: Matcher(
+                    dim,
+                    max_elements,
+                    M=M,
+                    ef_construction=ef_construction,
+                    path_to_index=path,
+                    ef=ef,
+                ),
+                paths,
+            )
+        )
+        self._next_id = max(
+            (
+                int(max(shard.index.get_ids_list())) + 1
+                for shard in self.shards
+                if len(shard)
+            ),
+            default=0,
+        )
+
+    @classmethod
+    def build(
+        cls,
+        data: np.ndarray,
+        shards_num: int,
+        ids: Optional[np.ndarray] = None,
+        M: int = 16,
+        ef_construction: int = 200,
+        ef: Optional[int] = None,
+    ) -> "ShardedMatcher":
+        """
+        Builds shards_num shards of data in parallel, the rows of data
+        are labeled by ids, 0, 1, ... if not given, and distributed
+        between the shards round-robin.
+        """
+        if ids is None:
+            ids = np.arange(len(data))
+        matcher = cls(
+            data.shape[1],
+            max(1, -(-len(data) // shards_num)),
+            M=M,
+            ef_construction=ef_construction,
+            ef=ef,
+            shards_num=shards_num,
+        )
+        list(
+            matcher.pool.map(
+                lambda i: matcher.shards[i].add_items(
+                    data[i::shards_num], ids[i::shards_num]
+                ),
+                range(min(shards_num, len(data))),
+            )
+        )
+        matcher._next_id = int(np.max(ids)) + 1 if len(ids) else 0
+        return matcher
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        # the threads of the pool are not inherited by forked processes
+        if self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.shards_num)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    @property
+    def modified(self) -> bool:
+        return any(shard.modified for shard in self.shards)
+
+    def set_ef(self, ef: int):
+        for shard in self.shards:
+            shard.set_ef(ef)
+
+    def add_items(self, data: np.ndarray, ids: Optional[np.ndarray] = None):
+        """
+        Adds data to the smallest shard with the given ids (labels),
+        the next free ids are taken if ids are not given.
+        """
+        if ids is None:
+            ids = np.arange(self._next_id, self._next_id + len(data))
+        min(self.shards, key=len).add_items(data, ids)
+        self._next_id = max(self._next_id, int(np.max(ids)) + 1)
+
+    def save_index(self, path_to_index: str):
+        """
+        Saves the shards to the paths separated by SHARD_SEPARATOR
+        """
+        self.__save(path_to_index, Matcher.save_index)
+
+    def snapshot(self, path_to_index: str):
+        """
+        Atomically replaces every shard file, see Matcher.snapshot
+        """
+        self.__save(path_to_index, Matcher.snapshot)
+
+    def __save(self, path_to_index: str, save):
+        paths = path_to_index.split(SHARD_SEPARATOR)
+        if len(paths) != len(self.shards):
+            raise ValueError(
+                f"Expected {len(self.shards)} paths, got: {len(paths)}"
+            )
+        list(self.pool.map(save, self.shards, paths))
+        self.path_to_index = path_to_index
+
+    def knn_query(
+        self, data: np.ndarray, k: int = 1, num_threads: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds k nearest neighbours among all the shards for every data's
+        row, see Matcher.knn_query.
+
+        num_threads is the amount of threads every shard is searched with.
+        """
+        shards = [shard for shard in self.shards if len(shard)]
+        if k > sum(len(shard) for shard in shards):
+            raise RuntimeError(
+                f"Expected k to be not more than {len(self)} vectors"
+            )
+
+        results: Sequence[Tuple[np.ndarray, np.ndarray]] = list(
+            self.pool.map(
+                lambda shard: shard.knn_query(
+                    data, min(k, len(shard)), num_threads
+                ),
+                shards,
+            )
+        )
+        labels = np.concatenate([result[0] for result in results], axis=1)
+        distances = np.concatenate([result[1] for result in results], axis=1)
+        nearest = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(labels, nearest, axis=1),
+            np.take_along_axis(distances, nearest, axis=1),
+        )
+
+    def get_top_k(
+        self,
+        data: np.ndarray,
+        k: int = 1,
+        max_distance: Optional[float] = None,
+        num_threads: int = 1,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds k nearest neighbours among all the shards for every data's
+        row, see Matcher.get_top_k.
+        """
+        labels, distances = self.knn_query(data, k, num_threads)
+        return reject_distant(labels, distances, max_distance)
+
+    def get_nearest_neighbour(
+        self, data: np.ndarray, num_threads: int = 1
+    ) -> np.ndarray:
+        """
+        Finds nearest neighbours among all the shards for every data's row,
+        see Matcher.get_nearest_neighbour.
+        """
+        labels, distances = self.knn_query(data, 1, num_threads)
+        return labels
+
+    def close(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown()
+        self._pool = None
@@ -0,0 +1,302 @@
+import math
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from aiohttp import web
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values) -> "_Metric":
+        """
+        Returns the child metric of the label values, the children
+        are created once and are meant to be kept by the callers
+        of the hot paths.
+        """
+        if len(values) != len(self.label_names):
+            raise ValueError(
+                f"Expected {len(self.label_names)} label values "
+                f"for {self.name}"
+            )
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._child()
+        return child
+
+    def _child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def collect(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """
+        Yields (name, labels, value) of every sample of the metric.
+        """
+        if not self.label_names:
+            yield from self._samples()
+            return
+        for values, child in sorted(self._children.items()):
+            labels = dict(zip(self.label_names, values))
+            for name, child_labels, value in child._samples():
+                yield name, {**labels, **child_labels}, value
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value, e.g. the amount of processed photos.
+    """
+
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = ()
+    ):
+        super().__init__(name, documentation, labels)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Expected a non-negative amount")
+        self.value += amount
+
+    def _child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def _samples(self):
+        yield self.name, {}, self.value
+
+
+class Gauge(_Metric):
+    """
+    Value going up and down, e.g. the amount of photos in progress.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = ()
+    ):
+        super().__init__(name, documentation, labels)
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    @contextmanager
+    def track_in_progress(self) -> Iterator[None]:
+        self.value += 1
+        try:
+            yield
+        finally:
+            self.value -= 1
+
+    def _child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def _samples(self):
+        yield self.name, {}, self.value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values, e.g. latencies, by cumulative
+    buckets with the sum and the count of the values.
+
+    Parameters
+    ----------
+    buckets : increasing upper bounds of the buckets, +Inf is added
+
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        buckets = [float(bucket) for bucket in buckets]
+        if not buckets or buckets != sorted(set(buckets)):
+            raise ValueError("Expected increasing buckets")
+        if buckets[-1] != math.inf:
+            buckets.append(math.inf)
+        self.buckets = tuple(buckets)
+        # the amount of values of every bucket, not cumulative,
+        # so an observation updates a single bucket
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """
+        Observes the seconds the block takes, failed or not.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def _child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def _samples(self):
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f"{self.name}_bucket", {"le": _format(bucket)}, cumulative
+        yield f"{self.name}_sum", {}, self.sum
+        yield f"{self.name}_count", {}, cumulative
+
+
+class Registry:
+    """
+    Set of metrics rendered in the Prometheus text format.
+
+    None of the metrics are thread safe: they are intended to be updated
+    from one event loop.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labels: Sequence[str] = ()
+    ) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(
+        self, name: str, documentation: str, labels: Sequence[str] = ()
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """
+        Adds a function called before every rendering, e.g. to set
+        gauges from the stats of other objects.
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics.values():
+            documentation = metric.documentation.replace("\\", "\\\\")
+            documentation = documentation.replace("\n", "\\n")
+            lines.append(f"# HELP {metric.name} {documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.collect():
+                lines.append(
+                    f"{name}{_format_labels(labels)} {_format(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        aiohttp handler of the /metrics endpoint.
+        """
+        return web.Response(
+            body=self.render().encode(),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
+
+    def create_app(self, path: str = "/metrics") -> web.Application:
+        app = web.Application()
+        app.router.add_get(path, self.handle)
+        return app
+
+
+def _format(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\")
+            .replace("\n", "\\n")
+            .replace('"', '\\"'),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
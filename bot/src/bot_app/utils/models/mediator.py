@@ -1,8 +1,55 @@
 import asyncio
 import numpy as np
 import tritonclient.http as httpclient
-from typing import Iterable, List
-from .models import ModelData
+import tritonclient.http.aio as aiohttpclient
+from tritonclient.utils import triton_to_np_dtype
+from typing import Iterable, List, Optional
+from .models import ModelConfig, ModelData
+from .shared_memory import SharedMemoryPool
+
+
+def _verify_model_inputs(
+    model_inputs: Iterable[ModelData],
+) -> List[ModelData]:
+    if not isinstance(model_inputs, Iterable):
+        raise TypeError("Expected model_inputs to be Iterable")
+
+    model_inputs = list(model_inputs)
+    for model_input in model_inputs:
+        if not isinstance(model_input, ModelData):
+            raise TypeError(
+                "Expected model_inputs to be Iterable of ModelData objects"
+            )
+    return model_inputs
+
+
+def _make_server_input(model_input: ModelData) -> List[httpclient.InferInput]:
+    config = model_input.model_config
+
+    if model_input.batched:
+        data = model_input.data
+    else:
+        data = np.expand_dims(model_input.data, axis=0)
+
+    server_input = httpclient.InferInput(
+        config.input_name, list(data.shape), config.data_type
+    )
+    server_input.set_data_from_numpy(data, binary_data=True)
+    return [server_input]
+
+
+def _make_server_output(
+    config: ModelConfig,
+) -> List[httpclient.InferRequestedOutput]:
+    return [
+        httpclient.InferRequestedOutput(config.output_name, binary_data=True)
+    ]
+
+
+def _make_model_output(data: np.ndarray, config: ModelConfig) -> ModelData:
+    return ModelData(
+        data=data, model_config=config, batched=(data.shape[0] != 1)
+    )
 
 
 class Mediator:
@@ -31,52 +78,15 @@ class Mediator:
         model_inputs : Iterable of ModelData objects
 
         """
-        if not isinstance(model_inputs, Iterable):
-            raise TypeError("Expected model_inputs to be Iterable")
-
-        for model_input in model_inputs:
-            if not isinstance(model_input, ModelData):
-                raise TypeError(
-                    "Expected model_inputs to be Iterable of ModelData objects"
-                )
-
+        for model_input in _verify_model_inputs(model_inputs):
             config = model_input.model_config
             self.model_configs.append(config)
 
-            if model_input.batched:
-                server_input = [
-                    httpclient.InferInput(
-                        config.input_name,
-                        model_input.data.shape,
-                        config.data_type,
-                    )
-                ]
-                server_input[0].set_data_from_numpy(
-                    model_input.data, binary_data=True
-                )
-            else:
-                server_input = [
-                    httpclient.InferInput(
-                        config.input_name,
-                        [1, *model_input.data.shape],
-                        config.data_type,
-                    )
-                ]
-                server_input[0].set_data_from_numpy(
-                    np.expand_dims(model_input.data, axis=0), binary_data=True
-                )
-
-            server_output = [
-                httpclient.InferRequestedOutput(
-                    config.output_name, binary_data=True
-                )
-            ]
-
             self.async_requests.append(
                 self.client.async_infer(
                     model_name=config.model_name,
-                    inputs=server_input,
-                    outputs=server_output,
+                    inputs=_make_server_input(model_input),
+                    outputs=_make_server_output(config),
                 )
             )
 
@@ -112,9 +122,162 @@ class Mediator:
         results = [None] * requests_num
         for _ in range(requests_num):
             index, data = self.results_queue.get_nowait()
-            results[index] = ModelData(
-                data=data,
-                model_config=self.model_configs[index],
-                batched=(data.shape[0] != 1),
+            results[index] = _make_model_output(
+                data, self.model_configs[index]
             )
         return results
+
+
+class AsyncMediator:
+    """
+    Mediator between the bot client and TIS, that uses http protocol
+    through the asyncio client of tritonclient.
+
+    Every infer call keeps its state to itself, so a single object can be
+    shared by all the handlers running in one event loop. The underlying
+    client and its connection pool are created on the first request,
+    inside the running event loop.
+
+    With shared_memory enabled input and output tensors are passed
+    through POSIX shared memory regions registered in TIS, so only
+    the regions names go over http. It requires TIS to run on the same
+    host and output_dims to be set in the models configs.
+
+    Parameters
+    ----------
+    url : TIS url without the scheme
+
+    conn_limit : max amount of simultaneously opened connections to TIS
+
+    shared_memory : if tensors are passed through shared memory
+
+    client_class : class of the asyncio TIS client to create
+
+    """
+
+    def __init__(
+        self,
+        url: str,
+        conn_limit: int,
+        shared_memory: bool = False,
+        client_class=aiohttpclient.InferenceServerClient,
+    ):
+        self.url = url
+        self.conn_limit = conn_limit
+        self.shared_memory = shared_memory
+        self.client_class = client_class
+        self._client: Optional[aiohttpclient.InferenceServerClient] = None
+        self._shared_memory_pool: Optional[SharedMemoryPool] = None
+
+    @property
+    def client(self) -> aiohttpclient.InferenceServerClient:
+        if self._client is None:
+            self._client = self.client_class(
+                url=self.url, conn_limit=self.conn_limit
+            )
+        return self._client
+
+    @property
+    def shared_memory_pool(self) -> SharedMemoryPool:
+        if self._shared_memory_pool is None:
+            self._shared_memory_pool = SharedMemoryPool(self.client)
+        return self._shared_memory_pool
+
+    async def infer(
+        self, model_inputs: Iterable[ModelData]
+    ) -> List[ModelData]:
+        """
+        Sends http inference requests to TIS concurrently
+        and waits for their results.
+
+        Parameters
+        ----------
+        model_inputs : Iterable of ModelData objects
+
+        Returns
+        -------
+        results : list of ModelData objects containing received data
+            in the order of model_inputs
+
+        """
+        model_inputs = _verify_model_inputs(model_inputs)
+
+        return list(
+            await asyncio.gather(
+                *(self.__infer(model_input) for model_input in model_inputs)
+            )
+        )
+
+    async def __infer(self, model_input: ModelData) -> ModelData:
+        if self.shared_memory:
+            return await self.__infer_shared_memory(model_input)
+
+        config = model_input.model_config
+        result = await self.client.infer(
+            model_name=config.model_name,
+            inputs=_make_server_input(model_input),
+            outputs=_make_server_output(config),
+        )
+        return _make_model_output(result.as_numpy(config.output_name), config)
+
+    async def __infer_shared_memory(self, model_input: ModelData) -> ModelData:
+        config = model_input.model_config
+        if config.output_dims is None:
+            raise ValueError(
+                "Expected output_dims of model_config to be set"
+                " to receive outputs through shared memory"
+            )
+
+        dtype = triton_to_np_dtype(config.data_type)
+        data = model_input.data.astype(dtype, copy=False)
+        if not model_input.batched:
+            data = np.expand_dims(data, axis=0)
+        output_byte_size = (
+            data.shape[0]
+            * int(np.prod(config.output_dims))
+            * np.dtype(dtype).itemsize
+        )
+
+        pool = self.shared_memory_pool
+        input_region = await pool.acquire(data.nbytes)
+        try:
+            output_region = await pool.acquire(output_byte_size)
+            try:
+                server_input = httpclient.InferInput(
+                    config.input_name, list(data.shape), config.data_type
+                )
+                server_input.set_shared_memory(
+                    input_region.name, input_region.write(data)
+                )
+                server_output = httpclient.InferRequestedOutput(
+                    config.output_name, binary_data=True
+                )
+                server_output.set_shared_memory(
+                    output_region.name, output_region.byte_size
+                )
+
+                result = await self.client.infer(
+                    model_name=config.model_name,
+                    inputs=[server_input],
+                    outputs=[server_output],
+                )
+                output = result.get_output(config.output_name)
+                return _make_model_output(
+                    output_region.read(output["shape"], dtype), config
+                )
+            finally:
+                pool.release(output_region)
+        finally:
+            pool.release(input_region)
+
+    async def close(self):
+        """
+        Frees the shared memory regions, closes the underlying client
+        and its connections.
+        """
+        if self._shared_memory_pool is not None:
+            await self._shared_memory_pool.close()
+            self._shared_memory_pool = None
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
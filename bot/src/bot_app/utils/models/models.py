@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List, Optional, Tuple
 import numpy as np
 
 
@@ -15,12 +16,16 @@ class ModelConfig:
 
     input/output_data_type : input/output data type of the model defined
         in config.pbtxt.
+
+    output_dims : output dims defined in config.pbtxt for TIS,
+        required to receive outputs through shared memory
     """
 
     model_name: str
     input_name: str = "INPUT__0"
     output_name: str = "OUTPUT__0"
     data_type: str = "FP32"
+    output_dims: Optional[List[int]] = None
 
 
 @dataclass
@@ -41,3 +46,62 @@ class ModelData:
     data: np.ndarray
     model_config: ModelConfig
     batched: bool = False
+
+    @staticmethod
+    def stack(
+        model_inputs: List["ModelData"], out: Optional[np.ndarray] = None
+    ) -> "ModelData":
+        """
+        Stacks not batched ModelData objects of the same model
+        into a single batched ModelData.
+
+        If out is given, the data is stacked into it instead of
+        a newly allocated array and the result references out.
+        """
+        if not model_inputs:
+            raise ValueError("Expected at least one ModelData to stack")
+
+        model_config = model_inputs[0].model_config
+        for model_input in model_inputs:
+            if model_input.batched:
+                raise ValueError(
+                    "Expected ModelData objects not to be batched"
+                )
+            if model_input.model_config != model_config:
+                raise ValueError(
+                    "Expected ModelData objects to share the same model_config"
+                )
+
+        return ModelData(
+            data=np.stack(
+                [model_input.data for model_input in model_inputs], out=out
+            ),
+            model_config=model_config,
+            batched=True,
+        )
+
+    @property
+    def batch_key(self) -> Tuple[str, Tuple[int, ...], str]:
+        """
+        Model name, shape and dtype of the data, only the inputs of
+        the same batch_key can be stacked into one batch.
+        """
+        return (
+            self.model_config.model_name,
+            self.data.shape,
+            self.data.dtype.str,
+        )
+
+    def unbatch(self) -> List["ModelData"]:
+        """
+        Splits the data along its first (batch) axis into ModelData objects
+        holding one row each, the way TIS returns single results.
+        """
+        return [
+            ModelData(
+                data=self.data[i : i + 1],
+                model_config=self.model_config,
+                batched=False,
+            )
+            for i in range(self.data.shape[0])
+        ]
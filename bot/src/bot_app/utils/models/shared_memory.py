@@ -0,0 +1,138 @@
+import os
+import itertools
+import numpy as np
+
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+
+class SharedMemoryRegion:
+    """
+    POSIX shared memory region registered in TIS.
+
+    Parameters
+    ----------
+    name : name the region is registered in TIS with
+
+    byte_size : size of the region in bytes
+
+    """
+
+    def __init__(self, name: str, byte_size: int):
+        self.name = name
+        self.byte_size = byte_size
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=byte_size
+        )
+
+    @property
+    def key(self) -> str:
+        """
+        Key of the region TIS opens it with by shm_open.
+        """
+        return f"/{self.shm.name}"
+
+    def write(self, data: np.ndarray) -> int:
+        """
+        Copies data to the beginning of the region.
+
+        Returns
+        -------
+        byte_size : amount of bytes written
+        """
+        view = np.ndarray(data.shape, dtype=data.dtype, buffer=self.shm.buf)
+        np.copyto(view, data, casting="no")
+        return data.nbytes
+
+    def read(self, shape: List[int], dtype: np.dtype) -> np.ndarray:
+        """
+        Copies a tensor from the beginning of the region.
+        """
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf).copy()
+
+    def destroy(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedMemoryPool:
+    """
+    Pool of POSIX shared memory regions registered in TIS and reused
+    between inference requests.
+
+    Regions are allocated in power of two sizes, so a released region
+    can serve any later request of a close size. None of the methods
+    are thread safe: the pool is intended to be used from one event loop.
+
+    Parameters
+    ----------
+    client : asyncio TIS client the regions are registered with
+
+    prefix : prefix of the regions names
+
+    """
+
+    MIN_BYTE_SIZE = 4096
+
+    def __init__(self, client, prefix: str = "bot"):
+        self.client = client
+        self.prefix = f"{prefix}_{os.getpid()}"
+        self._counter = itertools.count()
+        self._free: Dict[int, List[SharedMemoryRegion]] = {}
+        self._regions: List[SharedMemoryRegion] = []
+
+    @classmethod
+    def size_class(cls, byte_size: int) -> int:
+        """
+        Size of the region allocated to hold byte_size bytes.
+        """
+        size = cls.MIN_BYTE_SIZE
+        while size < byte_size:
+            size *= 2
+        return size
+
+    async def acquire(self, byte_size: int) -> SharedMemoryRegion:
+        """
+        Gets a free region of at least byte_size bytes, creating
+        and registering a new one if there are none.
+        """
+        size = self.size_class(byte_size)
+        free = self._free.get(size)
+        if free:
+            return free.pop()
+
+        region = SharedMemoryRegion(
+            f"{self.prefix}_{next(self._counter)}", size
+        )
+        try:
+            await self.client.register_system_shared_memory(
+                region.name, region.key, region.byte_size
+            )
+        except Exception:
+            region.destroy()
+            raise
+
+        self._regions.append(region)
+        return region
+
+    def release(self, region: SharedMemoryRegion):
+        """
+        Returns the region to the pool.
+        """
+        self._free.setdefault(region.byte_size, []).append(region)
+
+    @property
+    def regions_num(self) -> int:
+        return len(self._regions)
+
+    async def close(self):
+        """
+        Unregisters all the regions from TIS and frees them.
+        """
+        regions, self._regions, self._free = self._regions, [], {}
+        try:
+            for region in regions:
+                await self.client.unregister_system_shared_memory(region.name)
+        finally:
+            for region in regions:
+                region.destroy()
@@ -0,0 +1,201 @@
+import pytest
+import asyncio
+
+from admission.controller import AdmissionController, AdmissionQueueFull
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"max_concurrency": 0, "max_waiting": 1},
+        {"max_concurrency": 1.5, "max_waiting": 1},
+        {"max_concurrency": 1, "max_waiting": -1},
+        {"max_concurrency": 1, "max_waiting": 1, "max_waiting_per_key": 0},
+        {"max_concurrency": 1, "max_waiting": 1, "max_wait": 0},
+    ],
+)
+def test_incorrect_init_args(kwargs):
+    with pytest.raises(ValueError):
+        AdmissionController(**kwargs)
+
+
+def test_bounded_concurrency():
+    wait_times = []
+    controller = AdmissionController(
+        max_concurrency=3, max_waiting=100, observe_wait=wait_times.append
+    )
+    running, max_running = 0, 0
+
+    async def request(key):
+        nonlocal running, max_running
+        async with controller.admit(key):
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def run():
+        await asyncio.gather(*[request(key) for key in range(20)])
+
+    asyncio.run(run())
+    assert max_running == 3
+    stats = controller.stats()
+    assert stats["admitted"] == 20
+    assert stats["running"] == 0
+    assert stats["waiting"] == 0
+    assert len(wait_times) == 20
+    assert wait_times.count(0.0) == 3
+    assert max(wait_times) > 0
+
+
+def test_queue_full():
+    controller = AdmissionController(max_concurrency=1, max_waiting=2)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def request(key):
+            async with controller.admit(key):
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(request(key)) for key in range(3)]
+        await asyncio.sleep(0)
+        assert controller.stats()["waiting"] == 2
+        with pytest.raises(AdmissionQueueFull):
+            await controller.acquire(3)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert controller.stats()["rejected"] == 1
+    assert controller.stats()["admitted"] == 3
+
+
+def test_keys_take_turns():
+    controller = AdmissionController(max_concurrency=1, max_waiting=100)
+    admitted = []
+
+    async def request(key):
+        async with controller.admit(key):
+            admitted.append(key)
+            await asyncio.sleep(0)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def blocker():
+            async with controller.admit("blocker"):
+                await release.wait()
+
+        task = asyncio.ensure_future(blocker())
+        await asyncio.sleep(0)
+        # a flood of one user followed by two other users
+        tasks = [asyncio.ensure_future(request("flood")) for _ in range(5)]
+        tasks += [asyncio.ensure_future(request(key)) for key in "ab"]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(task, *tasks)
+
+    asyncio.run(run())
+    assert admitted[:3] == ["flood", "a", "b"]
+    assert admitted[3:] == ["flood"] * 4
+
+
+def test_waiting_per_key():
+    controller = AdmissionController(
+        max_concurrency=1, max_waiting=100, max_waiting_per_key=2
+    )
+
+    async def run():
+        release = asyncio.Event()
+
+        async def request(key):
+            async with controller.admit(key):
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(request("a")) for _ in range(3)]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionQueueFull):
+            await controller.acquire("a")
+        # the other keys still wait
+        tasks.append(asyncio.ensure_future(request("b")))
+        await asyncio.sleep(0)
+        assert controller.stats()["waiting"] == 3
+        assert controller.stats()["waiting_keys"] == 2
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert controller.stats()["admitted"] == 4
+
+
+def test_max_wait():
+    controller = AdmissionController(
+        max_concurrency=1, max_waiting=10, max_wait=0.05
+    )
+
+    async def run():
+        release = asyncio.Event()
+
+        async def request(key):
+            async with controller.admit(key):
+                await release.wait()
+
+        task = asyncio.ensure_future(request("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await controller.acquire("b")
+        assert controller.stats()["waiting"] == 0
+        release.set()
+        await task
+        # the slot is free again
+        await asyncio.wait_for(controller.acquire("c"), 0.01)
+        controller.release()
+
+    asyncio.run(run())
+    assert controller.stats()["timed_out"] == 1
+    assert controller.stats()["running"] == 0
+
+
+def test_cancelled_waiter():
+    controller = AdmissionController(max_concurrency=1, max_waiting=10)
+
+    async def run():
+        await controller.acquire("a")
+        waiting = asyncio.ensure_future(controller.acquire("b"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        assert controller.stats()["waiting"] == 0
+        controller.release()
+        assert controller.stats()["running"] == 0
+
+    asyncio.run(run())
+
+
+def test_tail_wait_bounded_under_overload():
+    wait_times = []
+    controller = AdmissionController(
+        max_concurrency=4,
+        max_waiting=8,
+        max_wait=0.1,
+        observe_wait=wait_times.append,
+    )
+    results = {"done": 0, "shed": 0}
+
+    async def request(key):
+        try:
+            async with controller.admit(key):
+                await asyncio.sleep(0.01)
+            results["done"] += 1
+        except (AdmissionQueueFull, asyncio.TimeoutError):
+            results["shed"] += 1
+
+    async def run():
+        await asyncio.gather(*[request(key % 50) for key in range(500)])
+
+    asyncio.run(run())
+    assert results["done"] + results["shed"] == 500
+    assert results["shed"] > 0
+    assert len(wait_times) == results["done"]
+    assert max(wait_times) <= 0.1 + 0.05
@@ -0,0 +1,108 @@
+import pytest
+import asyncio
+
+from batching.micro_batcher import MicroBatcher
+
+
+def make_batcher(max_batch_size, window):
+    calls = []
+
+    async def process_batch(key, items):
+        calls.append((key, list(items)))
+        return [item * 10 for item in items]
+
+    return MicroBatcher(process_batch, max_batch_size, window), calls
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ("not callable", 8, 0.01),
+        (lambda key, items: items, 0, 0.01),
+        (lambda key, items: items, 2.5, 0.01),
+        (lambda key, items: items, 8, -1),
+        (lambda key, items: items, 8, "0.01"),
+    ],
+)
+def test_incorrect_init_args(args):
+    with pytest.raises((TypeError, ValueError)):
+        MicroBatcher(*args)
+
+
+def test_batch_by_window():
+    batcher, calls = make_batcher(max_batch_size=8, window=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(
+            *(batcher.submit("model", i) for i in range(5))
+        )
+
+    assert asyncio.run(submit_all()) == [0, 10, 20, 30, 40]
+    assert calls == [("model", [0, 1, 2, 3, 4])]
+
+
+def test_batch_by_size():
+    batcher, calls = make_batcher(max_batch_size=4, window=10)
+
+    async def submit_all():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit("model", i) for i in range(8))),
+            timeout=1,
+        )
+
+    assert asyncio.run(submit_all()) == [i * 10 for i in range(8)]
+    assert calls == [("model", [0, 1, 2, 3]), ("model", [4, 5, 6, 7])]
+
+
+def test_batch_per_key():
+    batcher, calls = make_batcher(max_batch_size=8, window=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(
+            batcher.submit("first", 1),
+            batcher.submit("second", 2),
+            batcher.submit("first", 3),
+        )
+
+    assert asyncio.run(submit_all()) == [10, 20, 30]
+    assert sorted(calls) == [("first", [1, 3]), ("second", [2])]
+
+
+@pytest.mark.parametrize(
+    "process_batch, exception",
+    [
+        (lambda: None, TypeError),
+        (None, ValueError),
+    ],
+)
+def test_errors_reach_every_caller(process_batch, exception):
+    async def failing(key, items):
+        if process_batch is None:
+            return items[:-1]
+        raise exception
+
+    batcher = MicroBatcher(failing, max_batch_size=8, window=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(
+            *(batcher.submit("model", i) for i in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(submit_all())
+    assert all(isinstance(result, exception) for result in results)
+
+
+def test_close_flushes_pending():
+    batcher, calls = make_batcher(max_batch_size=8, window=10)
+
+    async def submit_and_close():
+        tasks = [
+            asyncio.ensure_future(batcher.submit("model", i)) for i in range(2)
+        ]
+        await asyncio.sleep(0)
+        await batcher.close()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(submit_and_close()) == [0, 10]
+    assert calls == [("model", [0, 1])]
@@ -0,0 +1,168 @@
+import pytest
+import asyncio
+
+from cache.result_cache import ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize(
+    "args", [(0, 10), (2.5, 10), ("10", 10), (10, 0), (10, -1), (10, "1")]
+)
+def test_incorrect_init_args(args):
+    with pytest.raises(ValueError):
+        ResultCache(*args)
+
+
+def test_put_get():
+    cache = ResultCache(max_size=2, ttl=10)
+    cache.put("first", 1)
+    cache.put("second", None)
+
+    assert cache.get("first") == 1
+    assert cache.get("second", "default") is None
+    assert cache.get("third", "default") == "default"
+    assert len(cache) == 2
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_size=2, ttl=10)
+    cache.put("first", 1)
+    cache.put("second", 2)
+    cache.get("first")
+    cache.put("third", 3)
+
+    assert cache.get("second") is None
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+
+
+def test_ttl_expiry():
+    clock = Clock()
+    cache = ResultCache(max_size=2, ttl=10, clock=clock)
+    cache.put("first", 1)
+
+    clock.now = 9.9
+    assert cache.get("first") == 1
+    clock.now = 10.0
+    assert cache.get("first") is None
+    assert len(cache) == 0
+
+
+def test_get_or_compute_counters():
+    cache = ResultCache(max_size=10, ttl=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return "value"
+
+    async def run():
+        for _ in range(3):
+            assert await cache.get_or_compute("key", compute) == "value"
+
+    asyncio.run(run())
+    assert (cache.hits, cache.misses, len(calls)) == (2, 1, 1)
+
+
+def test_concurrent_computations_collapse():
+    cache = ResultCache(max_size=10, ttl=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.get_or_compute("key", compute) for _ in range(5))
+        )
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+    assert (cache.misses, cache.collapsed) == (1, 4)
+
+
+def test_failures_not_cached():
+    cache = ResultCache(max_size=10, ttl=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError
+
+    async def run():
+        results = await asyncio.gather(
+            *(cache.get_or_compute("key", compute) for _ in range(3)),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("key", compute)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert len(cache) == 0
+
+
+def test_cancelled_caller_does_not_cancel_computation():
+    cache = ResultCache(max_size=10, ttl=10)
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        second = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "value"
+        assert first.cancelled()
+
+    asyncio.run(run())
+    assert cache.get("key") == "value"
+
+
+def test_clear():
+    cache = ResultCache(max_size=10, ttl=10)
+    cache.put("first", 1)
+    cache.put("second", 2)
+
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.get("first") is None
+
+
+def test_clear_during_computation():
+    cache = ResultCache(max_size=10, ttl=10)
+
+    async def run():
+        computed = asyncio.Event()
+
+        async def compute_old():
+            await computed.wait()
+            return "old"
+
+        async def compute_new():
+            return "new"
+
+        old = asyncio.ensure_future(cache.get_or_compute("key", compute_old))
+        await asyncio.sleep(0)
+        cache.clear()
+        assert await cache.get_or_compute("key", compute_new) == "new"
+        computed.set()
+        assert await old == "old"
+
+    asyncio.run(run())
+    assert cache.get("key") == "new"
+    assert cache.misses == 2
@@ -0,0 +1,249 @@
+import json
+import pytest
+import asyncio
+
+from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.filters.state import State, StatesGroup
+from fsm.compact_storage import CompactStorage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Form(StatesGroup):
+    first = State()
+    second = State()
+
+
+@pytest.mark.parametrize("ttl", [0, -1, "10", None])
+def test_incorrect_ttl(ttl):
+    with pytest.raises(ValueError):
+        CompactStorage(ttl)
+
+
+def test_state_and_data():
+    storage = CompactStorage(ttl=10)
+
+    async def run():
+        context = FSMContext(storage, chat=1, user=2)
+        assert await context.get_state() is None
+        assert await context.get_data() == {}
+
+        await context.set_state(Form.first)
+        await context.update_data(photo="id", amount=1)
+        assert await context.get_state() == Form.first.state
+        assert await context.get_data() == {"photo": "id", "amount": 1}
+
+        async with context.proxy() as data:
+            data["amount"] += 1
+        assert await context.get_data() == {"photo": "id", "amount": 2}
+
+        # other users have their own records
+        assert await storage.get_state(chat=1, user=3) is None
+        assert await storage.get_state(chat=1, user=3, default="x") == "x"
+
+    asyncio.run(run())
+    assert len(storage) == 1
+
+
+def test_data_is_copied():
+    storage = CompactStorage(ttl=10)
+
+    async def run():
+        data = {"items": [1]}
+        await storage.set_data(chat=1, user=1, data=data)
+        data["items"].append(2)
+        stored = await storage.get_data(chat=1, user=1)
+        stored["items"].append(3)
+        return await storage.get_data(chat=1, user=1)
+
+    assert asyncio.run(run()) == {"items": [1]}
+
+
+def test_empty_records_deleted():
+    storage = CompactStorage(ttl=10)
+
+    async def run():
+        await storage.set_state(chat=1, user=1, state=Form.first)
+        await storage.set_bucket(chat=1, user=1, bucket={"calls": 1})
+        await storage.set_state(chat=2, user=2, state=Form.second)
+        assert len(storage) == 2
+
+        await storage.finish(chat=2, user=2)
+        assert len(storage) == 1
+        await storage.reset_state(chat=1, user=1)
+        # the bucket is kept
+        assert len(storage) == 1
+        await storage.reset_bucket(chat=1, user=1)
+        assert len(storage) == 0
+
+        # reading does not create records
+        await storage.get_state(chat=3, user=3)
+        await storage.get_data(chat=3, user=3)
+        assert len(storage) == 0
+
+    asyncio.run(run())
+
+
+def test_idle_records_expire():
+    clock = Clock()
+    storage = CompactStorage(ttl=10, clock=clock)
+
+    async def run():
+        await storage.set_state(chat=1, user=1, state=Form.first)
+        await storage.set_state(chat=2, user=2, state=Form.first)
+        clock.now += 6
+        # access extends the ttl of the record
+        assert await storage.get_state(chat=1, user=1) == Form.first.state
+        clock.now += 6
+        assert await storage.get_state(chat=1, user=1) == Form.first.state
+        assert await storage.get_state(chat=2, user=2) is None
+        assert storage.expired == 1
+
+        await storage.update_data(chat=3, user=3, data={"a": 1})
+        clock.now += 10
+        # expired records are evicted on writes of new records
+        await storage.set_state(chat=4, user=4, state=Form.second)
+        assert len(storage) == 1
+        assert storage.expired == 3
+
+    asyncio.run(run())
+
+
+def test_evict_expired():
+    clock = Clock()
+    storage = CompactStorage(ttl=10, clock=clock)
+
+    async def run():
+        for user in range(10):
+            await storage.set_state(chat=user, user=user, state=Form.first)
+            clock.now += 1
+        clock.now += 4
+        return storage.evict_expired()
+
+    assert asyncio.run(run()) == 5
+    assert len(storage) == 5
+
+
+def test_snapshot_and_load(tmp_path):
+    path = str(tmp_path / "states.json")
+    clock = Clock()
+    storage = CompactStorage(ttl=10, path=path, clock=clock)
+
+    async def fill():
+        await storage.set_state(chat=1, user=1, state=Form.first)
+        await storage.update_data(chat=1, user=1, photo="id")
+        clock.now += 5
+        await storage.set_state(chat=2, user=2, state=Form.second)
+        await storage.update_bucket(chat=3, user=3, calls=2)
+        storage.snapshot()
+
+    asyncio.run(fill())
+    with open(path) as file:
+        assert len(json.load(file)) == 3
+    assert not (tmp_path / "states.json.tmp").exists()
+
+    # the first record expires before the restart
+    clock.now += 6
+    restored = CompactStorage(ttl=10, path=path, clock=clock)
+
+    async def read():
+        return (
+            await restored.get_state(chat=1, user=1),
+            await restored.get_state(chat=2, user=2),
+            await restored.get_bucket(chat=3, user=3),
+        )
+
+    assert asyncio.run(read()) == (None, Form.second.state, {"calls": 2})
+    assert len(restored) == 2
+    assert restored.stats()["states"] == {Form.second.state: 1, None: 1}
+
+
+def test_close_saves_snapshot(tmp_path):
+    path = str(tmp_path / "states.json")
+    storage = CompactStorage(ttl=10, path=path)
+
+    async def run():
+        await storage.set_state(chat=1, user=1, state=Form.first)
+        await storage.close()
+        await storage.wait_closed()
+
+    asyncio.run(run())
+    assert len(storage) == 0
+
+    restored = CompactStorage(ttl=10, path=path)
+    assert asyncio.run(restored.get_state(chat=1, user=1)) == Form.first.state
+
+
+def test_snapshot_without_path():
+    with pytest.raises(ValueError):
+        CompactStorage(ttl=10).snapshot()
+
+
+def test_stats():
+    clock = Clock()
+    storage = CompactStorage(ttl=10, clock=clock)
+
+    async def run():
+        for user in range(100):
+            state = Form.first if user % 4 else Form.second
+            await storage.set_state(chat=user, user=user, state=state)
+        await storage.update_data(chat=0, user=0, photo="id")
+        clock.now += 11
+        await storage.get_state(chat=1, user=1)
+
+    asyncio.run(run())
+    stats = storage.stats()
+
+    assert stats["entries"] == 99
+    assert stats["states"] == {Form.first.state: 74, Form.second.state: 25}
+    assert stats["expired"] == 1
+
+
+def test_stats_follow_changes():
+    clock = Clock()
+    storage = CompactStorage(ttl=10, clock=clock)
+
+    async def run():
+        await storage.set_state(chat=1, user=1, state=Form.first)
+        await storage.set_state(chat=2, user=2, state=Form.first)
+        await storage.update_data(chat=3, user=3, photo="id")
+        states = [storage.stats()["states"]]
+
+        await storage.set_state(chat=1, user=1, state=Form.second)
+        await storage.set_state(chat=2, user=2, state=None)
+        await storage.set_state(chat=3, user=3, state=Form.second)
+        states.append(storage.stats()["states"])
+
+        clock.now += 11
+        storage.evict_expired()
+        states.append(storage.stats()["states"])
+        return states
+
+    assert asyncio.run(run()) == [
+        {Form.first.state: 2, None: 1},
+        {Form.second.state: 2},
+        {},
+    ]
+
+
+def test_estimate_memory():
+    storage = CompactStorage(ttl=10)
+    empty = storage.estimate_memory()
+
+    async def run():
+        for user in range(100):
+            await storage.set_state(chat=user, user=user, state=Form.first)
+            await storage.update_data(chat=user, user=user, photo="id")
+
+    asyncio.run(run())
+    exact = storage.estimate_memory(samples=100)
+
+    assert exact > empty
+    # the records are alike, so a few of them are enough to estimate all
+    assert storage.estimate_memory(samples=10) == pytest.approx(exact)
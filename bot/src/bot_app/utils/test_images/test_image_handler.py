@@ -10,6 +10,7 @@ from images.image_preprocessors import (
     ResNetPreprocessor,
 )
 from images.image_handler import ImageHandler
+from images.tensor_arena import TensorArenaPool
 
 FIXTURES_PATH = "test_images/fixtures/"
 IMAGE_PATH = f"{FIXTURES_PATH}normal_image.png"
@@ -84,3 +85,121 @@ def test_incorrect_preprocess_input(value):
     image_handler = ImageHandler([DefaultPreprocessor()])
     with pytest.raises(ValueError):
         image_handler.preprocess_image(value)
+
+
+class ResizePreprocessor(ImagePreprocessor):
+    input_size = (100, 100)
+
+    @staticmethod
+    def crop(image: Image.Image) -> Image.Image:
+        return image.resize(ResizePreprocessor.input_size)
+
+    @staticmethod
+    def to_numpy(image: Image.Image) -> np.ndarray:
+        return np.array(image, dtype=np.float32)
+
+
+def make_jpeg(size) -> io.BytesIO:
+    rng = np.random.default_rng(0)
+    data = (rng.random((size[1], size[0], 3)) * 255).astype(np.uint8)
+    image_data = io.BytesIO()
+    Image.fromarray(data).save(image_data, "JPEG")
+    image_data.seek(0)
+    return image_data
+
+
+@pytest.mark.parametrize("size", ["small", "normal", "big"])
+@pytest.mark.parametrize(
+    "preprocessors",
+    [
+        [DefaultPreprocessor()],
+        [DefaultPreprocessor(), ResNetPreprocessor()],
+        [ResNetPreprocessor(), DefaultPreprocessor()],
+    ],
+)
+def test_decoded_once_equals_full_decode(size, preprocessors):
+    image_path = f"{FIXTURES_PATH}{size}_image.png"
+    with open(image_path, "rb") as image_file:
+        image_data = io.BytesIO(image_file.read())
+
+    result = ImageHandler(preprocessors).preprocess_image(image_data)
+
+    for preprocessor, result_element in zip(preprocessors, result):
+        expected = preprocessor.preprocess(Image.open(image_path))
+        assert result_element.shape == expected.shape
+        assert (result_element == expected).all()
+
+
+@pytest.mark.parametrize("size", ["small", "normal", "big"])
+def test_decode_keeps_full_image(size):
+    image_path = f"{FIXTURES_PATH}{size}_image.png"
+    with open(image_path, "rb") as image_file:
+        image_data = io.BytesIO(image_file.read())
+
+    image = ImageHandler([DefaultPreprocessor()]).decode_image(image_data)
+    assert image.size == Image.open(image_path).size
+
+
+def test_decode_reduced_scale():
+    image = ImageHandler([ResizePreprocessor()]).decode_image(
+        make_jpeg((1600, 1200))
+    )
+    assert 100 <= image.width < 1600
+    assert 100 <= image.height < 1200
+
+
+@pytest.mark.parametrize(
+    "preprocessors",
+    [
+        [ResizePreprocessor(), DefaultPreprocessor()],
+        [ResizePreprocessor(), ImagePreprocessor()],
+    ],
+)
+def test_decode_full_scale(preprocessors):
+    image = ImageHandler(preprocessors).decode_image(make_jpeg((1600, 1200)))
+    assert image.size == (1600, 1200)
+
+
+class NoShapePreprocessor(DefaultPreprocessor):
+    def output_shape(self, image):
+        return None
+
+
+@pytest.mark.parametrize(
+    "preprocessors",
+    [
+        [DefaultPreprocessor()],
+        [DefaultPreprocessor(), ResNetPreprocessor()],
+        [NoShapePreprocessor(), DefaultPreprocessor()],
+    ],
+)
+def test_preprocess_batch(preprocessors):
+    sizes = ["small", "normal", "big"]
+    images_data = []
+    for size in sizes:
+        with open(f"{FIXTURES_PATH}{size}_image.png", "rb") as image_file:
+            images_data.append(io.BytesIO(image_file.read()))
+
+    image_handler = ImageHandler(preprocessors)
+    arena_pool = TensorArenaPool()
+    arenas = image_handler.preprocess_batch(images_data, arena_pool)
+
+    assert len(arenas) == len(preprocessors)
+    for i, image_data in enumerate(images_data):
+        image_data.seek(0)
+        expected = image_handler.preprocess_image(image_data)
+        for arena, expected_element in zip(arenas, expected):
+            assert arena.view().shape[0] == len(sizes)
+            assert (arena.view()[i] == expected_element).all()
+
+    for arena in arenas:
+        arena.release()
+    image_handler.preprocess_batch(images_data[:1] * 3, arena_pool)
+    assert arena_pool.allocated == len(preprocessors)
+
+
+@pytest.mark.parametrize("images_data", [[], ["315a"], [5]])
+def test_incorrect_preprocess_batch_input(images_data):
+    image_handler = ImageHandler([DefaultPreprocessor()])
+    with pytest.raises(ValueError):
+        image_handler.preprocess_batch(images_data, TensorArenaPool())
@@ -60,3 +60,35 @@ def test_wrong_input(preprocessor_name, value):
     preprocessor = preprocessors[preprocessor_name]
     with pytest.raises(ValueError):
         preprocessor.preprocess(value)
+
+
+@pytest.mark.parametrize(
+    "preprocessor_name, image_path",
+    [
+        (name, f"test_images/fixtures/{size}_image.png")
+        for name in names
+        for size in ["small", "normal", "big"]
+    ],
+)
+def test_preprocess_into(preprocessor_name, image_path):
+    preprocessor = preprocessors[preprocessor_name]
+    image = Image.open(image_path)
+    expected = preprocessor.preprocess(image)
+
+    assert preprocessor.output_shape(image) == expected.shape
+    out = np.empty(expected.shape, dtype=np.float32)
+    preprocessor.preprocess_into(image, out)
+    assert (out == expected).all()
+
+
+@pytest.mark.parametrize(
+    "preprocessor_name, mode", [(name, "L") for name in names]
+)
+def test_output_shape_single_band(preprocessor_name, mode):
+    preprocessor = preprocessors[preprocessor_name]
+    image = Image.open(small_image_path).convert(mode)
+
+    assert (
+        preprocessor.output_shape(image)
+        == preprocessor.preprocess(image).shape
+    )
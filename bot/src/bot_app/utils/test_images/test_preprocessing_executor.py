@@ -0,0 +1,151 @@
+import io
+import time
+import pytest
+import asyncio
+import numpy as np
+
+from images.image_preprocessors import DefaultPreprocessor
+from images.image_handler import ImageHandler
+from images.tensor_arena import TensorArenaPool
+from images.preprocessing_executor import (
+    PreprocessingExecutor,
+    PreprocessingQueueFull,
+)
+
+IMAGE_PATH = "test_images/fixtures/normal_image.png"
+
+
+class SlowPreprocessor(DefaultPreprocessor):
+    def preprocess(self, image):
+        time.sleep(0.5)
+        return super().preprocess(image)
+
+
+def read_image() -> io.BytesIO:
+    with open(IMAGE_PATH, "rb") as image_file:
+        return io.BytesIO(image_file.read())
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ([DefaultPreprocessor()],),
+        (ImageHandler([DefaultPreprocessor()]), "fiber"),
+        (ImageHandler([DefaultPreprocessor()]), "thread", 2, 0),
+    ],
+)
+def test_incorrect_init_args(args):
+    with pytest.raises(ValueError):
+        PreprocessingExecutor(*args)
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_preprocess(kind):
+    image_handler = ImageHandler(
+        [DefaultPreprocessor(), DefaultPreprocessor()]
+    )
+    executor = PreprocessingExecutor(image_handler, kind, max_workers=2)
+    expected = image_handler.preprocess_image(read_image())
+
+    async def preprocess():
+        return await asyncio.gather(
+            *(executor.preprocess(read_image()) for _ in range(4))
+        )
+
+    try:
+        results = asyncio.run(preprocess())
+    finally:
+        executor.shutdown()
+
+    for result in results:
+        assert len(result) == len(expected)
+        for result_element, expected_element in zip(result, expected):
+            assert result_element.dtype == expected_element.dtype
+            assert (result_element == expected_element).all()
+    assert executor.queue_size == 0
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_incorrect_preprocess_input(kind):
+    executor = PreprocessingExecutor(
+        ImageHandler([DefaultPreprocessor()]), kind
+    )
+
+    with pytest.raises(ValueError):
+        asyncio.run(executor.preprocess(b"image"))
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_preprocess_batch(kind):
+    image_handler = ImageHandler(
+        [DefaultPreprocessor(), DefaultPreprocessor()]
+    )
+    executor = PreprocessingExecutor(image_handler, kind, max_workers=2)
+    arena_pool = TensorArenaPool()
+    expected = image_handler.preprocess_image(read_image())
+
+    async def preprocess():
+        for _ in range(3):
+            arenas = await executor.preprocess_batch(
+                [read_image(), read_image()], arena_pool
+            )
+            for arena, expected_element in zip(arenas, expected):
+                assert arena.view().shape[0] == 2
+                assert (arena.view() == expected_element).all()
+            for arena in arenas:
+                arena.release()
+
+    try:
+        asyncio.run(preprocess())
+    finally:
+        executor.shutdown()
+
+    assert arena_pool.allocated == 2
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_incorrect_preprocess_batch_input(kind):
+    executor = PreprocessingExecutor(
+        ImageHandler([DefaultPreprocessor()]), kind
+    )
+
+    for images_data in ([], [b"image"]):
+        with pytest.raises(ValueError):
+            asyncio.run(
+                executor.preprocess_batch(images_data, TensorArenaPool())
+            )
+    executor.shutdown()
+
+
+def test_queue_full():
+    image_handler = ImageHandler([SlowPreprocessor()])
+    executor = PreprocessingExecutor(image_handler, max_queue_size=2)
+
+    async def preprocess():
+        return await asyncio.gather(
+            *(executor.preprocess(read_image()) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(preprocess())
+    executor.shutdown()
+
+    assert isinstance(results[2], PreprocessingQueueFull)
+    assert all(isinstance(result, list) for result in results[:2])
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_timeout(kind):
+    image_handler = ImageHandler([SlowPreprocessor()])
+    executor = PreprocessingExecutor(image_handler, kind, timeout=0.1)
+
+    async def preprocess():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.preprocess(read_image())
+        assert executor.queue_size == 1
+        await asyncio.sleep(1)
+        assert executor.queue_size == 0
+
+    asyncio.run(preprocess())
+    executor.shutdown()
@@ -0,0 +1,65 @@
+import pytest
+import threading
+import numpy as np
+
+from images.tensor_arena import TensorArenaPool
+
+
+def test_acquire_allocates_buffer():
+    pool = TensorArenaPool()
+    arena = pool.acquire((20, 20, 3), 8)
+
+    assert arena.buffer.shape == (8, 20, 20, 3)
+    assert arena.buffer.dtype == np.float32
+    assert arena.view().shape == (0, 20, 20, 3)
+
+    arena.size = 2
+    arena.view()[:] = 1
+    assert np.shares_memory(arena.view(), arena.buffer)
+    assert (arena.buffer[:2] == 1).all()
+
+
+@pytest.mark.parametrize(
+    "first, second, reused",
+    [
+        (((20, 20, 3), 8), ((20, 20, 3), 8), True),
+        (((20, 20, 3), 8), ((20, 20, 4), 8), False),
+        (((20, 20, 3), 8), ((20, 20, 3), 1), False),
+        (((20, 20, 3), 8, np.float32), ((20, 20, 3), 8, np.uint8), False),
+    ],
+)
+def test_release_and_reuse(first, second, reused):
+    pool = TensorArenaPool()
+    arena = pool.acquire(*first)
+    arena.size = 3
+    arena.release()
+
+    assert (pool.acquire(*second) is arena) == reused
+    assert pool.allocated == (1 if reused else 2)
+    assert arena.size == 0
+
+
+def test_max_free():
+    pool = TensorArenaPool(max_free=1)
+    arenas = [pool.acquire((5,), 2) for _ in range(3)]
+    for arena in arenas:
+        arena.release()
+
+    assert pool.acquire((5,), 2) is arenas[0]
+    assert pool.acquire((5,), 2) not in arenas
+
+
+def test_steady_state_allocations():
+    pool = TensorArenaPool()
+
+    def use_pool():
+        for _ in range(1000):
+            pool.acquire((20, 20, 3), 8).release()
+
+    threads = [threading.Thread(target=use_pool) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pool.allocated <= 4
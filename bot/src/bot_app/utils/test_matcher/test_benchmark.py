@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+
+from matcher.benchmark import (
+    BenchmarkResult,
+    brute_force_knn,
+    main,
+    recall_at_k,
+    pareto_front,
+    run_benchmark,
+    synthetic_vectors,
+)
+
+
+def test_brute_force_knn():
+    data = synthetic_vectors(500, 8)
+    queries = data[:20] + 1e-3
+
+    labels = brute_force_knn(data, queries, 3, chunk_size=7)
+
+    distances = ((queries[:, None, :] - data[None, :, :]) ** 2).sum(axis=2)
+    assert np.array_equal(labels, np.argsort(distances, axis=1)[:, :3])
+
+
+@pytest.mark.parametrize(
+    "labels, truth, recall",
+    [
+        ([[1, 2], [3, 4]], [[1, 2], [3, 4]], 1.0),
+        ([[2, 1], [4, 5]], [[1, 2], [3, 4]], 0.75),
+        ([[5, 6], [7, 8]], [[1, 2], [3, 4]], 0.0),
+    ],
+)
+def test_recall_at_k(labels, truth, recall):
+    assert recall_at_k(np.array(labels), np.array(truth)) == recall
+
+
+def test_pareto_front():
+    results = [
+        BenchmarkResult(16, 100, 10, 1, 0.9, 0.1, 0.2, 1.0, 1.0),
+        BenchmarkResult(16, 100, 20, 1, 0.95, 0.1, 0.3, 1.0, 1.0),
+        BenchmarkResult(8, 100, 20, 1, 0.85, 0.1, 0.3, 1.0, 1.0),
+        BenchmarkResult(8, 100, 20, 5, 0.85, 0.1, 0.3, 1.0, 1.0),
+    ]
+
+    assert pareto_front(results) == [results[0], results[1], results[3]]
+
+
+def test_run_benchmark():
+    data = synthetic_vectors(300, 8)
+    queries = synthetic_vectors(20, 8, seed=1)
+
+    results = run_benchmark(data, queries, [8], [50], [5, 50], ks=[1, 5])
+
+    assert [(r.ef, r.k) for r in results] == [(5, 1), (5, 5), (50, 1), (50, 5)]
+    assert all(0 <= r.recall <= 1 and r.index_mb > 0 for r in results)
+    assert results[-1].recall >= 0.9
+
+
+def test_too_few_vectors(tmp_path):
+    path = str(tmp_path / "vectors.npy")
+    np.save(path, synthetic_vectors(10, 4))
+    with pytest.raises(SystemExit):
+        main(["--vectors", path, "--queries", "10"])
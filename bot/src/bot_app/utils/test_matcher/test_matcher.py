@@ -1,7 +1,8 @@
 import pytest
+import threading
 import numpy as np
 
-from matcher.matcher import Matcher
+from matcher.matcher import Matcher, REJECTED
 
 FIXTURES_PATH = "test_matcher/fixtures"
 TEST_PATH = "test_matcher/test_files"
@@ -90,3 +91,121 @@ def test_nn_search(dim: int, max_elements: int):
 
     matcher = Matcher(dim, max_elements, path_to_index=path)
     matcher.get_nearest_neighbour(np.expand_dims(to_save[5], axis=0))
+
+
+@pytest.mark.parametrize("num_threads", [-1, 1, 4])
+def test_batched_nn_search(num_threads: int):
+    data = np.arange(100 * 10).reshape((100, 10))
+    matcher = Matcher(10, 100, M=16, ef_construction=100)
+    matcher.add_items(data)
+
+    batch = data[::7]
+    labels = matcher.get_nearest_neighbour(batch, num_threads=num_threads)
+
+    assert labels.shape == (len(batch), 1)
+    assert np.array_equal(labels[:, 0], np.arange(0, 100, 7))
+
+
+def test_ef():
+    matcher = Matcher(2, 5, ef=42)
+    assert matcher.ef == 42
+
+    matcher.set_ef(7)
+    assert matcher.ef == 7
+
+    with pytest.raises(TypeError):
+        matcher.set_ef(1.5)
+    with pytest.raises(ValueError):
+        matcher.set_ef(0)
+
+
+def test_add_items_growth():
+    matcher = Matcher(2, 5)
+    matcher.add_items(np.arange(2 * 4).reshape((4, 2)))
+    assert matcher.max_elements == 5
+
+    matcher.add_items(np.arange(8, 8 + 2 * 4).reshape((4, 2)))
+    assert matcher.max_elements == 10
+    assert matcher.index.get_max_elements() == 10
+
+    matcher.add_items(np.arange(100, 100 + 2 * 30).reshape((30, 2)))
+    assert matcher.max_elements == 38
+    assert matcher.index.get_current_count() == 38
+    assert matcher.get_nearest_neighbour(np.array([[8, 9]]))[0][0] == 4
+
+
+def test_add_items_ids():
+    matcher = Matcher(2, 5)
+    matcher.add_items(np.array([[1, 1], [5, 5]]), ids=np.array([10, 20]))
+
+    labels = matcher.get_nearest_neighbour(np.array([[4, 4], [0, 0]]))
+    assert labels[:, 0].tolist() == [20, 10]
+
+
+def test_snapshot(tmp_path):
+    path = str(tmp_path / "index.bin")
+    matcher = Matcher(2, 5)
+    matcher.add_items(np.array([[1, 1], [5, 5]]))
+    assert matcher.modified
+
+    matcher.snapshot(path)
+    assert not matcher.modified
+    assert matcher.path_to_index == path
+    assert [file.name for file in tmp_path.iterdir()] == ["index.bin"]
+
+    matcher.add_items(np.array([[9, 9]]))
+    matcher.snapshot(path)
+
+    loaded = Matcher(2, 5, path_to_index=path)
+    assert loaded.get_nearest_neighbour(np.array([[8, 8]]))[0][0] == 2
+
+
+def test_add_items_while_searching():
+    data = np.random.default_rng(0).random((2000, 8), dtype=np.float32)
+    matcher = Matcher(8, 10)
+    matcher.add_items(data[:10])
+
+    errors = []
+    stop = threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                matcher.get_nearest_neighbour(data[:50], num_threads=1)
+            except Exception as error:
+                errors.append(error)
+
+    searchers = [threading.Thread(target=search) for _ in range(4)]
+    for searcher in searchers:
+        searcher.start()
+    for start in range(10, len(data), 10):
+        matcher.add_items(data[start : start + 10])
+    stop.set()
+    for searcher in searchers:
+        searcher.join()
+
+    assert not errors
+    assert matcher.index.get_current_count() == len(data)
+    labels = matcher.get_nearest_neighbour(data[-5:])
+    assert labels[:, 0].tolist() == list(range(len(data) - 5, len(data)))
+
+
+@pytest.mark.parametrize(
+    "max_distance, labels",
+    [
+        (None, [[1, 0], [2, 1]]),
+        (10.0, [[1, 0], [REJECTED, REJECTED]]),
+        (1.0, [[1, REJECTED], [REJECTED, REJECTED]]),
+    ],
+)
+def test_get_top_k(max_distance, labels):
+    matcher = Matcher(2, 5)
+    matcher.add_items(np.array([[0, 0], [1, 1], [10, 10]]))
+
+    top_labels, distances = matcher.get_top_k(
+        np.array([[1, 1], [7, 7]]), k=2, max_distance=max_distance
+    )
+
+    assert top_labels.dtype == np.int64
+    assert top_labels.tolist() == labels
+    assert distances.tolist() == [[0, 2], [18, 72]]
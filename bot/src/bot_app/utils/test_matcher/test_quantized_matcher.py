@@ -0,0 +1,141 @@
+import pytest
+import numpy as np
+
+from matcher.matcher import Matcher, REJECTED
+from matcher.benchmark import synthetic_vectors, brute_force_knn, recall_at_k
+from matcher.convert import convert
+from matcher.quantized_matcher import QuantizedMatcher
+
+
+@pytest.mark.parametrize(
+    "args, exception",
+    [
+        ((0,), TypeError),
+        (("2",), TypeError),
+        ((2, None, None, -1), TypeError),
+        ((2, None, None, 4), ValueError),
+    ],
+)
+def test_incorrect_input(args, exception):
+    with pytest.raises(exception):
+        _ = QuantizedMatcher(*args)
+
+
+@pytest.mark.parametrize(
+    "data, exception",
+    [
+        ([[1, 2]], TypeError),
+        (np.zeros((2, 3)), ValueError),
+        (np.zeros(2), ValueError),
+    ],
+)
+def test_nn_search_incorrect_input(data, exception):
+    matcher = QuantizedMatcher(2)
+    matcher.quantize(np.arange(10).reshape((5, 2)))
+
+    with pytest.raises(exception):
+        matcher.get_nearest_neighbour(data)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 65536])
+def test_nn_search(chunk_size: int):
+    data = synthetic_vectors(2000, 32)
+    queries = synthetic_vectors(100, 32, seed=1)
+    matcher = QuantizedMatcher(32, chunk_size=chunk_size)
+    matcher.quantize(data, ids=np.arange(2000) + 100)
+
+    labels = matcher.get_nearest_neighbour(queries)
+
+    assert labels.shape == (100, 1)
+    truth = brute_force_knn(data, queries, 1) + 100
+    assert recall_at_k(labels.astype(np.int64), truth) >= 0.9
+    # float32 vectors with uint64 labels against codes, norms and labels
+    assert (data.nbytes + 8 * len(data)) / matcher.nbytes > 2.5
+
+
+def test_rerank(tmp_path):
+    data = synthetic_vectors(2000, 32)
+    queries = synthetic_vectors(100, 32, seed=1)
+    np.save(tmp_path / "vectors.npy", data)
+    matcher = QuantizedMatcher(32)
+    matcher.quantize(data)
+    matcher.save_index(str(tmp_path / "index.npz"))
+
+    reranking = QuantizedMatcher(
+        32,
+        path_to_index=str(tmp_path / "index.npz"),
+        vectors_path=str(tmp_path / "vectors.npy"),
+        rerank=32,
+    )
+    labels = reranking.get_nearest_neighbour(queries)
+
+    assert np.array_equal(labels, brute_force_knn(data, queries, 1))
+
+
+def test_add_items_and_snapshot(tmp_path):
+    path = str(tmp_path / "index.npz")
+    matcher = QuantizedMatcher(2)
+    matcher.quantize(np.array([[0, 0], [10, 10]]))
+    matcher.add_items(np.array([[5, 5]]))
+    matcher.add_items(np.array([[10, 0]]), ids=np.array([42]))
+    assert matcher.modified
+
+    matcher.snapshot(path)
+    assert not matcher.modified
+    assert [file.name for file in tmp_path.iterdir()] == ["index.npz"]
+
+    loaded = QuantizedMatcher(2, path_to_index=path)
+    labels = loaded.get_nearest_neighbour(np.array([[4, 6], [9, 1]]))
+    assert labels[:, 0].tolist() == [2, 42]
+
+
+def test_convert(tmp_path):
+    data = synthetic_vectors(500, 8)
+    hnsw_matcher = Matcher(8, 500)
+    hnsw_matcher.add_items(data, ids=np.arange(500) * 2)
+    hnsw_matcher.save_index(str(tmp_path / "index.bin"))
+
+    convert(
+        str(tmp_path / "index.bin"),
+        str(tmp_path / "index.npz"),
+        8,
+        str(tmp_path / "vectors.npy"),
+    )
+    matcher = QuantizedMatcher(
+        8,
+        path_to_index=str(tmp_path / "index.npz"),
+        vectors_path=str(tmp_path / "vectors.npy"),
+        rerank=8,
+    )
+
+    assert len(matcher) == 500
+    labels = matcher.get_nearest_neighbour(data[[3, 300]])
+    assert labels[:, 0].tolist() == [6, 600]
+
+
+def test_get_top_k(tmp_path):
+    data = synthetic_vectors(500, 16)
+    queries = synthetic_vectors(20, 16, seed=1)
+    np.save(tmp_path / "vectors.npy", data)
+    matcher = QuantizedMatcher(16)
+    matcher.quantize(data)
+    matcher.save_index(str(tmp_path / "index.npz"))
+    reranking = QuantizedMatcher(
+        16,
+        path_to_index=str(tmp_path / "index.npz"),
+        vectors_path=str(tmp_path / "vectors.npy"),
+        rerank=20,
+    )
+
+    labels, distances = reranking.get_top_k(queries, k=3)
+
+    truth = brute_force_knn(data, queries, 3)
+    assert np.array_equal(labels, truth)
+    exact = ((data[truth] - queries[:, None, :]) ** 2).sum(axis=2)
+    assert np.allclose(distances, exact, atol=1e-5)
+
+    max_distance = float(np.median(distances[:, 0]))
+    labels, _ = reranking.get_top_k(queries, k=3, max_distance=max_distance)
+    assert np.array_equal(labels == REJECTED, distances > max_distance)
+    with pytest.raises(RuntimeError):
+        matcher.get_top_k(queries, k=501)
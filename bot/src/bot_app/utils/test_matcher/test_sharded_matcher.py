@@ -0,0 +1,91 @@
+import os
+import pytest
+import numpy as np
+
+from matcher.benchmark import synthetic_vectors, brute_force_knn
+from matcher.matcher import REJECTED
+from matcher.sharded_matcher import ShardedMatcher, SHARD_SEPARATOR
+
+
+@pytest.mark.parametrize("shards_num", [1, 3, 8])
+def test_knn_query(shards_num: int):
+    data = synthetic_vectors(600, 8)
+    queries = synthetic_vectors(20, 8, seed=1)
+    matcher = ShardedMatcher.build(
+        data, shards_num, ids=np.arange(600) * 10, ef=100
+    )
+
+    labels, distances = matcher.knn_query(queries, k=5)
+
+    assert len(matcher) == 600
+    assert labels.shape == distances.shape == (20, 5)
+    assert np.all(np.diff(distances, axis=1) >= 0)
+    assert np.array_equal(labels, brute_force_knn(data, queries, 5) * 10)
+    matcher.close()
+
+
+def test_knn_query_too_many_neighbours():
+    matcher = ShardedMatcher.build(np.arange(8).reshape((4, 2)), 2)
+
+    with pytest.raises(RuntimeError):
+        matcher.knn_query(np.zeros((1, 2)), k=5)
+
+
+@pytest.mark.parametrize("shards_num", [0, "2"])
+def test_incorrect_shards_num(shards_num):
+    with pytest.raises(ValueError):
+        _ = ShardedMatcher(2, 5, shards_num=shards_num)
+
+
+def test_add_items():
+    matcher = ShardedMatcher.build(np.array([[0, 0], [1, 1], [2, 2]]), 2)
+    matcher.add_items(np.array([[9, 9]]))
+    matcher.add_items(np.array([[5, 5]]), ids=np.array([42]))
+
+    assert [len(shard) for shard in matcher.shards] == [3, 2]
+    labels = matcher.get_nearest_neighbour(np.array([[8, 8], [5, 4]]))
+    assert labels[:, 0].tolist() == [3, 42]
+
+
+def test_save_and_load(tmp_path):
+    paths = [str(tmp_path / f"shard_{i}.bin") for i in range(3)]
+    data = synthetic_vectors(90, 4)
+    matcher = ShardedMatcher.build(data, 3)
+    matcher.snapshot(SHARD_SEPARATOR.join(paths))
+
+    with pytest.raises(ValueError):
+        matcher.save_index(paths[0])
+
+    loaded = ShardedMatcher(
+        4, 30, path_to_index=SHARD_SEPARATOR.join(paths), ef=50
+    )
+    assert [len(shard) for shard in loaded.shards] == [30, 30, 30]
+    assert not loaded.modified
+    assert np.array_equal(
+        loaded.get_nearest_neighbour(data[[0, 45, 89]])[:, 0], [0, 45, 89]
+    )
+    loaded.add_items(data[:1])
+    assert loaded.modified
+
+
+def test_search_after_fork():
+    matcher = ShardedMatcher.build(np.arange(20).reshape((10, 2)), 2)
+    matcher.get_nearest_neighbour(np.zeros((1, 2)))
+
+    pid = os.fork()
+    if pid == 0:
+        labels = matcher.get_nearest_neighbour(np.array([[4, 5]]))
+        os._exit(0 if labels[0][0] == 2 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0
+
+
+def test_get_top_k():
+    matcher = ShardedMatcher.build(np.array([[0, 0], [1, 1], [10, 10]]), 2)
+
+    labels, distances = matcher.get_top_k(
+        np.array([[1, 1], [7, 7]]), k=2, max_distance=10.0
+    )
+
+    assert labels.tolist() == [[1, 0], [REJECTED, REJECTED]]
+    assert distances.tolist() == [[0, 2], [18, 72]]
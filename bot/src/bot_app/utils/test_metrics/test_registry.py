@@ -0,0 +1,105 @@
+import pytest
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+from metrics.registry import CONTENT_TYPE, Registry
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    photos = registry.counter(
+        "photos_total", "Processed photos", labels=["outcome"]
+    )
+    in_progress = registry.gauge("photos_in_progress", "Photos in progress")
+
+    photos.labels("matched").inc()
+    photos.labels("matched").inc(2)
+    photos.labels("busy").inc()
+    with in_progress.track_in_progress():
+        assert in_progress.value == 1
+    in_progress.inc(0.5)
+
+    assert registry.render() == (
+        "# HELP photos_total Processed photos\n"
+        "# TYPE photos_total counter\n"
+        'photos_total{outcome="busy"} 1\n'
+        'photos_total{outcome="matched"} 3\n'
+        "# HELP photos_in_progress Photos in progress\n"
+        "# TYPE photos_in_progress gauge\n"
+        "photos_in_progress 0.5\n"
+    )
+
+
+def test_histogram():
+    registry = Registry()
+    latency = registry.histogram(
+        "stage_seconds", "Stage latency", ["stage"], buckets=[0.1, 1]
+    )
+    download = latency.labels("download")
+    for value in (0.05, 0.1, 0.5, 3):
+        download.observe(value)
+    with latency.labels("send").time():
+        pass
+
+    lines = registry.render().splitlines()
+    assert lines[:8] == [
+        "# HELP stage_seconds Stage latency",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="download",le="0.1"} 2',
+        'stage_seconds_bucket{stage="download",le="1"} 3',
+        'stage_seconds_bucket{stage="download",le="+Inf"} 4',
+        'stage_seconds_sum{stage="download"} 3.65',
+        'stage_seconds_count{stage="download"} 4',
+        'stage_seconds_bucket{stage="send",le="0.1"} 1',
+    ]
+    assert download.count == 4
+    assert latency.labels("send").count == 1
+
+
+def test_incorrect_usage():
+    registry = Registry()
+    counter = registry.counter("a_total", "A", ["model"])
+    with pytest.raises(ValueError):
+        counter.labels("model_1", "extra")
+    with pytest.raises(ValueError):
+        counter.labels("model_1").inc(-1)
+    with pytest.raises(ValueError):
+        registry.gauge("a_total", "A again")
+    with pytest.raises(ValueError):
+        registry.histogram("b", "B", buckets=[1, 0.5])
+
+
+def test_escaping():
+    registry = Registry()
+    counter = registry.counter("a_total", 'A "quoted"\nhelp', ["name"])
+    counter.labels('x"y\\z\n').inc()
+    assert registry.render().splitlines() == [
+        '# HELP a_total A "quoted"\\nhelp',
+        "# TYPE a_total counter",
+        'a_total{name="x\\"y\\\\z\\n"} 1',
+    ]
+
+
+def test_collectors():
+    registry = Registry()
+    waiting = registry.gauge("waiting", "Waiting photos")
+    queue = [1, 2, 3]
+    registry.add_collector(lambda: waiting.set(len(queue)))
+
+    assert "waiting 3" in registry.render().splitlines()
+    queue.pop()
+    assert "waiting 2" in registry.render().splitlines()
+
+
+def test_endpoint():
+    registry = Registry()
+    registry.counter("a_total", "A").inc()
+
+    async def run():
+        async with TestClient(TestServer(registry.create_app())) as client:
+            response = await client.get("/metrics")
+            assert response.status == 200
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            return await response.text()
+
+    assert asyncio.run(run()).splitlines()[-1] == "a_total 1"
@@ -0,0 +1,135 @@
+import json
+import mmap
+import numpy as np
+
+from aiohttp import web
+from tritonclient.utils import triton_to_np_dtype
+
+
+def stand_in_model(data: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Model served by StandInServer: maps every row of the batch
+    to a vector of dim elements.
+    """
+    means = data.reshape((data.shape[0], -1)).mean(axis=1, dtype=np.float64)
+    return (means[:, None] + np.arange(dim)).astype(np.float32)
+
+
+class StandInServer:
+    """
+    Local stand-in of the TIS http endpoints used by AsyncMediator:
+    inference with binary, json or system shared memory tensors
+    and system shared memory registration.
+
+    Every model is served by stand_in_model.
+
+    Parameters
+    ----------
+    output_dims : output dimensionality of every served model by its name
+
+    """
+
+    def __init__(self, output_dims):
+        self.output_dims = output_dims
+        self.regions = {}
+        self.requests = []
+        self.app = web.Application(client_max_size=2**26)
+        self.app.add_routes(
+            [
+                web.post("/v2/models/{model}/infer", self.infer),
+                web.post(
+                    "/v2/systemsharedmemory/region/{name}/register",
+                    self.register,
+                ),
+                web.post(
+                    "/v2/systemsharedmemory/region/{name}/unregister",
+                    self.unregister,
+                ),
+            ]
+        )
+        self.runner = web.AppRunner(self.app)
+
+    async def start(self) -> str:
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+        for region in self.regions.values():
+            region["mmap"].close()
+        self.regions = {}
+
+    async def register(self, request: web.Request) -> web.Response:
+        params = await request.json()
+        with open(f"/dev/shm{params['key']}", "r+b") as file:
+            region_mmap = mmap.mmap(
+                file.fileno(), params["offset"] + params["byte_size"]
+            )
+        self.regions[request.match_info["name"]] = {
+            "mmap": region_mmap,
+            "offset": params["offset"],
+        }
+        return web.json_response({})
+
+    async def unregister(self, request: web.Request) -> web.Response:
+        region = self.regions.pop(request.match_info["name"])
+        region["mmap"].close()
+        return web.json_response({})
+
+    def region_view(self, params: dict, shape, dtype) -> np.ndarray:
+        region = self.regions[params["shared_memory_region"]]
+        offset = region["offset"] + params.get("shared_memory_offset", 0)
+        return np.ndarray(
+            shape, dtype=dtype, buffer=region["mmap"], offset=offset
+        )
+
+    async def infer(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        header_length = request.headers.get("Inference-Header-Content-Length")
+        if header_length is None:
+            header, binary = json.loads(body), b""
+        else:
+            header = json.loads(body[: int(header_length)])
+            binary = body[int(header_length) :]
+        self.requests.append(header)
+
+        (tensor,) = header["inputs"]
+        params = tensor.get("parameters", {})
+        dtype = triton_to_np_dtype(tensor["datatype"])
+        if "shared_memory_region" in params:
+            data = self.region_view(params, tensor["shape"], dtype)
+        elif "binary_data_size" in params:
+            data = np.frombuffer(
+                binary[: params["binary_data_size"]], dtype=dtype
+            ).reshape(tensor["shape"])
+        else:
+            data = np.array(tensor["data"], dtype=dtype).reshape(
+                tensor["shape"]
+            )
+
+        model = request.match_info["model"]
+        result = stand_in_model(data, self.output_dims[model])
+
+        (output,) = header.get("outputs", [{"name": "OUTPUT__0"}])
+        response_output = {
+            "name": output["name"],
+            "datatype": "FP32",
+            "shape": list(result.shape),
+        }
+        params = output.get("parameters", {})
+        if "shared_memory_region" in params:
+            view = self.region_view(params, result.shape, result.dtype)
+            view[...] = result
+            response_output["parameters"] = {
+                "shared_memory_region": params["shared_memory_region"],
+                "shared_memory_byte_size": result.nbytes,
+            }
+        else:
+            response_output["data"] = result.flatten().tolist()
+
+        return web.json_response(
+            {"model_name": model, "outputs": [response_output]}
+        )
@@ -5,7 +5,7 @@ import numpy as np
 
 from unittest.mock import Mock
 from models.models import ModelConfig, ModelData
-from models.mediator import Mediator
+from models.mediator import AsyncMediator, Mediator
 from datetime import datetime
 
 model_config = ModelConfig("model_name")
@@ -134,3 +134,97 @@ def test_parallel_get_result():
     asyncio.run(check_results())
     duration = (datetime.now() - start).total_seconds()
     assert duration < 3.0
+
+
+class AsyncClientMock:
+    def __init__(self, url, conn_limit, delay=0, results=None):
+        self.url = url
+        self.conn_limit = conn_limit
+        self.delay = delay
+        self.results = results or {}
+        self.requests = []
+        self.closed = False
+
+    async def infer(self, model_name, inputs, outputs):
+        self.requests.append((model_name, inputs, outputs))
+        await asyncio.sleep(self.delay)
+        result = Mock()
+        result.as_numpy.return_value = self.results[model_name]
+        return result
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize(
+    "model_inputs",
+    [
+        42,
+        "safs",
+        ["something"],
+        [
+            ModelData(np.arange(5, dtype=np.float32), model_config, False),
+            "something",
+        ],
+    ],
+)
+def test_async_infer_incorrect_input(model_inputs):
+    mediator = AsyncMediator("url", 4, client_class=AsyncClientMock)
+
+    with pytest.raises(TypeError):
+        asyncio.run(mediator.infer(model_inputs))
+
+
+def test_async_infer_no_inputs():
+    mediator = AsyncMediator("url", 4, client_class=AsyncClientMock)
+
+    assert asyncio.run(mediator.infer([])) == []
+
+
+def test_async_client_created_lazily():
+    mediator = AsyncMediator("url", 4, client_class=AsyncClientMock)
+    assert mediator._client is None
+
+    client = mediator.client
+    assert (client.url, client.conn_limit) == ("url", 4)
+    assert mediator.client is client
+
+    asyncio.run(mediator.close())
+    assert client.closed
+    assert mediator._client is None
+
+
+def test_async_infer_parallel():
+    first_config = ModelConfig("first")
+    second_config = ModelConfig("second")
+    first_result = np.arange(5, dtype=np.float32).reshape((1, 5))
+    second_result = np.arange(10, dtype=np.float32).reshape((2, 5))
+
+    def client_class(url, conn_limit):
+        return AsyncClientMock(
+            url,
+            conn_limit,
+            delay=1,
+            results={"first": first_result, "second": second_result},
+        )
+
+    mediator = AsyncMediator("url", 4, client_class=client_class)
+    model_inputs = [
+        ModelData(np.zeros((20, 20, 3), dtype=np.float32), first_config),
+        ModelData(np.zeros((2, 20, 20, 3), np.float32), second_config, True),
+        ModelData(np.zeros((20, 20, 3), dtype=np.float32), first_config),
+    ]
+
+    start = datetime.now()
+    result = asyncio.run(mediator.infer(model_inputs))
+    duration = (datetime.now() - start).total_seconds()
+
+    assert result == [
+        ModelData(first_result, first_config, False),
+        ModelData(second_result, second_config, True),
+        ModelData(first_result, first_config, False),
+    ]
+    assert duration < 2.0
+
+    shapes = [inputs[0].shape() for _, inputs, _ in mediator.client.requests]
+    assert shapes == [[1, 20, 20, 3], [2, 20, 20, 3], [1, 20, 20, 3]]
@@ -0,0 +1,95 @@
+import pytest
+import asyncio
+import numpy as np
+
+from batching.micro_batcher import MicroBatcher
+from models.models import ModelConfig, ModelData
+
+model_config = ModelConfig("model_name")
+
+
+def test_stack():
+    rows = [np.full((2, 2, 3), i, dtype=np.float32) for i in range(3)]
+    stacked = ModelData.stack([ModelData(row, model_config) for row in rows])
+
+    assert stacked.batched
+    assert stacked.model_config == model_config
+    assert stacked.data.shape == (3, 2, 2, 3)
+    for i, row in enumerate(rows):
+        assert (stacked.data[i] == row).all()
+
+
+def test_stack_into_out():
+    rows = [np.full((2, 5), i, dtype=np.float32) for i in range(3)]
+    out = np.empty((8, 2, 5), dtype=np.float32)
+    stacked = ModelData.stack(
+        [ModelData(row, model_config) for row in rows], out=out[:3]
+    )
+
+    assert np.shares_memory(stacked.data, out)
+    assert (out[:3] == np.stack(rows)).all()
+
+
+@pytest.mark.parametrize(
+    "model_inputs",
+    [
+        [],
+        [ModelData(np.zeros((2, 5), dtype=np.float32), model_config, True)],
+        [
+            ModelData(np.zeros(5, dtype=np.float32), model_config),
+            ModelData(np.zeros(5, dtype=np.float32), ModelConfig("other")),
+        ],
+    ],
+)
+def test_stack_incorrect_input(model_inputs):
+    with pytest.raises(ValueError):
+        ModelData.stack(model_inputs)
+
+
+def test_unbatch():
+    data = np.arange(15, dtype=np.float32).reshape((3, 5))
+    rows = ModelData(data, model_config, True).unbatch()
+
+    assert len(rows) == 3
+    for i, row in enumerate(rows):
+        assert not row.batched
+        assert row.data.shape == (1, 5)
+        assert (row.data[0] == data[i]).all()
+
+
+def test_batch_key():
+    rgb = ModelData(np.zeros((20, 20, 3), dtype=np.float32), model_config)
+    gray = ModelData(np.zeros((20, 20), dtype=np.float32), model_config)
+    half = ModelData(np.zeros((20, 20, 3), dtype=np.float16), model_config)
+
+    assert rgb.batch_key == ("model_name", (20, 20, 3), "<f4")
+    assert len({rgb.batch_key, gray.batch_key, half.batch_key}) == 3
+
+
+def test_mixed_shapes_batched_separately():
+    out = np.empty((8, 20, 20, 3), dtype=np.float32)
+
+    async def process_batch(key, model_inputs):
+        _, shape, _ = key
+        # the way inference stacks a batch into an arena of the key's shape
+        buffer = out[:, :, :, 0] if len(shape) == 2 else out
+        stacked = ModelData.stack(
+            model_inputs, out=buffer[: len(model_inputs)]
+        )
+        return [row.data.shape for row in stacked.unbatch()]
+
+    batcher = MicroBatcher(process_batch, max_batch_size=8, window=0.01)
+    shapes = [(20, 20, 3), (20, 20), (20, 20, 3), (20, 20)] * 2
+
+    async def run():
+        return await asyncio.gather(
+            *(
+                batcher.submit(model_input.batch_key, model_input)
+                for model_input in (
+                    ModelData(np.zeros(shape, dtype=np.float32), model_config)
+                    for shape in shapes
+                )
+            )
+        )
+
+    assert asyncio.run(run()) == [(1,) + shape for shape in shapes]
@@ -0,0 +1,119 @@
+import os
+import pytest
+import asyncio
+import numpy as np
+
+from unittest.mock import AsyncMock
+from models.models import ModelConfig, ModelData
+from models.mediator import AsyncMediator
+from models.shared_memory import SharedMemoryPool, SharedMemoryRegion
+from stand_in_server import StandInServer, stand_in_model
+
+DIM = 5
+model_config = ModelConfig("model_name", output_dims=[DIM])
+
+
+@pytest.mark.parametrize(
+    "byte_size, expected",
+    [(1, 4096), (4096, 4096), (4097, 8192), (1280 * 720 * 3 * 4, 2**24)],
+)
+def test_size_class(byte_size, expected):
+    assert SharedMemoryPool.size_class(byte_size) == expected
+
+
+def test_region_write_read():
+    region = SharedMemoryRegion(f"test_{os.getpid()}_region", 4096)
+    try:
+        data = np.arange(60, dtype=np.float32).reshape((3, 4, 5))
+        assert region.write(data) == data.nbytes
+        assert (region.read([3, 4, 5], np.float32) == data).all()
+    finally:
+        region.destroy()
+    assert not os.path.exists(f"/dev/shm{region.key}")
+
+
+def test_pool_reuses_regions():
+    client = AsyncMock()
+    pool = SharedMemoryPool(client, prefix="test")
+
+    async def use_pool():
+        first = await pool.acquire(100)
+        pool.release(first)
+        second = await pool.acquire(4000)
+        third = await pool.acquire(100)
+        bigger = await pool.acquire(5000)
+        regions = [first, second, third, bigger]
+        await pool.close()
+        return regions
+
+    first, second, third, bigger = asyncio.run(use_pool())
+
+    assert first is second
+    assert third is not first
+    assert bigger.byte_size == 8192
+    assert client.register_system_shared_memory.call_count == 3
+    assert client.unregister_system_shared_memory.call_count == 3
+    for region in (first, third, bigger):
+        assert not os.path.exists(f"/dev/shm{region.key}")
+
+
+def test_pool_failed_register():
+    client = AsyncMock()
+    client.register_system_shared_memory.side_effect = RuntimeError
+    pool = SharedMemoryPool(client, prefix="test")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(pool.acquire(100))
+    assert pool.regions_num == 0
+
+
+def test_shared_memory_requires_output_dims():
+    mediator = AsyncMediator("url", 4, shared_memory=True)
+    model_input = ModelData(np.zeros(5, np.float32), ModelConfig("model"))
+
+    with pytest.raises(ValueError):
+        asyncio.run(mediator.infer([model_input]))
+
+
+@pytest.mark.parametrize("shared_memory", [False, True])
+def test_infer_with_stand_in_server(shared_memory):
+    server = StandInServer({"model_name": DIM})
+    rng = np.random.default_rng(0)
+    model_inputs = [
+        ModelData(rng.random((20, 20, 3), np.float32), model_config),
+        ModelData(rng.random((3, 20, 20, 3), np.float32), model_config, True),
+        ModelData(rng.random((720, 1280, 3), np.float32), model_config),
+    ]
+
+    async def infer():
+        url = await server.start()
+        mediator = AsyncMediator(url, 4, shared_memory=shared_memory)
+        try:
+            results = []
+            for _ in range(3):
+                results = await mediator.infer(model_inputs)
+            regions_num = (
+                mediator.shared_memory_pool.regions_num if shared_memory else 0
+            )
+            return results, regions_num
+        finally:
+            await mediator.close()
+            await server.stop()
+
+    results, regions_num = asyncio.run(infer())
+
+    for model_input, result in zip(model_inputs, results):
+        data = model_input.data
+        if not model_input.batched:
+            data = np.expand_dims(data, axis=0)
+        assert np.allclose(result.data, stand_in_model(data, DIM))
+        assert result.batched == model_input.batched
+
+    for request in server.requests:
+        (tensor,) = request["inputs"]
+        if shared_memory:
+            assert "shared_memory_region" in tensor["parameters"]
+        else:
+            assert "binary_data_size" in tensor["parameters"]
+    # three concurrent requests each holding an input and an output region
+    assert regions_num <= 6
@@ -0,0 +1,300 @@
+import time
+import pytest
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TelegramAPIServer
+from webhook.server import SECRET_HEADER, WebhookServer
+
+TOKEN = "123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA"
+
+
+class FakeBotApi:
+    """
+    Bot API answering every method with ok and recording the calls
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.__handle)
+
+    async def __handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls.append((method, dict(await request.post())))
+        result = True
+        if method == "sendMessage":
+            result = {
+                "message_id": len(self.calls),
+                "date": 0,
+                "chat": {"id": 1, "type": "private"},
+                "text": "",
+            }
+        return web.json_response({"ok": True, "result": result})
+
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": "user"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+def user_key(update: dict) -> int:
+    return update["message"]["from"]["id"]
+
+
+async def post_updates(client: TestClient, updates, headers=None):
+    return [
+        await client.post("/webhook", json=update, headers=headers)
+        for update in updates
+    ]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"max_concurrency": 0},
+        {"max_concurrency": 2.5},
+        {"max_concurrency": 8, "max_pending": 4},
+    ],
+)
+def test_incorrect_init_args(kwargs):
+    async def handle(update):
+        pass
+
+    with pytest.raises(ValueError):
+        WebhookServer(handle, **kwargs)
+
+
+def test_fast_response_and_bounded_concurrency():
+    processing, max_processing = 0, 0
+
+    async def handle(update):
+        nonlocal processing, max_processing
+        processing += 1
+        max_processing = max(max_processing, processing)
+        await asyncio.sleep(0.05)
+        processing -= 1
+
+    latencies = []
+    server = WebhookServer(
+        handle, max_concurrency=4, observe_latency=latencies.append
+    )
+
+    async def run():
+        async with TestClient(TestServer(server.app)) as client:
+            started = time.monotonic()
+            responses = await post_updates(
+                client, [message_update(i, i, "hi") for i in range(20)]
+            )
+            answered = time.monotonic() - started
+            assert [response.status for response in responses] == [200] * 20
+            # the updates are acknowledged before they are processed
+            assert answered < 0.2
+            await server.close()
+
+    asyncio.run(run())
+    assert max_processing == 4
+    assert server.stats()["processed"] == 20
+    assert server.stats()["pending"] == 0
+    # the updates waiting for the busy slots are slower
+    assert len(latencies) == 20
+    assert min(latencies) >= 0.05
+    assert max(latencies) >= 0.15
+
+
+def test_too_many_pending():
+    release = None
+
+    async def handle(update):
+        await release.wait()
+
+    server = WebhookServer(handle, max_concurrency=2, max_pending=3)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        async with TestClient(TestServer(server.app)) as client:
+            responses = await post_updates(
+                client, [message_update(i, i, "hi") for i in range(5)]
+            )
+            assert [response.status for response in responses] == [
+                200,
+                200,
+                200,
+                429,
+                429,
+            ]
+            release.set()
+            await server.close()
+
+    asyncio.run(run())
+    assert server.stats()["rejected"] == 2
+    assert server.stats()["processed"] == 3
+
+
+def test_updates_of_user_in_order():
+    processed = []
+
+    async def handle(update):
+        message = update["message"]
+        # the first updates take the longest
+        await asyncio.sleep(0.05 / (1 + int(message["text"])))
+        processed.append((message["from"]["id"], int(message["text"])))
+
+    server = WebhookServer(handle, max_concurrency=8, key=user_key)
+
+    async def run():
+        async with TestClient(TestServer(server.app)) as client:
+            await post_updates(
+                client,
+                [message_update(i, i % 2, str(i // 2)) for i in range(10)],
+            )
+            await server.close()
+
+    asyncio.run(run())
+    for user in range(2):
+        assert [text for key, text in processed if key == user] == list(
+            range(5)
+        )
+
+
+@pytest.mark.parametrize(
+    "headers,expected", [(None, 403), ({SECRET_HEADER: "wrong"}, 403)]
+)
+def test_secret_token(headers, expected):
+    async def handle(update):
+        pass
+
+    server = WebhookServer(handle, secret_token="secret")
+
+    async def run():
+        async with TestClient(TestServer(server.app)) as client:
+            responses = await post_updates(
+                client, [message_update(1, 1, "hi")], headers
+            )
+            assert responses[0].status == expected
+            responses = await post_updates(
+                client,
+                [message_update(1, 1, "hi")],
+                {SECRET_HEADER: "secret"},
+            )
+            assert responses[0].status == 200
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_incorrect_body():
+    async def handle(update):
+        pass
+
+    server = WebhookServer(handle)
+
+    async def run():
+        async with TestClient(TestServer(server.app)) as client:
+            response = await client.post("/webhook", data=b"{not json")
+            assert response.status == 400
+
+    asyncio.run(run())
+
+
+def test_failed_update():
+    async def handle(update):
+        if update["update_id"] % 2:
+            raise RuntimeError
+
+    server = WebhookServer(handle)
+
+    async def run():
+        async with TestClient(TestServer(server.app)) as client:
+            await post_updates(
+                client, [message_update(i, i, "hi") for i in range(4)]
+            )
+            await server.close()
+
+    asyncio.run(run())
+    assert server.stats()["failed"] == 2
+    assert server.stats()["processed"] == 2
+
+
+def test_close_cancels_after_timeout():
+    cancelled = 0
+
+    async def handle(update):
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(update["update_id"])
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+
+    server = WebhookServer(handle)
+
+    async def run():
+        async with TestClient(TestServer(server.app)) as client:
+            await post_updates(
+                client, [message_update(i, i, "hi") for i in (0, 10, 10)]
+            )
+            await server.close(timeout=0.1)
+            response = await client.post(
+                "/webhook", json=message_update(3, 3, "hi")
+            )
+            assert response.status == 503
+
+    asyncio.run(run())
+    assert cancelled == 2
+    assert server.stats()["processed"] == 1
+
+
+def test_dispatcher_with_fake_bot_api():
+    api = FakeBotApi()
+
+    async def run():
+        async with TestServer(api.app) as api_server:
+            bot = Bot(
+                TOKEN,
+                server=TelegramAPIServer.from_base(
+                    str(api_server.make_url(""))
+                ),
+            )
+            dp = Dispatcher(bot)
+
+            @dp.message_handler()
+            async def echo(message: types.Message):
+                await message.answer(message.text)
+
+            async def process_update(update: dict):
+                Bot.set_current(bot)
+                Dispatcher.set_current(dp)
+                await dp.process_update(types.Update(**update))
+
+            server = WebhookServer(process_update, key=user_key)
+            async with TestClient(TestServer(server.app)) as client:
+                responses = await post_updates(
+                    client,
+                    [
+                        message_update(i, 1 + i % 3, f"text {i}")
+                        for i in range(30)
+                    ],
+                )
+                assert {response.status for response in responses} == {200}
+                await server.close()
+            session = await bot.get_session()
+            await session.close()
+
+    asyncio.run(run())
+    assert sorted(data["text"] for method, data in api.calls) == sorted(
+        f"text {i}" for i in range(30)
+    )
+    assert {method for method, data in api.calls} == {"sendMessage"}
@@ -0,0 +1,183 @@
+import time
+import asyncio
+import logging
+
+from aiohttp import web
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Optional,
+    Set,
+)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    aiohttp application receiving Telegram updates by webhook.
+
+    Every update is acknowledged with 200 as soon as it is read and
+    processed by handle_update in the background, at most max_concurrency
+    updates at a time. The updates of the same key (user) are processed
+    one by one in the order they are received. When max_pending updates
+    are waiting or being processed, the new ones are answered with 429
+    and Telegram sends them again later.
+
+    Parameters
+    ----------
+    handle_update : async function processing an update (parsed JSON)
+
+    path : path of the webhook
+
+    max_concurrency : max amount of updates processed at a time
+
+    max_pending : max amount of received and not processed yet updates
+
+    key : function returning the key of an update, the updates of
+        the same key are processed sequentially, all the updates
+        are independent if None
+
+    secret_token : the updates without this X-Telegram-Bot-Api-Secret-Token
+        header are rejected with 403
+
+    shutdown_timeout : seconds the received updates are processed for
+        on shutdown of the application
+
+    observe_latency : function called with the seconds from receiving
+        to processing of every update, e.g. observe of a latency histogram
+
+    """
+
+    def __init__(
+        self,
+        handle_update: Callable[[Dict[str, Any]], Awaitable[Any]],
+        path: str = "/webhook",
+        max_concurrency: int = 64,
+        max_pending: int = 1024,
+        key: Optional[Callable[[Dict[str, Any]], Hashable]] = None,
+        secret_token: Optional[str] = None,
+        shutdown_timeout: float = 30.0,
+        observe_latency: Optional[Callable[[float], Any]] = None,
+    ):
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise ValueError("Expected max_concurrency to be a positive int")
+        if not isinstance(max_pending, int) or max_pending < max_concurrency:
+            raise ValueError(
+                "Expected max_pending to be an int not less than "
+                "max_concurrency"
+            )
+
+        self.handle_update = handle_update
+        self.path = path
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.key = key
+        self.secret_token = secret_token
+        self.shutdown_timeout = shutdown_timeout
+        self.observe_latency = observe_latency
+        self.closing = False
+
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.processing = 0
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # the last update of every key being processed
+        self._last: Dict[Hashable, asyncio.Task] = {}
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.__receive)
+        self.app.on_shutdown.append(self.__on_shutdown)
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def __receive(self, request: web.Request) -> web.Response:
+        if self.closing:
+            return web.Response(status=503)
+        if (
+            self.secret_token is not None
+            and request.headers.get(SECRET_HEADER) != self.secret_token
+        ):
+            return web.Response(status=403)
+        if len(self._tasks) >= self.max_pending:
+            self.rejected += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        self.received += 1
+        key = self.key(update) if self.key is not None else None
+        previous = self._last.get(key) if key is not None else None
+        task = asyncio.ensure_future(self.__process(update, previous))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if key is not None:
+            self._last[key] = task
+            task.add_done_callback(lambda _: self.__forget(key, task))
+        return web.Response()
+
+    def __forget(self, key: Hashable, task: asyncio.Task):
+        if self._last.get(key) is task:
+            del self._last[key]
+
+    async def __process(
+        self, update: Dict[str, Any], previous: Optional[asyncio.Task]
+    ):
+        received = time.monotonic()
+        if previous is not None:
+            await asyncio.wait([previous])
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            self.processing += 1
+            try:
+                await self.handle_update(update)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logging.exception(f"Failed to process update {update}")
+            finally:
+                self.processing -= 1
+                if self.observe_latency is not None:
+                    self.observe_latency(time.monotonic() - received)
+
+    async def close(self, timeout: Optional[float] = None):
+        """
+        Stops receiving updates and waits the received ones to be
+        processed for timeout seconds, the rest are cancelled.
+        """
+        self.closing = True
+        if not self._tasks:
+            return
+        done, not_done = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logging.warning(f"Cancelled {len(not_done)} updates on close")
+            await asyncio.wait(not_done)
+
+    async def __on_shutdown(self, app: web.Application):
+        await self.close(self.shutdown_timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "pending": self.pending,
+            "processing": self.processing,
+        }
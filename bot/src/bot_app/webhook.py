@@ -0,0 +1,113 @@
+"""
+Webhook mode of the bot.
+
+Telegram posts the updates to an aiohttp server, which acknowledges
+them at once and processes them by the dispatcher in the background,
+at most WEBHOOK_CONCURRENCY at a time and the updates of a user in
+the order they were sent. Unlike polling, the updates sent while the bot
+restarts are kept by Telegram and delivered after the restart.
+"""
+import asyncio
+import logging
+
+from typing import Any, Dict, Hashable, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+from bot_app import metrics
+from bot_app.utils.webhook.server import WebhookServer
+from bot_app.config import (
+    BOT_TOKEN,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_CONCURRENCY,
+    WEBHOOK_MAX_PENDING,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_SHUTDOWN_TIMEOUT,
+)
+
+
+def update_key(update: Dict[str, Any]) -> Optional[Hashable]:
+    """
+    Id of the user sent the update, None if the update has no user.
+    """
+    for name, value in update.items():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"].get("id")
+    return None
+
+
+async def set_webhook():
+    bot = Bot(token=BOT_TOKEN)
+    try:
+        await bot.set_webhook(
+            WEBHOOK_URL,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            secret_token=WEBHOOK_SECRET,
+        )
+    finally:
+        session = await bot.get_session()
+        await session.close()
+
+
+def create_server() -> WebhookServer:
+    """
+    Webhook server processing the updates by the dispatcher of the bot
+    with on_startup and on_shutdown of bot_app.start.
+    """
+    from bot_app.start import dp, on_startup, on_shutdown
+
+    async def process_update(update: Dict[str, Any]):
+        # the context of the handlers is set the way the executor does
+        Bot.set_current(dp.bot)
+        Dispatcher.set_current(dp)
+        await dp.process_update(types.Update(**update))
+
+    server = WebhookServer(
+        process_update,
+        path=WEBHOOK_PATH,
+        max_concurrency=WEBHOOK_CONCURRENCY,
+        max_pending=WEBHOOK_MAX_PENDING,
+        key=update_key,
+        secret_token=WEBHOOK_SECRET,
+        shutdown_timeout=WEBHOOK_SHUTDOWN_TIMEOUT,
+        observe_latency=metrics.webhook_latency.observe,
+    )
+
+    metrics.export_stats("webhook", server.stats)
+
+    async def on_app_startup(app: web.Application):
+        await on_startup(dp)
+
+    async def on_app_shutdown(app: web.Application):
+        # the received updates are processed by now, the server closes
+        # on shutdown before this callback
+        logging.info(f"Webhook: {server.stats()}")
+        await on_shutdown(dp)
+        await dp.storage.close()
+        await dp.storage.wait_closed()
+        session = await dp.bot.get_session()
+        await session.close()
+
+    server.app.on_startup.append(on_app_startup)
+    server.app.on_shutdown.append(on_app_shutdown)
+    return server
+
+
+def run_webhook():
+    """
+    Serves the webhook on WEBHOOK_HOST:WEBHOOK_PORT until SIGINT or SIGTERM.
+    """
+    # asyncio.run leaves no event loop set
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = create_server()
+    web.run_app(
+        server.app,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        loop=loop,
+        print=None,
+    )
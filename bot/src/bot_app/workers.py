@@ -0,0 +1,227 @@
+"""
+Pre-fork multi-worker mode of the bot.
+
+The parent process loads the indexes once, binds the webhook socket
+and forks WORKERS processes serving the webhook on the shared socket.
+The indexes are not written to by the searches, so their memory stays
+shared by the workers copy-on-write. Everything else (bot session,
+database pool, TIS client) is created by every worker after the fork.
+
+SIGHUP makes the parent reload the indexes and replace the workers one
+generation at a time, SIGINT and SIGTERM stop the workers and the parent.
+"""
+import os
+import gc
+import time
+import signal
+import socket
+import asyncio
+import logging
+
+from typing import Dict
+from bot_app.config import (
+    WORKERS,
+    WEBHOOK_URL,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    FSM_STORAGE,
+    METRICS_PORT,
+)
+
+RESPAWN_DELAY = 1.0
+
+SMAPS_PATH = "/proc/self/smaps_rollup"
+
+MEMORY_FIELDS = (
+    "Rss",
+    "Pss",
+    "Shared_Clean",
+    "Shared_Dirty",
+    "Private_Clean",
+    "Private_Dirty",
+)
+
+
+def memory_usage() -> Dict[str, int]:
+    """
+    Memory of the current process in kB by the fields of
+    /proc/self/smaps_rollup, empty if it is not available.
+    """
+    usage = {}
+    try:
+        with open(SMAPS_PATH) as file:
+            for line in file:
+                name, _, value = line.partition(":")
+                if name in MEMORY_FIELDS:
+                    usage[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+def format_memory(usage: Dict[str, int]) -> str:
+    if not usage:
+        return "memory usage is not available"
+    shared = usage["Shared_Clean"] + usage["Shared_Dirty"]
+    private = usage["Private_Clean"] + usage["Private_Dirty"]
+    return (
+        f"RSS {usage['Rss'] / 1024:.1f} MB, PSS {usage['Pss'] / 1024:.1f} MB,"
+        f" shared {shared / 1024:.1f} MB, private {private / 1024:.1f} MB"
+    )
+
+
+def _run_worker(sock: socket.socket, forked: float, slot: int):
+    # the parent has no event loop set after asyncio.run
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    from aiohttp import web
+    from bot_app import metrics
+    from bot_app.webhook import create_server
+
+    if METRICS_PORT:
+        metrics.port = METRICS_PORT + slot
+
+    async def on_worker_startup(app: web.Application):
+        logging.info(
+            f"Worker {os.getpid()} started in "
+            f"{time.monotonic() - forked:.2f}s, "
+            f"{format_memory(memory_usage())}"
+        )
+
+    async def on_worker_shutdown(app: web.Application):
+        # a signal sent to the whole group reaches the worker twice,
+        # the second time from the parent, and would break the shutdown
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, lambda: None)
+
+    server = create_server()
+    server.app.on_startup.append(on_worker_startup)
+    server.app.on_shutdown.insert(0, on_worker_shutdown)
+    web.run_app(server.app, sock=sock, loop=loop, print=None)
+
+
+class _Supervisor:
+    def __init__(self, sock: socket.socket, workers: int):
+        self.sock = sock
+        self.workers = workers
+        # the slot of every worker, the slots of a generation of workers
+        # are from first_slot to first_slot + workers - 1
+        self.children: Dict[int, int] = {}
+        self.first_slot = 0
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self, slot: int) -> int:
+        forked = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            for signum in (signal.SIGHUP, signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, signal.SIG_DFL)
+            code = 0
+            try:
+                _run_worker(self.sock, forked, slot)
+            except BaseException:
+                logging.exception(f"Worker {os.getpid()} failed")
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        self.children[pid] = slot
+        return pid
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+
+    def reload(self, signum, frame):
+        self.reloading = True
+
+    def reap(self):
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            slot = self.children.pop(pid, None)
+            if not self.stopping and slot is not None:
+                logging.warning(
+                    f"Worker {pid} exited with {status}, restarting it"
+                )
+                # a worker failing on startup is not restarted in a busy loop
+                time.sleep(RESPAWN_DELAY)
+                self.spawn(slot)
+
+    def replace_workers(self):
+        from bot_app.index import matchers, load_matchers
+
+        started = time.monotonic()
+        matchers[:] = load_matchers()
+        gc.collect()
+        gc.freeze()
+        logging.info(
+            f"Reloaded indexes in {time.monotonic() - started:.2f}s, "
+            f"{format_memory(memory_usage())}"
+        )
+
+        old_children = set(self.children)
+        # the old workers hold their slots until they exit
+        self.first_slot = self.workers - self.first_slot
+        for slot in range(self.workers):
+            self.spawn(self.first_slot + slot)
+        # the old workers finish the updates they have already accepted
+        for pid in old_children:
+            del self.children[pid]
+            os.kill(pid, signal.SIGTERM)
+        for pid in old_children:
+            os.waitpid(pid, 0)
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+        for slot in range(self.workers):
+            self.spawn(slot)
+
+        while self.children:
+            self.reap()
+            if self.reloading and not self.stopping:
+                self.reloading = False
+                self.replace_workers()
+            time.sleep(0.2)
+
+
+def run_workers(workers: int = WORKERS):
+    """
+    Loads the indexes and serves the webhook by workers processes
+    until SIGINT or SIGTERM.
+    """
+    if FSM_STORAGE != "postgres":
+        logging.warning(
+            "The states are not shared by the workers, an update of a user "
+            "may reach a worker not knowing the user's state, "
+            "set FSM_STORAGE=postgres"
+        )
+
+    started = time.monotonic()
+    import bot_app.index  # noqa: F401
+
+    # objects allocated so far are not tracked by gc anymore, so the
+    # collections in the workers do not write to the shared pages
+    gc.collect()
+    gc.freeze()
+    logging.info(
+        f"Loaded indexes in {time.monotonic() - started:.2f}s, "
+        f"{format_memory(memory_usage())}"
+    )
+
+    if WEBHOOK_URL:
+        from bot_app.webhook import set_webhook
+
+        asyncio.run(set_webhook())
+
+    sock = socket.create_server((WEBHOOK_HOST, WEBHOOK_PORT), backlog=1024)
+    try:
+        _Supervisor(sock, workers).run()
+    finally:
+        sock.close()
@@ -1,6 +1,24 @@
-from aiogram import executor
-from bot_app import dp
-from bot_app.start import on_startup
+import asyncio
+
+from bot_app.config import WORKERS, WEBHOOK_URL
 
 if __name__ == '__main__':
-    executor.start_polling(dp, on_startup=on_startup, skip_updates=True)
+    if WORKERS:
+        from bot_app.workers import run_workers
+
+        run_workers()
+    elif WEBHOOK_URL:
+        from bot_app.webhook import set_webhook, run_webhook
+
+        asyncio.run(set_webhook())
+        run_webhook()
+    else:
+        from aiogram import executor
+        from bot_app.start import dp, on_startup, on_shutdown
+
+        executor.start_polling(
+            dp,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown,
+            skip_updates=True,
+        )
@@ -4,3 +4,20 @@ cd /bot/src/bot_app/db
 echo "Running tests for database"
 python3 -m pytest -v test_database.py
 echo
+echo "Running tests for ratings buffer"
+python3 -m pytest -v test_rating_buffer.py
+echo
+echo "Running tests for ratings export"
+python3 -m pytest -v test_export.py
+echo
+echo "Running tests for postgres FSM storage"
+python3 -m pytest -v test_postgres_storage.py
+echo
+
+cd /bot/src
+echo "Running tests for bot_app matching"
+python3 -m pytest -v bot_app/test_matching.py
+echo
+echo "Running tests for bot_app workers"
+python3 -m pytest -v bot_app/test_workers.py
+echo
@@ -10,3 +10,21 @@ echo
 echo "Running tests for models"
 python3 -m pytest -v test_models
 echo
+echo "Running tests for batching"
+python3 -m pytest -v test_batching
+echo
+echo "Running tests for cache"
+python3 -m pytest -v test_cache
+echo
+echo "Running tests for fsm"
+python3 -m pytest -v test_fsm
+echo
+echo "Running tests for webhook"
+python3 -m pytest -v test_webhook
+echo
+echo "Running tests for admission"
+python3 -m pytest -v test_admission
+echo
+echo "Running tests for metrics"
+python3 -m pytest -v test_metrics
+echo